@@ -8,6 +8,13 @@ logger = logging.getLogger(__name__)
 
 from DDR import config
 
+# orjson is optional and not in requirements.txt (`pip install orjson`);
+# it parses DDR metadata ~3-5x faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
 
 def _json_handler(obj):
     """Function that gets called for objects that can't otherwise be serialized.
@@ -44,3 +51,20 @@ def format_json(data, sort_keys=True):
         indent=4, separators=(',', ': '), sort_keys=sort_keys,
         default=_json_handler,
     )
+
+def json_loads(text):
+    """Parse JSON text, using orjson if available
+    
+    orjson is stricter than json (e.g. no NaN, no ints wider than 64 bits)
+    so anything it refuses is handed to json, which also gives the
+    standard error messages.
+    
+    @param text: str or bytes
+    @returns: Python data
+    """
+    if orjson:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
@@ -8,18 +8,26 @@
 #   appear in publicly-available metadata.
 
 
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+logger = logging.getLogger(__name__)
 import mimetypes
 mimetypes.init()
 import os
 from pathlib import Path
-from typing import List
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from bs4 import BeautifulSoup
 from bs4.element import Tag
 import requests
 
 from DDR import config
+from DDR import fileio
+from DDR import pipeline
 
 IA_SAMPLE_URL = 'https://archive.org/download/ddr-densho-1003-1-24/ddr-densho-1003-1-24_files.xml'
 
@@ -29,6 +37,8 @@ IA_DOWNLOAD_URL = 'https://archive.org/download'
 IA_HOSTED_MODELS = ['segment',]
 # Entity.formats that should always be checked for IA content
 IA_HOSTED_FORMATS = ['av','vh',]
+# Records kept in memory by IAMetaCache (records on disk are not limited)
+IA_CACHE_MAX_RECORDS = 100000
 
 # https://archive.org/download/ddr-densho-1003-1-24/ddr-densho-1003-1-24_files.xml
 SEGMENT_XML_URL = '{base}/{segmentid}/{segmentid}_files.xml'
@@ -47,21 +57,12 @@ DUMMY_OBJECTS = {
 def get_ia_meta(o):
     """Get object record from Internet Archive; use dummy record if unpublished
     
+    Records are cached (see IAMetaCache).
+    
     @param o: models.Entity
     @returns: dict or None
     """
-    if is_iaobject(o):
-        iaobject = IAObject(o.identifier.id)
-        if iaobject.http_status == 200:
-            return iaobject.dict()
-        else:
-            # Couldn't find object in IA - use a dummy
-            oid = DUMMY_OBJECTS.get(o.format, None)
-            if oid:
-                iaobject = IAObject(oid)
-                if iaobject.http_status == 200:
-                    return iaobject.dict()
-    return {}
+    return CACHE.meta(o)
 
 def is_iaobject(o):
     """Determines whether or not to check Internet Archive for this object
@@ -171,3 +172,202 @@ class IAObject():
                         except IndexError:
                             f[field] = ''
                     self.files[format_] = f
+
+
+def fetch_xml(oid: str, session: Optional[requests.Session]=None,
+              base: str=IA_DOWNLOAD_URL) -> Tuple[int, str]:
+    """Download an object's _files.xml from Internet Archive
+    
+    @param oid: str object ID
+    @param session: requests.Session (optional) for connection reuse
+    @param base: str Base URL (e.g. a local stand-in for testing)
+    @returns: (http_status, xml) xml is blank unless http_status is 200
+    """
+    url = SEGMENT_XML_URL.format(base=base, segmentid=oid)
+    r = (session or requests).get(url, timeout=config.REQUESTS_TIMEOUT)
+    if r.status_code == 200:
+        return r.status_code,r.text
+    return r.status_code,''
+
+
+class IAMetaCache():
+    """Internet Archive object records, cached by object ID
+    
+    The most recently used max_records records are kept in memory and, if
+    path is set, every record is kept in one JSON file per object in path
+    so they survive between runs.  Found records (HTTP 200) expire after
+    ttl seconds.  Objects that are not on IA (HTTP 404) are remembered for
+    negative_ttl seconds so that unpublished objects don't hit IA on every
+    run.  Other responses are only remembered in memory.
+    
+    >>> cache = IAMetaCache('/tmp/ddr-iameta')
+    >>> cache.prefetch(['ddr-densho-1000-1-1', 'ddr-densho-1000-1-2'])
+    >>> cache.meta(entity)
+    
+    fetch may be replaced (e.g. with fixture XML in tests); it takes an
+    object ID and returns (http_status, xml).
+    """
+    path = ''
+    ttl = 0
+    negative_ttl = 0
+    max_records = 0
+    
+    def __init__(self, path: str=config.IA_CACHE_DIR,
+                 ttl: int=config.IA_CACHE_TTL,
+                 negative_ttl: int=config.IA_CACHE_NEGATIVE_TTL,
+                 fetch: Optional[Callable[[str], Tuple[int, str]]]=None,
+                 max_records: int=IA_CACHE_MAX_RECORDS):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_records = max_records
+        self._session = requests.Session()
+        self._fetch = fetch or (lambda oid: fetch_xml(oid, self._session))
+        self._records: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __repr__(self):
+        return "<%s.%s %s (%s)>" % (
+            self.__module__, self.__class__.__name__, self.path, len(self._records)
+        )
+    
+    def _record_path(self, oid: str) -> str:
+        return os.path.join(self.path, '%s.json' % oid)
+    
+    def _expired(self, record: Dict[str, Any]) -> bool:
+        if record['http_status'] == 200:
+            ttl = self.ttl
+        elif record['http_status'] == 404:
+            ttl = self.negative_ttl
+        else:
+            # not written to disk; kept until evicted from memory
+            return False
+        return (time.time() - record['fetched']) > ttl
+    
+    def _read(self, oid: str) -> Optional[Dict[str, Any]]:
+        """Read unexpired record from disk"""
+        if not self.path:
+            return None
+        try:
+            with open(self._record_path(oid), 'r') as f:
+                record = json.loads(f.read())
+        except (IOError, ValueError):
+            return None
+        if self._expired(record):
+            return None
+        return record
+    
+    def _write(self, oid: str, record: Dict[str, Any]):
+        """Write record to disk, if it is worth keeping"""
+        if not (self.path and record['http_status'] in [200, 404]):
+            return
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp = '%s.%s.tmp' % (self._record_path(oid), threading.get_ident())
+            with open(tmp, 'w') as f:
+                f.write(json.dumps(record))
+            os.replace(tmp, self._record_path(oid))
+        except (IOError, OSError) as err:
+            logger.error('Could not cache %s: %s' % (oid, err))
+    
+    def get(self, oid: str) -> Dict[str, Any]:
+        """Record for object ID, from memory, disk, or Internet Archive
+        
+        @param oid: str object ID
+        @returns: dict {'http_status': int, 'fetched': float, 'meta': dict}
+        """
+        with self._lock:
+            record = self._records.get(oid)
+            if record:
+                if not self._expired(record):
+                    self._records.move_to_end(oid)
+                    return record
+                del self._records[oid]
+        record = self._read(oid)
+        if not record:
+            http_status,xml = self._fetch(oid)
+            meta = {}
+            if http_status == 200:
+                meta = IAObject(oid, http_status, xml).dict()
+            record = {'http_status': http_status, 'fetched': time.time(), 'meta': meta}
+            self._write(oid, record)
+        with self._lock:
+            self._records[oid] = record
+            self._records.move_to_end(oid)
+            while len(self._records) > self.max_records:
+                self._records.popitem(last=False)
+        return record
+    
+    def meta(self, o) -> Dict[str, Any]:
+        """Get object record; use dummy record if unpublished
+        
+        See get_ia_meta.
+        
+        @param o: models.Entity
+        @returns: dict
+        """
+        if is_iaobject(o):
+            record = self.get(o.identifier.id)
+            if record['http_status'] == 200:
+                return record['meta']
+            # Couldn't find object in IA - use a dummy
+            oid = DUMMY_OBJECTS.get(o.format, None)
+            if oid:
+                record = self.get(oid)
+                if record['http_status'] == 200:
+                    return record['meta']
+        return {}
+    
+    def prefetch(self, oids: Iterable[str],
+                 workers: int=config.IA_PREFETCH_WORKERS) -> int:
+        """Get records for object IDs (and the dummy objects) using threads
+        
+        Errors are logged, not raised; meta() will try again.
+        
+        @param oids: iterable of object IDs
+        @param workers: int Number of threads
+        @returns: int Number of records now in memory
+        """
+        def get(oid):
+            try:
+                self.get(oid)
+            except Exception as err:
+                logger.error('Could not prefetch %s: %s' % (oid, err))
+        oids = list(DUMMY_OBJECTS.values()) + list(oids)
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            list(executor.map(get, oids))
+        return len(self._records)
+    
+    def clear(self):
+        """Forget records in memory (records on disk are kept)"""
+        with self._lock:
+            self._records = OrderedDict()
+
+
+def ia_object_ids(basedir: str) -> Iterable[str]:
+    """Yields IDs of objects under basedir that should be checked on IA
+    
+    Reads only the format field of each entity/segment (see is_iaobject).
+    
+    @param basedir: str Absolute path to collection or entity
+    @returns: generator of object IDs
+    """
+    for oi in pipeline.meta_files(basedir, models=['entity','segment']):
+        format_ = fileio.read_fields(oi.path_abs('json'), ['format']).get('format')
+        if oi.id and ((oi.model in IA_HOSTED_MODELS) or (format_ in IA_HOSTED_FORMATS)):
+            yield oi.id
+
+def prefetch(basedir: str, workers: int=config.IA_PREFETCH_WORKERS) -> int:
+    """Fetch IA records for a whole collection before indexing it
+    
+    @param basedir: str Absolute path to collection or entity
+    @param workers: int Number of threads (0 does nothing)
+    @returns: int Number of records in the cache
+    """
+    if config.OFFLINE or not workers:
+        return 0
+    return CACHE.prefetch(ia_object_ids(basedir), workers)
+
+
+# Records used by get_ia_meta
+CACHE = IAMetaCache()
@@ -9,6 +9,8 @@ Register newly added EIDs
 """
 
 import codecs
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import csv
 from datetime import datetime
 import json
@@ -77,7 +79,7 @@ class Exporter():
             json_paths = models.common.sort_file_paths(json_paths)
         else:
             # Entity or subclass
-            json_paths = util.natural_sort(json_paths)
+            json_paths = sorted(json_paths, key=identifier.path_sort_key)
         json_paths_len = len(json_paths)
         
         Exporter._make_tmpdir(os.path.dirname(csv_path))
@@ -455,6 +457,105 @@ class ModifiedFilesError(Exception):
 class UncommittedFilesError(Exception):
     pass
 
+class ImportJournal():
+    """Records completed rows of a file import so that it can be resumed
+    
+    Each line is a JSON object with the row key, the new file ID, and the
+    git and annex files (relative to the collection) that have been
+    written but not yet staged.  When an import crashes partway, the next
+    run of the same CSV skips completed rows and stages their files along
+    with its own.  The journal is removed once everything is staged.
+    """
+    path = None
+    
+    def __init__(self, path):
+        """
+        @param path: str Absolute path to journal file
+        """
+        self.path = path
+        self.entries = self._read()
+    
+    def __repr__(self):
+        return "<%s.%s '%s'>" % (self.__module__, self.__class__.__name__, self.path)
+    
+    @staticmethod
+    def make_path(csv_path, cidentifier, base_dir=config.LOG_DIR):
+        """Journal path for a CSV file and collection
+        
+        @param csv_path: str Absolute path to CSV data file.
+        @param cidentifier: Identifier
+        @param base_dir: [optional] str
+        @returns: absolute path to journal
+        """
+        return os.path.join(
+            base_dir, 'import',
+            cidentifier.collection_id(),
+            '%s.journal' % os.path.basename(csv_path)
+        )
+    
+    @staticmethod
+    def row_key(rowd):
+        """Identifies a row by its ID and source file
+        
+        @param rowd: dict Row from CSV (before ingest.prepare_file pops basename_orig)
+        @returns: str
+        """
+        return '%s %s' % (rowd.get('id'), rowd.get('basename_orig'))
+    
+    def _read(self):
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        for line in fileio.read_text(self.path).splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # partial line written when the process died
+                continue
+            entries[entry['key']] = entry
+        return entries
+    
+    def completed(self, rowd):
+        """Whether row was completed by an earlier run
+        
+        @param rowd: dict
+        @returns: bool
+        """
+        return self.row_key(rowd) in self.entries
+    
+    def record(self, key, file_id, git_files, annex_files):
+        """Appends a completed row to the journal
+        
+        @param key: str See row_key
+        @param file_id: str
+        @param git_files: list Paths relative to collection
+        @param annex_files: list Paths relative to collection
+        """
+        entry = {
+            'key': key,
+            'id': file_id,
+            'git_files': git_files,
+            'annex_files': annex_files,
+        }
+        logdir = os.path.dirname(self.path)
+        if not os.path.exists(logdir):
+            os.makedirs(logdir)
+        fileio.append_text(json.dumps(entry), self.path)
+        self.entries[key] = entry
+    
+    def git_files(self):
+        return [path for entry in self.entries.values() for path in entry['git_files']]
+    
+    def annex_files(self):
+        return [path for entry in self.entries.values() for path in entry['annex_files']]
+    
+    def clear(self):
+        """Removes the journal file
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.entries = {}
+
 class Importer():
 
     @staticmethod
@@ -747,9 +848,15 @@ class Importer():
     @staticmethod
     def import_files(csv_path, cidentifier, vocabs_url, git_name, git_mail,
                      agent, row_start=0, row_end=9999999,
-                     tmp_dir=config.MEDIA_BASE, log_path=None, dryrun=False):
+                     tmp_dir=config.MEDIA_BASE, log_path=None, dryrun=False,
+                     workers=config.IMPORT_WORKERS, journal_path=None):
         """Adds or updates files from a CSV file
         
+        New files are hashed, copied, and thumbnailed in parallel threads
+        and staged all at once at the end.  Completed rows are recorded in
+        a journal (see ImportJournal) so that an interrupted import can be
+        resumed by running it again.
+        
         TODO how to handle excluded fields like XMP???
         
         @param csv_path: Absolute path to CSV data file.
@@ -760,6 +867,8 @@ class Importer():
         @param agent: str
         @param log_path: str Absolute path to addfile log for all files
         @param dryrun: boolean
+        @param workers: int Number of rows of new files prepared at once
+        @param journal_path: str Absolute path to journal (default ImportJournal.make_path)
         @returns: list git_files
         """
         logging.info('batch import files ----------------------------')
@@ -810,12 +919,16 @@ class Importer():
         
         logging.info('- - - - - - - - - - - - - - - - - - - - - - - -')
         logging.info('Adding new files')
+        journal = ImportJournal(
+            journal_path or ImportJournal.make_path(csv_path, cidentifier)
+        )
         git_files2 = Importer._add_new_files(
             rowds_new,
             fid_parents, entities, files,
             git_name, git_mail, agent,
             log_path, dryrun,
-            tmp_dir=tmp_dir
+            tmp_dir=tmp_dir,
+            repository=repository, workers=workers, journal=journal
         )
         logging.info('- - - - - - - - - - - - - - - - - - - - - - - -')
         
@@ -889,12 +1002,14 @@ class Importer():
         if (git_files or annex_files) and not dryrun:
             logging.info('Staging %s modified files' % len(git_files))
             start_stage = datetime.now(config.TZ)
-            # Stage annex files (binaries) before non-binary git files
+            # Annex files (binaries) are staged before non-binary git files
             # else binaries might end up in .git/objects/ which would be BAD
-            dvcs.annex_stage(repository, annex_files)
-            # If git_files contains binaries they are already staged by now.
-            dvcs.stage(repository, git_files)
-            staged = util.natural_sort(dvcs.list_staged(repository))
+            status = dvcs.stage_batch(
+                repository,
+                [path for paths in git_files for path in paths],
+                [path for paths in annex_files for path in paths],
+            )
+            staged = util.natural_sort(status['staged'])
             for path in staged:
                 if path in git_files:
                     logging.debug('+ %s' % path)
@@ -909,20 +1024,43 @@ class Importer():
     @staticmethod
     def _add_new_files(rowds, fid_parents, entities, files, git_name,
                        git_mail, agent, log_path, dryrun,
-                       tmp_dir=config.MEDIA_BASE):
+                       tmp_dir=config.MEDIA_BASE,
+                       repository=None, workers=1, journal=None):
+        """Adds new files; prepares rows in parallel, saves and stages serially
+        
+        Rows are hashed, copied, and thumbnailed (ingest.prepare_file) in
+        a pool of threads.  File and entity metadata are written
+        (ingest.save_file) one row at a time in this thread, in CSV order,
+        so that rows belonging to the same entity never write its JSON at
+        the same time.  Files are staged all at once at the end.
+        If a row fails the import stops: rows already done are in the
+        journal, and running the import again skips them and stages their
+        files along with the rest.
+        
+        @param rowds: list
+        @param fid_parents: dict
+        @param entities: dict
+        @param files: dict
+        @param git_name: str
+        @param git_mail: str
+        @param agent: str
+        @param log_path: str Absolute path to addfile log for all files
+        @param dryrun: boolean
+        @param tmp_dir: str
+        @param repository: GitPython Repo (required unless dryrun)
+        @param workers: int Number of rows prepared at once
+        @param journal: ImportJournal (optional) Skip/record completed rows
+        @returns: list of File objects, including rows done in earlier runs
+        """
         if log_path:
             logging.info('addfile logging to %s' % log_path)
         git_files = []
-        failures = []
         start = datetime.now(config.TZ)
         elapsed_rounds = []
         len_rowds = len(rowds)
+        
+        todo = []
         for n,rowd in enumerate(rowds):
-            logging.info('+ %s/%s - %s (%s)' % (
-                n+1, len_rowds, rowd['id'], rowd['basename_orig']
-            ))
-            start_round = datetime.now(config.TZ)
-
             fid = rowd['id']
             parent_id = fid_parents[fid].id
             file_ = files.get(fid)  # Note: no File object yet for new files
@@ -935,14 +1073,44 @@ class Importer():
             # NOTE: no File object yet for new files
             if file_ and (file_.identifier.model not in identifier.NODES):
                 parent = file_
-            
-            logging.debug('| parent %s' % (parent))
-            
-            if not dryrun:
-                file_,repo2,log2 = ingest.add_file(
-                    rowd, parent,
-                    git_name, git_mail, agent,
-                    tmp_dir=tmp_dir, log_path=log_path, show_staged=False
+            if journal and journal.completed(rowd):
+                logging.info('+ %s/%s - %s (%s) - done in earlier run' % (
+                    n+1, len_rowds, rowd['id'], rowd['basename_orig']
+                ))
+                git_files.append(identifier.Identifier(
+                    id=journal.entries[journal.row_key(rowd)]['id'],
+                    base_path=parent.identifier.basepath
+                ).object())
+                continue
+            todo.append((n, rowd, parent))
+        
+        if dryrun:
+            for n,rowd,parent in todo:
+                logging.info('+ %s/%s - %s (%s)' % (
+                    n+1, len_rowds, rowd['id'], rowd['basename_orig']
+                ))
+                logging.debug('| parent %s' % (parent))
+            return git_files
+        
+        stage_git = []
+        stage_annex = []
+        if journal:
+            stage_git = journal.git_files()
+            stage_annex = journal.annex_files()
+        # rows are prepared and saved in todo order
+        # (keys first: ingest.prepare_file pops basename_orig)
+        keys = [ImportJournal.row_key(rowd) for n,rowd,parent in todo]
+        done = 0
+        try:
+            for n,rowd,key,parent,log,file_,annex_files,elapsed_prep in Importer._prepare_new_files(
+                    todo, log_path, workers):
+                logging.info('+ %s/%s - %s (%s)' % (
+                    n+1, len_rowds, rowd.get('id'), key
+                ))
+                logging.debug('| parent %s' % (parent))
+                start_round = datetime.now(config.TZ)
+                new_git_files = ingest.save_file(
+                    file_, parent, git_name, git_mail, agent, log
                 )
                 # TODO integrate into ingest.add_file
                 if rowd.get('access_path'):
@@ -951,21 +1119,120 @@ class Importer():
                         git_name, git_mail, agent,
                         log_path=log_path, show_staged=False
                     )
+                if journal:
+                    journal.record(key, file_.id, new_git_files, annex_files)
+                stage_git += new_git_files
+                stage_annex += annex_files
                 git_files.append(file_)
-            
-            elapsed_round = datetime.now(config.TZ) - start_round
-            elapsed_rounds.append(elapsed_round)
-            logging.debug('| file   %s' % (file_))
-            logging.debug('| %s' % (elapsed_round))
-                  
-        elapsed = datetime.now(config.TZ) - start
-        logging.debug('%s added in %s' % (len(elapsed_rounds), elapsed))
-        if failures:
+                done += 1
+                
+                elapsed_round = elapsed_prep + (datetime.now(config.TZ) - start_round)
+                elapsed_rounds.append(elapsed_round)
+                logging.debug('| file   %s' % (file_))
+                logging.debug('| %s' % (elapsed_round))
+        except Exception as err:
             logging.error('************************************************************************')
-            for e in failures:
-                logging.error(e)
+            if done < len(todo):
+                logging.error('%s/%s - %s FAILED' % (
+                    todo[done][0]+1, len_rowds, keys[done]
+                ))
+            logging.error('%s: %s' % (type(err).__name__, err))
+            if journal:
+                logging.error(
+                    '%s rows done and not staged; run the import again to resume (journal %s)' % (
+                        len(journal.entries), journal.path
+                ))
             logging.error('************************************************************************')
-        return git_files,failures
+            raise
+        
+        elapsed = datetime.now(config.TZ) - start
+        logging.debug('%s added in %s' % (len(elapsed_rounds), elapsed))
+        
+        if stage_git or stage_annex:
+            Importer._stage_new_files(repository, stage_git, stage_annex)
+        if journal:
+            journal.clear()
+        return git_files
+    
+    @staticmethod
+    def _prepare_new_file(rowd, parent, log_path):
+        """Runs ingest.prepare_file for one row (in a worker thread)
+        
+        @returns: (log, file_, annex_files, elapsed)
+        """
+        start = datetime.now(config.TZ)
+        if log_path:
+            log = ingest.addfile_logger(log_path=log_path)
+        else:
+            log = ingest.addfile_logger(identifier=parent.identifier)
+        file_,annex_files = ingest.prepare_file(rowd, parent, log)
+        return log, file_, annex_files, datetime.now(config.TZ) - start
+    
+    @staticmethod
+    def _prepare_new_files(todo, log_path, workers=1):
+        """Prepares rows in a thread pool, yielding results in row order
+        
+        At most workers*2 rows are in flight.  If a row fails its
+        exception is raised here; rows not yet started are cancelled.
+        
+        @param todo: list of (n, rowd, parent)
+        @param log_path: str Absolute path to addfile log for all files
+        @param workers: int
+        @returns: generator of (n, rowd, key, parent, log, file_, annex_files, elapsed)
+        """
+        if workers < 2:
+            for n,rowd,parent in todo:
+                key = ImportJournal.row_key(rowd)
+                yield (n, rowd, key, parent) + Importer._prepare_new_file(
+                    rowd, parent, log_path
+                )
+            return
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                for n,rowd,parent in todo:
+                    key = ImportJournal.row_key(rowd)
+                    pending.append((n, rowd, key, parent, pool.submit(
+                        Importer._prepare_new_file, rowd, parent, log_path
+                    )))
+                    if len(pending) >= workers * 2:
+                        n,rowd,key,parent,future = pending.popleft()
+                        yield (n, rowd, key, parent) + future.result()
+                while pending:
+                    n,rowd,key,parent,future = pending.popleft()
+                    yield (n, rowd, key, parent) + future.result()
+            finally:
+                for item in pending:
+                    item[-1].cancel()
+    
+    @staticmethod
+    def _stage_new_files(repository, git_files, annex_files):
+        """Stages all new files at once, then makes sure nothing is left modified
+        
+        @param repository: GitPython Repo
+        @param git_files: list Paths relative to collection
+        @param annex_files: list Paths relative to collection
+        """
+        annex_files = sorted(set(annex_files))
+        git_files = sorted(set(
+            path for path in git_files if path not in annex_files
+        ))
+        logging.info('Staging %s new files' % (len(git_files) + len(annex_files)))
+        start_stage = datetime.now(config.TZ)
+        # Annex files (binaries) are staged before non-binary git files
+        # else binaries might end up in .git/objects/ which would be BAD
+        status = dvcs.stage_batch(repository, git_files, annex_files)
+        still_modified = dvcs.unstaged(status, git_files + annex_files)
+        if still_modified:
+            for path in still_modified:
+                logging.error('| still modified: %s' % path)
+            raise ModifiedFilesError(
+                '%s files could not be staged' % len(still_modified)
+            )
+        logging.debug('%s staged in %s' % (
+            len(git_files) + len(annex_files),
+            datetime.now(config.TZ) - start_stage
+        ))
     
     @staticmethod
     def register_entity_ids(csv_path, cidentifier, idservice_client, dryrun=True):
@@ -9,9 +9,11 @@ import click
 
 from DDR import commands
 from DDR import config
+from DDR import dvcs
 from DDR import fileio
 from DDR import identifier
 from DDR import idservice
+from DDR import ingest
 from DDR import models
 
 config_parser = configparser.ConfigParser()
@@ -79,6 +81,10 @@ $ ddr2 check /var/www/media/ddr/ddr-testing-123-1
 # Add file to entity (does not commit).
 $ ddr2 add -u USER -m MAIL master /tmp/addthese/file.jpg /var/www/media/ddr/ddr-testing-123-1
 
+# Make missing access files for a collection, or remake all of them, and stage (does not commit).
+$ ddr2 access --stage /var/www/media/ddr/ddr-testing-123
+$ ddr2 access --force --workers 8 --stage /var/www/media/ddr/ddr-testing-123
+
 # Update and commit modified files for the specified object(s).
 $ ddr2 save -u USER -m MAIL /var/www/media/ddr/ddr-testing-123-1
 
@@ -232,6 +238,27 @@ def add(role, src, entity, user, mail, log):
         git_name=user, git_mail=mail, agent=AGENT
     )
 
+@ddr.command()
+@click.argument('collection')
+@click.option('--force','-f', is_flag=True, help='Remake access files that already exist.')
+@click.option('--workers','-w', default=config.THUMBNAIL_WORKERS, help='Number of access files made at once.')
+@click.option('--stage','-s', is_flag=True, help='Stage access files (does not commit).')
+def access(collection, force, workers, stage):
+    """Make access files for files in collection.
+    """
+    collection_path = identifier.Identifier(collection).path_abs()
+    regenerated,errors = ingest.regenerate_access_files(
+        collection_path, force=force, workers=workers
+    )
+    for src,err in errors:
+        click.echo('ERROR %s: %s' % (src, err))
+    click.echo('%s access files made, %s errors' % (len(regenerated), len(errors)))
+    if stage and regenerated:
+        repo = dvcs.repository(collection_path)
+        status = dvcs.stage_batch(repo, annex_files=regenerated)
+        for path in dvcs.unstaged(status, regenerated):
+            click.echo('NOT STAGED %s' % path)
+
 @ddr.command()
 @click.argument('path')
 def check(path):
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 import click
@@ -5,6 +6,7 @@ import click
 from DDR import config
 from DDR.identifier import Identifier
 from DDR import models
+from DDR import pipeline
 from DDR import util
 
 ALGORITHMS = ['md5', 'sha1', 'sha256']
@@ -12,18 +14,17 @@ ALGORITHMS = ['md5', 'sha1', 'sha256']
 
 @click.command()
 @click.argument('repo')
+@click.option('--workers', '-w', default=util.HASH_WORKERS, help='Number of files hashed at once.')
 @click.option('--verbose', '-v', is_flag=True, help='Lots of output.')
-def ddrcheckbinaries(repo, verbose=False):
+def ddrcheckbinaries(repo, workers, verbose=False):
     """ddrcheckbinaries - Find binaries that don't match metadata hashes.
     
     \b
     Example:
         $ ddrcheckbinaries /var/www/media/base/ddr-testing-141
     """
-    filepaths = util.find_meta_files(
-        repo, recursive=1, model='file', force_read=True
-    )
-    hits = check_files(filepaths, verbose)
+    filepaths = pipeline.walk(repo, model='file', force_read=True)
+    hits = check_files(filepaths, verbose, workers)
 
 
 def check_file(json_path, verbose=False):
@@ -35,22 +36,19 @@ def check_file(json_path, verbose=False):
         print(result)
         return result
     
+    digests,size,elapsed = util.file_digests(f.path_abs, ALGORITHMS)
+    if verbose:
+        print('%s %s' % (f.path_abs, util.throughput(size, elapsed)))
     mismatches = []
-    md5 = util.file_hash(f.path_abs, 'md5')
-    if not (md5 == f.md5):
-        mismatches.append['md5']
-    sha1 = util.file_hash(f.path_abs, 'sha1')
-    if not (sha1 == f.sha1):
-        mismatches.append['sha1']
-    sha256 = util.file_hash(f.path_abs, 'sha256')
-    if not (sha256 == f.sha256):
-        mismatches.append['sha256']
+    for algo in ALGORITHMS:
+        if not (digests[algo] == getattr(f, algo)):
+            mismatches.append(algo)
     # SHA256 hash from the git-annex filename
     annex_sha256 = os.path.basename(
         os.path.realpath(f.path_abs)
     ).split('--')[1]
-    if not (sha256 == annex_sha256):
-        mismatches.append['annex_sha256']
+    if not (digests['sha256'] == annex_sha256):
+        mismatches.append('annex_sha256')
     
     if mismatches:
         mismatches.append(json_path)
@@ -58,10 +56,26 @@ def check_file(json_path, verbose=False):
     
     return mismatches
     
-def check_files(filepaths, verbose=False):
+def check_files(filepaths, verbose=False, workers=1):
+    """
+    Files are hashed in threads; hashlib releases the GIL while hashing
+    so several large binaries can be read and hashed at once.
+    
+    @param filepaths: iterable of file .json paths, e.g. from pipeline.walk
+    @param verbose: boolean
+    @param workers: int Number of files hashed at once
+    @returns: list of mismatches
+    """
     hits = []
-    for json_path in filepaths:
-        mismatches = check_file(json_path)
-        if mismatches:
-            hits.append(mismatches)
+    if workers < 2:
+        for json_path in filepaths:
+            mismatches = check_file(json_path, verbose)
+            if mismatches:
+                hits.append(mismatches)
+        return hits
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for mismatches in pool.map(
+                lambda json_path: check_file(json_path, verbose), filepaths):
+            if mismatches:
+                hits.append(mismatches)
     return hits
@@ -30,7 +30,6 @@ from datetime import datetime
 import logging
 logger = logging.getLogger(__name__)
 import os
-import re
 import sys
 
 import click
@@ -40,7 +39,7 @@ from DDR import batch
 from DDR import dvcs
 from DDR import fileio
 from DDR import identifier
-from DDR import util
+from DDR import pipeline
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -120,12 +119,12 @@ def fieldcsv(collectionsdir, cidpattern, model, fieldname, csvfile):
     @param fieldname str: 
     @param csvfile str: 
     """
-    collection_paths = [
-        path for path in util.natural_sort(util.find_meta_files(
-            basedir=collectionsdir, model='collection', recursive=1, force_read=1
-        ))
+    collection_paths = sorted([
+        path for path in pipeline.walk(
+            collectionsdir, model='collection', force_read=True
+        )
         if cidpattern in path
-    ]
+    ], key=identifier.path_sort_key)
     for collection_path in collection_paths:
         print(collection_path)
         try:
@@ -170,18 +169,16 @@ def export(model, collection, destination, blank, required, idfile, include, exc
     else:
         logging.info('All paths in %s' % collection_path)
         paths = all_paths(collection_path, model)
-    logging.info('found %s paths' % len(paths))
 
+    # filter paths as they are found
     if include:
         logging.info('Including paths: "%s"' % include)
-        paths = filter_paths(paths, include)
-    
+        paths = pipeline.filter_paths(paths, include)
     if exclude:
         logging.info('Excluding paths: "%s"' % exclude)
-        before = len(paths)
-        paths = filter_paths(paths, exclude, exclude=True)
-        num_excluded = len(paths) - before
-        logging.info('excluded %s' % abs(num_excluded))
+        paths = pipeline.filter_paths(paths, exclude, exclude=True)
+    # Exporter sorts paths so they must all be in hand
+    paths = list(paths)
     
     if not paths and not (blank):
         raise Exception('ERROR: Could not find metadata paths.')
@@ -256,18 +253,13 @@ def filter_paths(paths, pattern, exclude=False):
     @param exclude: boolean If true, exclude paths matching pattern.
     @returns: list of absolute paths
     """
-    prog = re.compile(pattern)
-    if exclude:
-        return [path for path in paths if not prog.search(path)]
-    else:
-        return [path for path in paths if prog.search(path)]
+    return list(pipeline.filter_paths(paths, pattern, exclude))
 
 def all_paths(collection_path, model):
     """Get all .json paths for specified model.
     
     @param collection_path: str Absolute path to collection repo
     @param model: str One of ['collection', 'entity', 'file']
+    @returns: generator of absolute paths
     """
-    return util.find_meta_files(
-        basedir=collection_path, model=model, recursive=1, force_read=1
-    )
+    return pipeline.walk(collection_path, model=model, force_read=True)
@@ -23,6 +23,11 @@ username and/or password at the commandline to skip the prompts:
 You can send all add-file log entries to the same file:
     $ ddrimport file -L /tmp/mylogfile.log ...
 
+New files are hashed, copied, and thumbnailed several at a time:
+    $ ddrimport file --workers 8 ...
+If a file import is interrupted, run the same command again.  Rows that
+were completed are skipped and their files are staged with the rest.
+
 ID service username and password can be exported to environment variables:
     $ export DDRID_USER='gjost'
     $ export DDRID_PASS='REDACTED'
@@ -188,8 +193,9 @@ def entity(csv, collection, user, mail, username, password, idservice, nocheck,
 @click.option('--dryrun','-d', help="Simulated run-through; don't modify files.")
 @click.option('--fromto', '-F', help="Only import specified rows. Use Python list syntax e.g. '523:711' or ':200' or '100:'.")
 @click.option('--log','-l', help='(optional) Log addfile to this path')
+@click.option('--workers','-w', default=config.IMPORT_WORKERS, help='Number of new files processed at once.')
 # TODO @click.option('--nocheck','-N', help="Disable checking/validation (may take time on large collections).")
-def file(csv, collection, user, mail, nocheck, dryrun, fromto, log):
+def file(csv, collection, user, mail, nocheck, dryrun, fromto, log, workers):
     """Import file records from CSV.
     """
     start = datetime.now()
@@ -213,6 +219,7 @@ def file(csv, collection, user, mail, nocheck, dryrun, fromto, log):
         dryrun=dryrun,
         row_start=row_start,
         row_end=row_end,
+        workers=workers,
     )
     
     finish = datetime.now()
@@ -47,6 +47,8 @@ Get document as JSON (formatted)
 
 Remove document
   $ ddrindex delete DOCTYPE DOCUMENTID
+Remove collection and all its children, without the filesystem
+  $ ddrindex delete --recurse --bulk --confirm ddr-testing-123
 
 Search
   $ ddrindex search collection,entity Minidoka
@@ -54,8 +56,10 @@ Search
 Delete existing indices
   $ ddrindex destroy --confirm
 
-Reindex
-  $ ddrindex reindex --index source --target dest
+Reindex (e.g. after mappings change) into new versioned indices, then
+point the model aliases at them.  Re-run with the same --version to resume.
+  $ ddrindex reindex
+  $ ddrindex reindex --models entity,file --rps 500 --version 20240101
 
 Post arbitrary JSON documents:
   $ ddrindex postjson DOCTYPE DOCUMENTID /PATH/TO/DOCUMENT.json
@@ -242,6 +246,44 @@ def destroy(hosts, confirm):
         click.echo("Add '--confirm' if you're sure you want to do this.")
 
 
+@ddrindex.command()
+@click.option('--hosts','-h',
+              default=config.DOCSTORE_HOST, envvar='DOCSTORE_HOST',
+              help='Elasticsearch hosts.')
+@click.option('--models','-m', default='',
+              help='Comma-separated list of models (default: all).')
+@click.option('--version','-v', default='',
+              help='Suffix for new indices (default: timestamp). Reuse to resume.')
+@click.option('--slices','-s', default='auto', help='Number of reindex slices or "auto".')
+@click.option('--rps','-r', default=-1.0,
+              help='Throttle, in documents per second (-1: unthrottled).')
+@click.option('--poll','-p', default=docstore.REINDEX_POLL_INTERVAL,
+              help='Seconds between progress checks.')
+@click.option('--delete-old', is_flag=True,
+              help='Delete old indices (required the first time, when model names are indices).')
+def reindex(hosts, models, version, slices, rps, poll, delete_old):
+    """Copy model indices to new indices and swap aliases (blue/green)
+    
+    \b
+    For each model, creates a new versioned index with the current mappings,
+    copies documents with a sliced, throttled reindex task, checks that the
+    document counts match, then atomically points the model's alias
+    (e.g. "ddrentity") at the new index.  Searches keep working throughout.
+    """
+    if slices.isdigit():
+        slices = int(slices)
+    models = [model.strip() for model in models.split(',') if model.strip()]
+    statuses = docstore.Docstore(hosts).reindex_models(
+        models, version, slices, rps, poll, delete_old
+    )
+    for status in statuses:
+        level = 'debug' if status['swapped'] else 'error'
+        logprint(level, '%s %s -> %s (%s/%s) %s' % (
+            status['model'], status['source'], status['dest'],
+            status['dest_count'], status['source_count'], status['message']
+        ))
+
+
 @ddrindex.command()
 @click.option('--hosts','-h',
               default=config.DOCSTORE_HOST, envvar='DOCSTORE_HOST',
@@ -303,13 +345,43 @@ def postjson(hosts, doctype, object_id, path):
               help='Elasticsearch hosts.')
 @click.option('--recurse','-r', is_flag=True, help='Publish documents under this one.')
 @click.option('--force','-f', is_flag=True, help='Publish regardless of status.')
+@click.option('--incremental','-i', is_flag=True,
+              help='Only publish changes since last publish (collection only).')
+@click.option('--bulk','-b', is_flag=True, help='Use Elasticsearch bulk API.')
+@click.option('--chunksize','-c',
+              default=config.DOCSTORE_BULK_CHUNK_SIZE,
+              help='(bulk) Documents per request.')
+@click.option('--threads','-t',
+              default=config.DOCSTORE_BULK_THREADS,
+              help='(bulk) Number of threads sending requests.')
+@click.option('--processes','-p',
+              default=config.DOCSTORE_BULK_PROCESSES,
+              help='(bulk) Number of processes building documents.')
 @click.argument('path')
-def publish(hosts, recurse, force, path):
+def publish(hosts, recurse, force, incremental, bulk, chunksize, threads, processes, path):
     """Post the document and its children to Elasticsearch
+    
+    With --bulk, documents are sent in batches rather than one at a time.
+    This is much faster for large collections.  Use --processes to build
+    documents on several CPU cores.
+    
+    With --incremental, only objects that changed in commits since the
+    collection was last published (with --incremental) are posted, and
+    objects that were removed are deleted.  Implies --recurse.
     """
-    status = docstore.Docstore(hosts).post_multi(
-        path, recursive=recurse, force=force
-    )
+    ds = docstore.Docstore(hosts)
+    if incremental:
+        status = ds.post_changed(
+            path, force=force, bulk=bulk,
+            chunk_size=chunksize, threads=threads, processes=processes
+        )
+    elif bulk:
+        status = ds.post_bulk(
+            path, recursive=recurse, force=force,
+            chunk_size=chunksize, threads=threads, processes=processes
+        )
+    else:
+        status = ds.post_multi(path, recursive=recurse, force=force)
     click.echo(status)
 
 
@@ -354,13 +426,22 @@ def narrators(hosts, path):
               default=config.DOCSTORE_HOST, envvar='DOCSTORE_HOST',
               help='Elasticsearch hosts.')
 @click.option('--recurse','-r', is_flag=True, help='Delete documents under this one.')
+@click.option('--bulk','-b', is_flag=True,
+              help='Delete by ID in all indices without reading the filesystem.')
 @click.option('--confirm', is_flag=True, help='Yes I really want to delete these objects.')
 @click.argument('object_id')
-def delete(hosts, recurse, confirm, object_id):
+def delete(hosts, recurse, bulk, confirm, object_id):
     """Delete the specified document from Elasticsearch
+    
+    \b
+    With --bulk, documents are deleted by ID prefix using delete_by_query
+    (or bulk delete actions), so the collection need not be checked out.
+    Prints the number of documents deleted from each index.
     """
     if confirm:
-        click.echo(docstore.Docstore(hosts).delete(object_id, recursive=recurse))
+        click.echo(docstore.Docstore(hosts).delete(
+            object_id, recursive=recurse, bulk=bulk
+        ))
     else:
         click.echo("Add '--confirm' if you're sure you want to do this.")
 
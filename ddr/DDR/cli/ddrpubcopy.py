@@ -213,13 +213,9 @@ def filter_files(files: List[Path],
         ]
         if oi.idparts['role'] in roles
     ]
-    parents = {
-        oid: oi.object()
-        for oid,oi in docstore._all_parents(oidentifiers).items()
-    }
     publishable = [
         x['identifier'].object()
-        for x in docstore.publishable(oidentifiers, parents)
+        for x in docstore.iter_publishable(oidentifiers)
         if x['action'] == 'POST'
     ] 
     logprint(LOG, '%s publishable objects' % len(publishable))
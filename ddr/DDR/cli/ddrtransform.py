@@ -1,5 +1,4 @@
 from datetime import datetime
-import fnmatch
 import logging
 import os
 import sys
@@ -10,8 +9,8 @@ from DDR import config
 from DDR import commands
 from DDR import dvcs
 from DDR import identifier
+from DDR import pipeline
 from DDR import vocab
-from DDR import util
 
 logging.basicConfig(
     level=logging.INFO,
@@ -65,36 +64,23 @@ def transform(collection, filter='', models='', topics=None, created=None, commi
     collection = cidentifier.object()
     logging.info(collection)
     
-    logging.info('Finding metadata files')
-    paths = util.find_meta_files(
-        collection.identifier.path_abs(),
-        recursive=True,
-        force_read=True
-    )
-    logging.info('%s paths' % len(paths))
-    
     TOPICS = vocab.get_vocabs(config.VOCABS_URL)['topics']
-    # filter out paths
-    these_paths = []
-    for path in paths:
-        oi = identifier.Identifier(path)
-        if filter and (not fnmatch.fnmatch(oi.id, filter)):
-            continue
-        if models and (oi.model not in ONLY_THESE):
-            continue
-        these_paths.append(path)
-    if len(these_paths) != len(paths):
-        logging.info('%s after filters' % len(these_paths))
     
     logging.info('Writing')
-    num = len(these_paths)
-    for n,path in enumerate(these_paths):
-        logging.info('%s/%s %s' % (n, num, path))
-        o = identifier.Identifier(path).object()
-        if filter and (not fnmatch.fnmatch(o.id, filter)):
-            continue
-        if models and (o.identifier.model not in ONLY_THESE):
-            continue
+    # objects are found, filtered, and loaded as they are needed
+    identifiers = pipeline.meta_files(
+        collection.identifier.path_abs(),
+        models=ONLY_THESE,
+        pattern=filter,
+        force_read=True
+    )
+    paths = []
+    num = 0
+    for n,o in enumerate(pipeline.load(identifiers)):
+        num = n + 1
+        path = o.identifier.path_abs('json')
+        logging.info('%s %s' % (n, path))
+        paths.append(path)
         
         if o.identifier.model in ['entity', 'segment']:
             o.children(force_read=True)
@@ -125,5 +111,5 @@ def transform(collection, filter='', models='', topics=None, created=None, commi
     
     end = datetime.now()
     elapsed = end - start
-    per = elapsed / num
+    per = elapsed / max(num, 1)
     logging.info('DONE (%s elapsed, %s per object)' % (elapsed, per))
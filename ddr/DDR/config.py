@@ -62,6 +62,15 @@ LOG_FILE = CONFIG.get('local','log_file')
 
 UTF8_STRICT = CONFIG.getboolean('cmdln','utf8_strict')
 
+# Opt-in cache for Identifier.object() (see DDR.objectcache); 0 disables
+OBJECT_CACHE_MAX_OBJECTS = CONFIG.getint('cmdln', 'object_cache_max_objects', fallback=0)
+OBJECT_CACHE_MAX_MB = CONFIG.getint('cmdln', 'object_cache_max_mb', fallback=256)
+# Opt-in cache for search.Searcher results (see DDR.searchcache); 0 disables
+SEARCH_CACHE_MAX_ENTRIES = CONFIG.getint('cmdln', 'search_cache_max_entries', fallback=0)
+SEARCH_CACHE_TTL = CONFIG.getint('cmdln', 'search_cache_ttl', fallback=300)
+# Threads hashing/copying/thumbnailing rows in batch file imports
+IMPORT_WORKERS = CONFIG.getint('cmdln', 'import_workers', fallback=4)
+
 try:
     DEFAULT_TIMEZONE = CONFIG.get('cmdln','default_timezone')
 except:
@@ -94,6 +103,15 @@ ACCESS_FILE_OPTIONS  = CONFIG.get('cmdln','access_file_options')
 THUMBNAIL_GEOMETRY   = CONFIG.get('cmdln','thumbnail_geometry')
 THUMBNAIL_COLORSPACE = 'sRGB'
 THUMBNAIL_OPTIONS    = CONFIG.get('cmdln','thumbnail_options')
+# Threads making access files at once (see DDR.imaging.thumbnails)
+THUMBNAIL_WORKERS = CONFIG.getint('cmdln', 'thumbnail_workers', fallback=4)
+# Make JPEG/TIFF/PNG access files in-process with pyvips or Pillow if installed
+THUMBNAIL_FAST_PATH = CONFIG.getboolean('cmdln', 'thumbnail_fast_path', fallback=True)
+# ImageMagick resource limits for source files larger than threshold (bytes)
+CONVERT_LARGEFILE_THRESHOLD = CONFIG.getint('cmdln', 'convert_largefile_threshold', fallback=768000)
+CONVERT_LARGEFILE_OPTIONS = CONFIG.get(
+    'cmdln', 'convert_largefile_options', fallback='-limit memory 2GB -limit map 4GB'
+)
 
 TEMPLATE_EAD_JINJA2 = os.path.join(REPO_MODELS_PATH, 'templates', 'ead.xml.j2')
 TEMPLATE_METS_JINJA2 = os.path.join(REPO_MODELS_PATH, 'templates', 'mets.xml.j2')
@@ -127,6 +145,16 @@ DOCSTORE_ENABLED = CONFIG.getboolean('local','docstore_enabled')
 DOCSTORE_TIMEOUT = int(CONFIG.get('local','docstore_timeout'))
 DOCSTORE_HOST_LOCAL = CONFIG.get('local','docstore_host')
 DOCSTORE_HOST = CONFIG.get('public','docstore_host')
+DOCSTORE_BULK_CHUNK_SIZE = CONFIG.getint('public', 'docstore_bulk_chunk_size', fallback=500)
+DOCSTORE_BULK_THREADS = CONFIG.getint('public', 'docstore_bulk_threads', fallback=1)
+DOCSTORE_BULK_PROCESSES = CONFIG.getint('public', 'docstore_bulk_processes', fallback=1)
+# Hits per request when scanning (Docstore.scan, Searcher.scan)
+DOCSTORE_SCAN_SIZE = CONFIG.getint('public', 'docstore_scan_size', fallback=1000)
+# Internet Archive metadata cache (see DDR.archivedotorg.IAMetaCache)
+IA_CACHE_DIR = CONFIG.get('public', 'ia_cache_dir', fallback='/tmp/ddr-iameta')
+IA_CACHE_TTL = CONFIG.getint('public', 'ia_cache_ttl', fallback=604800)
+IA_CACHE_NEGATIVE_TTL = CONFIG.getint('public', 'ia_cache_negative_ttl', fallback=86400)
+IA_PREFETCH_WORKERS = CONFIG.getint('public', 'ia_prefetch_workers', fallback=4)
 RESULTS_PER_PAGE = 25
 ELASTICSEARCH_MAX_SIZE = 10000
 ELASTICSEARCH_DEFAULT_LIMIT = RESULTS_PER_PAGE
@@ -3,6 +3,7 @@ import logging
 from typing import Any, Dict, List, Match, Optional, Set, Tuple, Union
 
 from DDR import identifier
+from DDR import modules
 
 
 def make_row_dict(headers: List[str], row: List[str]) -> OrderedDict:
@@ -167,16 +168,11 @@ def check_row_values(module, headers, valid_values, rowd):
     invalid = []
     if not validate_id(rowd['id']):
         invalid.append('id')
+    codecs = modules.codecs(module.module)
     for field in headers:
         try:
-            value = module.function(
-                'csvload_%s' % field,
-                rowd[field]
-            )
-            valid = module.function(
-                'csvvalidate_%s' % field,
-                [valid_values, value]
-            )
+            value = codecs.apply('csvload', field, rowd[field])
+            valid = codecs.apply('csvvalidate', field, [valid_values, value])
             if not valid:
                 invalid.append(field)
         except ValueError as err:
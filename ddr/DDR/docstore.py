@@ -29,37 +29,56 @@ d.delete(os.path.basename(PATH), recursive=True)
 ------------------------------------------------------------------------
 """
 from __future__ import print_function
-from collections import OrderedDict
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 from datetime import datetime
+from functools import lru_cache
 import json
 import logging
 logger = logging.getLogger(__name__)
 import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
 from elasticsearch import Elasticsearch, TransportError
+from elasticsearch import helpers
 from elasticsearch.client import SnapshotClient
 import elasticsearch_dsl
+from git.exc import GitCommandError
 import requests
 
+from DDR import archivedotorg
 from DDR import config
 from DDR import converters
+from DDR import dvcs
 from DDR import fileio
+from DDR import json_loads
+from DDR import manifest
 from DDR.identifier import Identifier
 from DDR.identifier import ELASTICSEARCH_CLASSES
 from DDR.identifier import ELASTICSEARCH_CLASSES_BY_MODEL
 from DDR.identifier import ID_COMPONENTS, InvalidInputException
-from DDR.identifier import MODEL_REPO_MODELS
-from DDR.identifier import MODULES, module_for_name
+from DDR.identifier import MODEL_REPO_MODELS, MODELS_IDPARTS
+from DDR.identifier import MODULES, module_for_name, path_sort_key
 from DDR import modules
+from DDR import pipeline
+from DDR import searchcache
 from DDR import util
 from DDR import vocab
 
 INDEX_PREFIX = 'ddr'
 
 MAX_SIZE = 10000
+# Seconds between checks of reindex task progress
+REINDEX_POLL_INTERVAL = 10
+# How long Elasticsearch keeps search context between scan requests
+SCAN_KEEP_ALIVE = '5m'
 DEFAULT_PAGE_SIZE = 20
 
+# Documents waiting to be built/sent per process (see Docstore._bulk_actions)
+BULK_PENDING_PER_PROCESS = 4
+
 SUCCESS_STATUSES = [200, 201]
 STATUS_OK = ['completed']
 PUBLIC_OK = [1,'1']
@@ -84,7 +103,7 @@ results = elasticsearch.facet_terms(settings.ELASTICSEARCH_HOST_PORT,
 
 def load_json(path):
     try:
-        data = json.loads(fileio.read_text(path))
+        data = json_loads(fileio.read_text(path))
     except json.JSONDecodeError:
         raise Exception('json.errors.JSONDecodeError reading %s' % path)
     return data
@@ -540,7 +559,7 @@ class Docstore():
         @param document: Collection,Entity,File The object to post.
         @param public_fields: list
         @param additional_fields: dict
-        @param parents: dict Basic metadata for parent documents.
+        @param parents: dict Parent objects by ID (optional, read if absent).
         @param force: boolean Bypass status and public checks.
         @returns: JSON dict with status code and response
         """
@@ -552,12 +571,9 @@ class Docstore():
             can_publish = True
             public = False
         else:
-            if not parents:
-                parents = {
-                    oid: oi.object()
-                    for oid,oi in _all_parents([document.identifier]).items()
-                }
-            can_publish = publishable([document.identifier], parents)
+            objects = dict(parents)
+            objects[document.identifier.id] = document
+            can_publish = Publishability(objects).effective(document.identifier)
             public = True
         if not can_publish:
             return {'status':403, 'response':'object not publishable'}
@@ -568,6 +584,7 @@ class Docstore():
             index=self.index_name(document.identifier.model),
             using=self.es
         )
+        searchcache.invalidate([self.index_name(document.identifier.model)])
         logger.debug(str(results))
         return results
     
@@ -589,38 +606,34 @@ class Docstore():
         @returns: number successful,list of paths that didn't work out
         """
         logger.debug('index(%s, %s, %s)' % (path, recursive, force))
+        if recursive:
+            archivedotorg.prefetch(path)
+        return self._post_paths(_publish_paths(path, recursive), force)
+    
+    def _post_paths(self, paths, force=False):
+        """Publish (index) objects at the specified paths.
         
-        publicfields = _public_fields()
-        
-        # process a single file if requested
-        if os.path.isfile(path):
-            paths = [path]
-        else:
-            # files listed first, then entities, then collections
-            paths = util.find_meta_files(path, recursive, files_first=1)
+        See post_multi.
         
+        @param paths: iterable of metadata paths, files first
+        @param force: boolean Just publish the damn collection already.
+        @returns: number successful,list of paths that didn't work out
+        """
         # Determine if paths are publishable or not
-        identifiers = [Identifier(path) for path in paths]
-        parents = {
-            oid: oi.object()
-            for oid,oi in _all_parents(identifiers).items()
-        }
-        paths = publishable(
-            identifiers,
-            parents,
-            force=force
-        )
+        # Paths are streamed; parents are checked as they are encountered
+        paths = iter_publishable(pipeline.identify(paths), force=force)
         
+        num = 0
         skipped = 0
         successful = 0
         bad_paths = []
         
-        num = len(paths)
         for n,path in enumerate(paths):
+            num = n + 1
             oi = path.get('identifier')
             # TODO write logs instead of print
-            print('%s | %s/%s %s %s %s' % (
-                datetime.now(config.TZ), n+1, num, path['action'], oi.id, path['note'])
+            print('%s | %s %s %s %s' % (
+                datetime.now(config.TZ), n+1, path['action'], oi.id, path['note'])
             )
             
             if not oi:
@@ -646,11 +659,11 @@ class Docstore():
             
             # post document
             if path['action'] == 'POST':
-                created = self.post(document, parents=parents, force=True)
+                created = self.post(document, force=True)
                 # force=True bypasses publishable in post() function
             # delete previously published items now marked incomplete/private
             elif existing_v and (path['action'] == 'SKIP'):
-                print('%s | %s/%s DELETE' % (datetime.now(config.TZ), n+1, num))
+                print('%s | %s DELETE' % (datetime.now(config.TZ), n+1))
                 self.delete(oi.id)
             
             if path['action'] == 'SKIP':
@@ -678,8 +691,254 @@ class Docstore():
                 print(status)
             
         logger.debug('INDEXING COMPLETED')
-        return {'total':len(paths), 'skipped':skipped, 'successful':successful, 'bad':bad_paths}
-     
+        return {'total':num, 'skipped':skipped, 'successful':successful, 'bad':bad_paths}
+    
+    def post_bulk(self, path, recursive=False, force=False,
+                  chunk_size=config.DOCSTORE_BULK_CHUNK_SIZE,
+                  threads=config.DOCSTORE_BULK_THREADS,
+                  processes=config.DOCSTORE_BULK_PROCESSES):
+        """Publish (index) document and (optionally) its children in bulk
+        
+        Same as post_multi but instead of three or four requests per object
+        (get, post, get, maybe delete) documents are sent in chunks using
+        elasticsearch.helpers.streaming_bulk, or parallel_bulk if threads > 1.
+        Unpublishable objects are deleted (missing documents are ignored).
+        Created/updated/error status comes from the bulk response items.
+        If processes > 1 documents are built in parallel by a process pool.
+        
+        @param path: Absolute path to directory containing object metadata files.
+        @param recursive: Whether or not to recurse into subdirectories.
+        @param force: boolean Just publish the damn collection already.
+        @param chunk_size: int Number of documents per request.
+        @param threads: int Number of threads sending requests.
+        @param processes: int Number of processes building documents.
+        @returns: dict {'total', 'skipped', 'successful', 'created', 'updated', 'deleted', 'bad'}
+        """
+        logger.debug('post_bulk(%s, %s, %s)' % (path, recursive, force))
+        if recursive:
+            archivedotorg.prefetch(path)
+        return self._post_bulk_paths(
+            _publish_paths(path, recursive), force, chunk_size, threads, processes
+        )
+    
+    def _post_bulk_paths(self, paths, force=False,
+                         chunk_size=config.DOCSTORE_BULK_CHUNK_SIZE,
+                         threads=config.DOCSTORE_BULK_THREADS,
+                         processes=config.DOCSTORE_BULK_PROCESSES):
+        """Publish (index) objects at the specified paths in bulk
+        
+        See post_bulk.
+        
+        @param paths: iterable of metadata paths, files first
+        @param force: boolean Just publish the damn collection already.
+        @param chunk_size: int Number of documents per request.
+        @param threads: int Number of threads sending requests.
+        @param processes: int Number of processes building documents.
+        @returns: dict
+        """
+        path_dicts = iter_publishable(pipeline.identify(paths), force=force)
+        
+        # Path dicts for actions sent but not yet acknowledged.
+        # Bulk helpers return results in the same order as actions.
+        sent = deque()
+        bad_paths = []
+        actions = self._bulk_actions(path_dicts, sent, bad_paths, processes)
+        if threads > 1:
+            results = helpers.parallel_bulk(
+                self.es, actions, thread_count=threads, chunk_size=chunk_size,
+                raise_on_error=False, raise_on_exception=False
+            )
+        else:
+            results = helpers.streaming_bulk(
+                self.es, actions, chunk_size=chunk_size,
+                raise_on_error=False, raise_on_exception=False
+            )
+        
+        counts = {'total': 0, 'skipped': 0, 'created': 0, 'updated': 0, 'deleted': 0}
+        for n,(ok,item) in enumerate(results):
+            path = sent.popleft()
+            status = _bulk_item_status(ok, item)
+            if status in ['created', 'updated']:
+                counts[status] += 1
+            elif status in ['deleted', 'not_found']:
+                counts['skipped'] += 1
+                if status == 'deleted':
+                    counts['deleted'] += 1
+            else:
+                path['note'] = status
+                bad_paths.append(path)
+            # TODO write logs instead of print
+            print('%s | %s %s %s %s %s' % (
+                datetime.now(config.TZ), n+1, path['action'], path['identifier'].id,
+                status.upper(), path['note'])
+            )
+        counts['total'] = counts['created'] + counts['updated'] \
+            + counts['skipped'] + len(bad_paths)
+        counts['successful'] = counts['created'] + counts['updated']
+        counts['bad'] = bad_paths
+        searchcache.invalidate(self._model_index_names())
+        logger.debug('INDEXING COMPLETED')
+        return counts
+    
+    def post_changed(self, path, force=False, bulk=False,
+                     chunk_size=config.DOCSTORE_BULK_CHUNK_SIZE,
+                     threads=config.DOCSTORE_BULK_THREADS,
+                     processes=config.DOCSTORE_BULK_PROCESSES):
+        """Publish only objects that changed since the collection was last indexed
+        
+        The commit that was last published to this docstore is recorded in
+        the repository (see indexed_commit).  Objects whose JSON changed
+        between then and HEAD are published, and objects whose JSON was
+        deleted are removed from the index.  If a collection or entity's
+        publishability (public/status) changed, all of its descendants are
+        republished too.  If no commit is recorded (or it can no longer be
+        found) the whole collection is published.
+        
+        The new commit is only recorded if nothing went wrong, so that
+        failures are retried on the next run.
+        NOTE: Uncommitted changes are not detected.
+        
+        @param path: Absolute path to collection repository.
+        @param force: boolean Just publish the damn collection already.
+        @param bulk: boolean Use the bulk API (see post_bulk)
+        @param chunk_size: int (bulk) Number of documents per request.
+        @param threads: int (bulk) Number of threads sending requests.
+        @param processes: int (bulk) Number of processes building documents.
+        @returns: dict (see post_multi, post_bulk) plus 'since', 'until', 'deleted'
+        """
+        repo_path = manifest.repo_root(path)
+        repo = dvcs.repository(repo_path)
+        until = repo.head.commit.hexsha
+        since = indexed_commit(repo_path, self.hosts)
+        changes = None
+        if since:
+            try:
+                changes = changed_paths(repo, since, until)
+            except GitCommandError as err:
+                logger.error('Cannot diff %s..%s: %s' % (since, until, err))
+        if changes is None:
+            logger.info('No usable index record; publishing everything')
+            paths = _publish_paths(repo_path, recursive=True)
+            deleted = []
+        else:
+            paths,deleted = changes
+            paths = pipeline.files_first(paths)
+        
+        if bulk:
+            status = self._post_bulk_paths(
+                paths, force, chunk_size, threads, processes
+            )
+        else:
+            status = self._post_paths(paths, force)
+        status['deleted'] = status.get('deleted', 0) + self._delete_paths(deleted)
+        status['since'] = since
+        status['until'] = until
+        if not status['bad']:
+            set_indexed_commit(repo_path, self.hosts, until)
+        return status
+    
+    def _delete_paths(self, paths):
+        """Remove documents for (deleted) metadata paths in one bulk request
+        
+        @param paths: list of absolute paths
+        @returns: int number of documents deleted
+        """
+        actions = [
+            {
+                '_op_type': 'delete',
+                '_index': self.index_name(oi.model),
+                '_id': oi.id,
+            }
+            for oi in pipeline.identify(paths)
+        ]
+        deleted = 0
+        for ok,item in helpers.streaming_bulk(
+                self.es, actions, raise_on_error=False, raise_on_exception=False):
+            status = _bulk_item_status(ok, item)
+            print('%s | DELETE %s %s' % (
+                datetime.now(config.TZ), list(item.values())[0].get('_id'), status.upper())
+            )
+            if status == 'deleted':
+                deleted += 1
+        searchcache.invalidate([action['_index'] for action in actions])
+        return deleted
+    
+    def _bulk_actions(self, path_dicts, sent, bad_paths, processes=1):
+        """Bulk API actions for output of iter_publishable
+        
+        If processes > 1 documents are built (see _build_bulk_action) in
+        a process pool.  Actions are still yielded in order, and no more
+        than a few per process are in flight at once so that workers
+        can't get far ahead of the bulk sender.
+        
+        @param path_dicts: iterable of dicts from iter_publishable
+        @param sent: deque Path dicts of actions that were generated
+        @param bad_paths: list Path dicts of objects that could not be loaded
+        @param processes: int Number of processes building documents.
+        @returns: generator of bulk action dicts
+        """
+        def delete_action(oi):
+            # delete previously published items now marked incomplete/private
+            return {
+                '_op_type': 'delete',
+                '_index': self.index_name(oi.model),
+                '_id': oi.id,
+            }
+        
+        def handle(path, action, note):
+            if action:
+                sent.append(path)
+            else:
+                path['note'] = note
+                bad_paths.append(path)
+            return action
+        
+        if processes <= 1:
+            for path in path_dicts:
+                oi = path['identifier']
+                if path['action'] == 'POST':
+                    action,note = _build_bulk_action(
+                        oi.path_abs('json'), self.index_name(oi.model)
+                    )
+                else:
+                    action,note = delete_action(oi),''
+                if handle(path, action, note):
+                    yield action
+            return
+        
+        pending = deque()
+        max_pending = processes * BULK_PENDING_PER_PROCESS
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            def finish_one():
+                path,future = pending.popleft()
+                if path['action'] == 'POST':
+                    try:
+                        action,note = future.result()
+                    except Exception as err:
+                        action,note = None,'Could not build document: %s' % err
+                else:
+                    action,note = future,''
+                return handle(path, action, note)
+            
+            for path in path_dicts:
+                oi = path['identifier']
+                if path['action'] == 'POST':
+                    future = executor.submit(
+                        _build_bulk_action,
+                        oi.path_abs('json'), self.index_name(oi.model)
+                    )
+                else:
+                    future = delete_action(oi)
+                pending.append((path, future))
+                while len(pending) >= max_pending:
+                    action = finish_one()
+                    if action:
+                        yield action
+            while pending:
+                action = finish_one()
+                if action:
+                    yield action
+    
     def exists(self, model, document_id):
         """
         @param model:
@@ -733,7 +992,7 @@ class Docstore():
             body=query,
         )
     
-    def delete(self, document_id, recursive=False):
+    def delete(self, document_id, recursive=False, bulk=False):
         """Delete a document and optionally its children.
         
         TODO refactor after upgrading Elasticsearch past 2.4.
@@ -744,10 +1003,17 @@ class Docstore():
         document_id, find all paths beneath it in the filesystem,
         and curl DELETE url each individual document from Elasticsearch.
         
+        With bulk=True documents are deleted by ID without looking at the
+        filesystem (see delete_bulk).
+        
         @param document_id:
         @param recursive: True or False
+        @param bulk: boolean Use delete_bulk
+        @returns: None, or with bulk dict of per-index counts
         """
         logger.debug('delete(%s, %s)' % (document_id, recursive))
+        if bulk:
+            return self.delete_bulk(document_id, recursive)
         oi = Identifier(document_id, config.MEDIA_BASE)
         if recursive:
             paths = util.find_meta_files(
@@ -775,6 +1041,89 @@ class Docstore():
                 oi.id,
                 r.status_code, r.reason
             ))
+        searchcache.invalidate([
+            self.index_name('entity' if oi.model == 'segment' else oi.model)
+            for oi in identifiers
+        ])
+
+    def delete_bulk(self, document_id, recursive=False,
+                    chunk_size=config.DOCSTORE_BULK_CHUNK_SIZE):
+        """Delete a document and optionally its children without the filesystem
+        
+        Documents are matched by ID in every model index: the document itself
+        and, if recursive, every document whose ID starts with document_id
+        followed by a dash (e.g. ddr-test-123-1 matches ddr-test-123-1-master-abc
+        but not ddr-test-123-10).  Uses delete_by_query if the cluster allows
+        it, otherwise scans the index and sends bulk delete actions.
+        
+        @param document_id: str
+        @param recursive: True or False
+        @param chunk_size: int Number of bulk delete actions per request.
+        @returns: dict Number of documents deleted per index
+        """
+        logger.debug('delete_bulk(%s, %s)' % (document_id, recursive))
+        query = _delete_query(document_id, recursive)
+        counts = OrderedDict()
+        for indexname in self._model_index_names():
+            try:
+                result = self.es.delete_by_query(
+                    index=indexname, body=query,
+                    conflicts='proceed', refresh=True, ignore_unavailable=True
+                )
+                counts[indexname] = result.get('deleted', 0)
+            except TransportError as err:
+                logger.debug('delete_by_query %s failed (%s); using bulk' % (
+                    indexname, err
+                ))
+                counts[indexname] = self._delete_matching(
+                    indexname, query, chunk_size
+                )
+            print('%s | DELETE %s %s %s' % (
+                datetime.now(config.TZ), indexname, document_id, counts[indexname]
+            ))
+        searchcache.invalidate(list(counts.keys()))
+        return counts
+    
+    def _model_index_names(self):
+        """Names of the indices for each model defined in ddr-defs/repo_models/elastic.py
+        
+        @returns: list of index names
+        """
+        names = []
+        for i in ELASTICSEARCH_CLASSES['all']:
+            name = self.index_name(i['doctype'])
+            if name not in names:
+                names.append(name)
+        return names
+    
+    def _delete_matching(self, indexname, query, chunk_size=config.DOCSTORE_BULK_CHUNK_SIZE):
+        """Delete documents matching query with bulk delete actions
+        
+        @param indexname: str
+        @param query: dict
+        @param chunk_size: int Number of actions per request.
+        @returns: int number of documents deleted
+        """
+        if not self.index_exists(indexname):
+            return 0
+        actions = (
+            {
+                '_op_type': 'delete',
+                '_index': indexname,
+                '_id': hit['_id'],
+            }
+            for hit in helpers.scan(
+                self.es, index=indexname, query=query, _source=False
+            )
+        )
+        deleted = 0
+        for ok,item in helpers.streaming_bulk(
+                self.es, actions, chunk_size=chunk_size,
+                raise_on_error=False, raise_on_exception=False):
+            if _bulk_item_status(ok, item) == 'deleted':
+                deleted += 1
+        self.es.indices.refresh(index=indexname)
+        return deleted
 
     def search(self, doctypes=[], query={}, sort=[], fields=[], from_=0, size=MAX_SIZE):
         """Executes a query, get a list of zero or more hits.
@@ -818,6 +1167,33 @@ class Docstore():
         )
         return results
     
+    def scan(self, doctypes=[], query={}, size=config.DOCSTORE_SCAN_SIZE,
+             keep_alive=SCAN_KEEP_ALIVE):
+        """Yields all hits for a query, not limited to MAX_SIZE
+        
+        Unlike search(), hits are fetched in batches of size as they are
+        consumed (see scan_hits), so whole indices can be exported or
+        audited in constant memory.  Aggregations, from, and size in the
+        query are ignored.
+        
+        >>> q = docstore.search_query(must=[{'term': {'collection_id': 'ddr-test-123'}}])
+        >>> for hit in docstore.Docstore().scan(['entity','file'], q):
+        ...     print(hit['_id'])
+        
+        @param doctypes: list Type of object ('collection', 'entity', 'file')
+        @param query: dict The search definition using Elasticsearch Query DSL
+        @param size: int Number of hits per request
+        @param keep_alive: str How long to keep search context between requests
+        @returns: generator of raw ElasticSearch hit dicts
+        """
+        logger.debug('scan(doctypes=%s, query=%s, size=%s)' % (doctypes, query, size))
+        if not query:
+            raise Exception(
+                "Can't do an empty search. Give me something to work with here."
+            )
+        indices = ','.join([self.index_name(m) for m in doctypes])
+        return scan_hits(self.es, indices, query, size, keep_alive)
+    
     def reindex(self, source, dest):
         """Copy documents from one index to another.
         
@@ -868,6 +1244,150 @@ class Docstore():
             )
         return results
     
+    def reindex_models(self, models=[], version=None, slices='auto',
+                       requests_per_second=-1, poll_interval=REINDEX_POLL_INTERVAL,
+                       delete_old=False):
+        """Blue/green reindex of model indices (see reindex_model)
+        
+        @param models: list Model names (default: all models in ddr-defs)
+        @param version: str Suffix for new indices (default: timestamp)
+        @param slices: int or 'auto' Number of parallel reindex slices
+        @param requests_per_second: float Throttle; -1 means unthrottled
+        @param poll_interval: int Seconds between task progress checks
+        @param delete_old: boolean Delete old indices when swapping aliases
+        @returns: list of dicts (see reindex_model)
+        """
+        if not models:
+            models = [i['doctype'] for i in ELASTICSEARCH_CLASSES['all']]
+        if not version:
+            version = datetime.now(config.TZ).strftime('%Y%m%d%H%M%S')
+        return [
+            self.reindex_model(
+                model, version, slices, requests_per_second,
+                poll_interval, delete_old
+            )
+            for model in models
+        ]
+    
+    def reindex_model(self, model, version, slices='auto',
+                      requests_per_second=-1, poll_interval=REINDEX_POLL_INTERVAL,
+                      delete_old=False):
+        """Copy a model's index to a new versioned index and swap the alias
+        
+        The model's index name (e.g. "ddrentity") becomes an alias that
+        points to a versioned index (e.g. "ddrentity-20240101120000").
+        - Create the new index using the current mappings from ddr-defs.
+        - Start a sliced, throttled reindex task, or reattach to one that is
+          already copying into the new index, and poll it until it finishes.
+        - Refresh and compare document counts in the old and new indices.
+        - Atomically point the alias at the new index.
+        
+        Documents are copied with op_type=create and conflicts=proceed, so
+        running again with the same version after a failure resumes the
+        copy instead of starting over.  If the model's index name is still
+        a real index rather than an alias, it can only be replaced (and its
+        data removed) with delete_old=True.
+        
+        @param model: str
+        @param version: str Suffix for the new index
+        @param slices: int or 'auto' Number of parallel reindex slices
+        @param requests_per_second: float Throttle; -1 means unthrottled
+        @param poll_interval: int Seconds between task progress checks
+        @param delete_old: boolean Delete old indices when swapping aliases
+        @returns: dict {'model', 'alias', 'source', 'dest', 'source_count', 'dest_count', 'swapped', 'message'}
+        """
+        alias = self.index_name(model)
+        dest = '%s-%s' % (alias, version)
+        status = {
+            'model': model, 'alias': alias, 'source': alias, 'dest': dest,
+            'source_count': 0, 'dest_count': 0, 'swapped': False, 'message': '',
+        }
+        old_indices = self._alias_indices(alias)
+        concrete = (not old_indices) and self.index_exists(alias)
+        if dest in old_indices:
+            status['message'] = 'Alias already points to %s' % dest
+            return status
+        if not (old_indices or concrete):
+            status['message'] = 'Source index does not exist'
+            return status
+        if concrete and not delete_old:
+            status['message'] = '%s is an index, not an alias; ' \
+                'use delete_old to replace it' % alias
+            return status
+        
+        if not self.index_exists(dest):
+            ELASTICSEARCH_CLASSES_BY_MODEL[model].init(index=dest, using=self.es)
+        task_id = self._reindex_task(dest)
+        if not task_id:
+            body = {
+                'conflicts': 'proceed',
+                'source': {'index': alias},
+                'dest': {'index': dest, 'op_type': 'create'},
+            }
+            task_id = self.es.reindex(
+                body=body, slices=slices,
+                requests_per_second=requests_per_second,
+                wait_for_completion=False,
+            )['task']
+        task = self._wait_for_task(task_id, poll_interval)
+        failures = task.get('response', {}).get('failures') or task.get('error')
+        if failures:
+            status['message'] = 'Reindex failed: %s' % failures
+            return status
+        
+        self.es.indices.refresh(index=alias)
+        self.es.indices.refresh(index=dest)
+        status['source_count'] = self.es.count(index=alias)['count']
+        status['dest_count'] = self.es.count(index=dest)['count']
+        if status['source_count'] != status['dest_count']:
+            status['message'] = 'Counts do not match; alias not swapped'
+            return status
+        
+        self.es.indices.update_aliases(body={
+            'actions': alias_actions(alias, dest, old_indices, concrete, delete_old)
+        })
+        searchcache.invalidate([alias])
+        status['swapped'] = True
+        status['message'] = 'ok'
+        return status
+    
+    def _alias_indices(self, alias):
+        """Names of indices the alias points to ([] if not an alias)
+        """
+        if not self.es.indices.exists_alias(name=alias):
+            return []
+        return sorted(self.es.indices.get_alias(name=alias).keys())
+    
+    def _reindex_task(self, dest):
+        """ID of a running reindex task copying into dest, if any
+        """
+        tasks = self.es.tasks.list(actions='*reindex', detailed=True)
+        for node in tasks.get('nodes', {}).values():
+            for task_id,task in node.get('tasks', {}).items():
+                if (not task.get('parent_task_id')) \
+                and ('[%s]' % dest in task.get('description', '')):
+                    return task_id
+        return None
+    
+    def _wait_for_task(self, task_id, poll_interval=REINDEX_POLL_INTERVAL):
+        """Polls the task API until the task completes, printing progress
+        
+        @param task_id: str
+        @param poll_interval: int Seconds between checks
+        @returns: dict Task API output
+        """
+        while True:
+            task = self.es.tasks.get(task_id=task_id)
+            s = task['task']['status']
+            print('%s | %s %s/%s created:%s conflicts:%s' % (
+                datetime.now(config.TZ), task_id,
+                s.get('created', 0) + s.get('updated', 0) + s.get('version_conflicts', 0),
+                s.get('total', 0), s.get('created', 0), s.get('version_conflicts', 0),
+            ))
+            if task.get('completed'):
+                return task
+            time.sleep(poll_interval)
+    
     def backup(self, snapshot, indices=[]):
         """Make a snapshot backup of one or more Elasticsearch indices.
         
@@ -953,6 +1473,30 @@ def make_index_name(text):
                 name.append(char.lower())
     return ''.join(name)
 
+def alias_actions(alias, new_index, old_indices=[], concrete=False, delete_old=False):
+    """Actions for update_aliases that point alias at new_index, atomically
+    
+    >>> alias_actions('ddrentity', 'ddrentity-2', ['ddrentity-1'])
+    [{'remove': {'index': 'ddrentity-1', 'alias': 'ddrentity'}}, {'add': {'index': 'ddrentity-2', 'alias': 'ddrentity'}}]
+    
+    @param alias: str
+    @param new_index: str
+    @param old_indices: list Indices the alias points to now
+    @param concrete: boolean alias is currently the name of an index
+    @param delete_old: boolean Delete old indices (required if concrete)
+    @returns: list of dicts
+    """
+    actions = []
+    if concrete:
+        actions.append({'remove_index': {'index': alias}})
+    for index in old_indices:
+        if delete_old:
+            actions.append({'remove_index': {'index': index}})
+        else:
+            actions.append({'remove': {'index': index, 'alias': alias}})
+    actions.append({'add': {'index': new_index, 'alias': alias}})
+    return actions
+
 def doctype_fields(es_class):
     """List content fields in DocType subclass (i.e. appear in _source).
     
@@ -960,6 +1504,158 @@ def doctype_fields(es_class):
     """
     return list(es_class._doc_type.mapping.to_dict()['properties'].keys())
 
+class ESFieldPlan():
+    """What DDRObject.to_esobject needs to know about a model's fields
+    
+    Worked out once per model (see field_plan) instead of once per object.
+    """
+    model = ''
+    es_class = None
+    public_fields: List[str] = []
+    # (fieldname, is_public, index_function or None) for each doctype field
+    fields: List[Tuple[str, bool, Optional[Callable]]] = []
+    list_fields = None
+    
+    def __init__(self, model, fields_module):
+        """
+        @param model: str
+        @param fields_module: collection, entity, files model definitions module
+        """
+        self.model = model
+        self.es_class = ELASTICSEARCH_CLASSES_BY_MODEL[model]
+        self.public_fields = [
+            f['name']
+            for f in fields_module.FIELDS
+            if f['elasticsearch']['public']
+        ]
+        public = set(self.public_fields)
+        index_functions = modules.codecs(fields_module).index
+        self.fields = [
+            (fieldname, fieldname in public, index_functions.get(fieldname))
+            for fieldname in doctype_fields(self.es_class)
+        ]
+        self.list_fields = None
+        if hasattr(self.es_class, 'list_fields'):
+            self.list_fields = self.es_class.list_fields()
+    
+    def __repr__(self):
+        return "<%s.%s %s>" % (self.__module__, self.__class__.__name__, self.model)
+
+@lru_cache(maxsize=None)
+def field_plan(model, fields_module):
+    """Returns the (cached) ESFieldPlan for a model
+    
+    @param model: str
+    @param fields_module: collection, entity, files model definitions module
+    @returns: ESFieldPlan
+    """
+    return ESFieldPlan(model, fields_module)
+
+def lineage_breadcrumbs(oi):
+    """Breadcrumbs for an object and its (non-stub) ancestors
+    
+    Ancestors' breadcrumbs are cached (see _ancestor_breadcrumbs) so
+    objects in the same collection/entity share them.
+    
+    @param oi: Identifier
+    @returns: list of dicts {'id', 'model', 'idpart', 'label'}
+    """
+    crumbs = [_breadcrumb(oi)]
+    parent_id = oi.parent_id(stubs=False)
+    if parent_id:
+        crumbs += [dict(crumb) for crumb in _ancestor_breadcrumbs(parent_id)]
+    return crumbs
+
+@lru_cache(maxsize=1024)
+def _ancestor_breadcrumbs(oid):
+    """Breadcrumbs for an object ID and its ancestors (see lineage_breadcrumbs)
+    
+    @param oid: str
+    @returns: tuple of dicts (do not modify)
+    """
+    oi = Identifier(oid)
+    crumbs = (_breadcrumb(oi),)
+    parent_id = oi.parent_id(stubs=False)
+    if parent_id:
+        crumbs += _ancestor_breadcrumbs(parent_id)
+    return crumbs
+
+def _breadcrumb(oi):
+    idpart = MODELS_IDPARTS[oi.model][-1][-1]
+    return {
+        'id': oi.id,
+        'model': oi.model,
+        'idpart': str(idpart),
+        'label': str(oi.idparts[idpart]),
+    }
+
+def scan_hits(es, index, body, size=config.DOCSTORE_SCAN_SIZE,
+              keep_alive=SCAN_KEEP_ALIVE):
+    """Yields all hits for a search body, a batch at a time
+    
+    Uses a point in time and search_after, which unlike from/size paging
+    does not get slower with each page.  Falls back to the scroll API if
+    the client or cluster does not support points in time (before 7.10),
+    or the cluster cannot sort on _shard_doc (before 7.12).
+    
+    @param es: elasticsearch.Elasticsearch
+    @param index: str Comma-separated index names
+    @param body: dict Elasticsearch query DSL (aggs, from, size are ignored)
+    @param size: int Number of hits per request
+    @param keep_alive: str How long to keep search context between requests
+    @returns: generator of raw ElasticSearch hit dicts
+    """
+    query = {
+        key: val for key,val in body.items()
+        if key not in ['aggs', 'aggregations', 'from', 'size']
+    }
+    pit_id = None
+    if hasattr(es, 'open_point_in_time'):
+        try:
+            pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)['id']
+        except TransportError as err:
+            logger.debug('No point in time (%s); using scroll' % err)
+    else:
+        logger.debug('Client has no point in time; using scroll')
+    if not pit_id:
+        yield from helpers.scan(
+            es, index=index, query=query, size=size, scroll=keep_alive
+        )
+        return
+    body = dict(query)
+    body['size'] = size
+    shard_doc = not body.get('sort')
+    if shard_doc:
+        body['sort'] = ['_shard_doc']
+    use_scroll = False
+    try:
+        while True:
+            body['pit'] = {'id': pit_id, 'keep_alive': keep_alive}
+            try:
+                response = es.search(body=body)
+            except TransportError as err:
+                if not shard_doc or body.get('search_after'):
+                    raise
+                # nothing yielded yet, so scroll can start over
+                logger.debug('No _shard_doc sort (%s); using scroll' % err)
+                use_scroll = True
+                break
+            pit_id = response.get('pit_id', pit_id)
+            hits = response['hits']['hits']
+            yield from hits
+            if len(hits) < size:
+                break
+            body['search_after'] = hits[-1]['sort']
+    finally:
+        try:
+            es.close_point_in_time(body={'id': pit_id})
+        except TransportError as err:
+            logger.error('Could not close point in time: %s' % err)
+    if use_scroll:
+        yield from helpers.scan(
+            es, index=index, query=query, size=size, scroll=keep_alive
+        )
+
 def _clean_dict(data):
     """Remove null or empty fields; ElasticSearch chokes on them.
     
@@ -1012,6 +1708,179 @@ def _public_fields(modules=MODULES):
     public_fields['file'].append('id')
     return public_fields
 
+def _publish_paths(path, recursive=False):
+    """Metadata paths to publish for post_multi/post_bulk, files first
+    
+    @param path: Absolute path to metadata file or directory
+    @param recursive: Whether or not to recurse into subdirectories.
+    @returns: iterable of absolute paths
+    """
+    # process a single file if requested
+    if os.path.isfile(path):
+        return [path]
+    # files listed first, then entities, then collections
+    return pipeline.files_first(pipeline.walk(path, recursive))
+
+INDEXED_FILENAME = 'ddr-docstore.json'
+
+def _indexed_path(repo_path):
+    return os.path.join(repo_path, '.git', INDEXED_FILENAME)
+
+def indexed_commit(repo_path, hosts):
+    """Commit of collection that was last published to the docstore at hosts
+    
+    Recorded in .git/ddr-docstore.json, by docstore host and index prefix.
+    
+    @param repo_path: str Absolute path to collection repository
+    @param hosts: str Elasticsearch hosts
+    @returns: str commit hash or None
+    """
+    path = _indexed_path(repo_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        data = load_json(path)
+    except Exception as err:
+        logger.error('Bad index record %s: %s' % (path, err))
+        return None
+    return data.get('%s/%s' % (hosts, INDEX_PREFIX), {}).get('commit')
+
+def set_indexed_commit(repo_path, hosts, commit):
+    """Record the collection commit that was published to the docstore at hosts
+    
+    @param repo_path: str Absolute path to collection repository
+    @param hosts: str Elasticsearch hosts
+    @param commit: str commit hash
+    """
+    path = _indexed_path(repo_path)
+    data = {}
+    if os.path.exists(path):
+        try:
+            data = load_json(path)
+        except Exception:
+            pass
+    data['%s/%s' % (hosts, INDEX_PREFIX)] = {
+        'commit': commit,
+        'indexed': datetime.now(config.TZ).isoformat(),
+    }
+    fileio.write_text(json.dumps(data, indent=4), path)
+
+def changed_paths(repo, since, until='HEAD'):
+    """Metadata paths to post and delete to bring index from one commit to another
+    
+    Changed .json files are posted and deleted ones are removed.
+    If a collection or entity's public or status field changed, the
+    publishability of its descendants may have changed as well so they
+    are all included.
+    
+    @param repo: git.Repo
+    @param since: str Commit hash
+    @param until: str Commit hash
+    @returns: (list of paths to post, list of deleted paths)
+    """
+    repo_path = repo.working_dir
+    changed,deleted = dvcs.list_changed(repo, since, until)
+    changed = [
+        os.path.join(repo_path, path) for path in changed
+        if _is_meta_path(path)
+    ]
+    deleted = [
+        os.path.join(repo_path, path) for path in deleted
+        if _is_meta_path(path)
+    ]
+    paths = set(changed)
+    for path in changed:
+        oi = Identifier(path)
+        if oi.model == 'file':
+            continue
+        if _publish_fields_at(repo, since, path) != _publish_fields_at(repo, until, path):
+            logger.info('%s publishability changed' % oi.id)
+            paths.update(pipeline.walk(oi.path_abs(), recursive=True))
+    return sorted(paths, key=path_sort_key),deleted
+
+def _is_meta_path(path):
+    """True if path (relative to repository) is an object metadata file"""
+    if not path.endswith('.json'):
+        return False
+    return util.path_matches_model(path, 'collection') \
+        or util.path_matches_model(path, 'entity') \
+        or util.path_matches_model(path, 'file')
+
+def _publish_fields_at(repo, commit, path):
+    """Values of fields that determine publishability of object at a commit
+    
+    @param repo: git.Repo
+    @param commit: str Commit hash
+    @param path: str Absolute path to metadata file
+    @returns: dict {'public': ..., 'status': ...} (empty if not present)
+    """
+    path_rel = os.path.relpath(path, repo.working_dir)
+    try:
+        text = repo.git.show('%s:%s' % (commit, path_rel))
+    except GitCommandError:
+        return {}
+    fields = {}
+    for item in json_loads(text):
+        for key in ['public', 'status']:
+            if (key in item) and (key not in fields):
+                fields[key] = item[key]
+    return fields
+
+def _delete_query(document_id, recursive=False):
+    """Query matching a document and (optionally) its descendants by ID
+    
+    >>> _delete_query('ddr-test-123', recursive=True)
+    {'query': {'bool': {'should': [{'term': {'id': 'ddr-test-123'}}, {'prefix': {'id': 'ddr-test-123-'}}], 'minimum_should_match': 1}}}
+    
+    @param document_id: str
+    @param recursive: boolean
+    @returns: dict
+    """
+    should = [{'term': {'id': document_id}}]
+    if recursive:
+        should.append({'prefix': {'id': '%s-' % document_id}})
+    return {
+        'query': {
+            'bool': {
+                'should': should,
+                'minimum_should_match': 1,
+            }
+        }
+    }
+
+def _build_bulk_action(json_path, indexname):
+    """Loads object and builds its bulk index action (same as post(force=True))
+    
+    Module-level so that it can run in a ProcessPoolExecutor worker.
+    
+    @param json_path: str Absolute path to object's JSON file
+    @param indexname: str
+    @returns: (action, note) action is a dict, or None with an error note
+    """
+    try:
+        document = Identifier(json_path).object()
+    except Exception as err:
+        return None,'Could not instantiate: %s' % err
+    if not document:
+        return None,'No document'
+    action = document.to_esobject(public=False).to_dict(include_meta=True)
+    action['_index'] = indexname
+    return action,''
+
+def _bulk_item_status(ok, item):
+    """Status of one object from elasticsearch.helpers.streaming_bulk results
+    
+    @param ok: bool
+    @param item: dict e.g. {'index': {'_id': ..., 'result': 'created', 'status': 201}}
+    @returns: str 'created', 'updated', 'deleted', 'not_found', or error message
+    """
+    op_type,info = list(item.items())[0]
+    if ok:
+        return info.get('result', 'ok')
+    if (op_type == 'delete') and (info.get('status') == 404):
+        return 'not_found'
+    return 'ERROR %s: %s' % (info.get('status'), info.get('error', info.get('exception')))
+
 def _all_parents(identifiers, excluded_models=['file']):
     """Given a list of identifiers, finds all the parents
     @param identifiers list: List of Identifiers
@@ -1025,28 +1894,141 @@ def _all_parents(identifiers, excluded_models=['file']):
                 parents[pi.id] = pi
     return parents
         
-def publishable(identifiers, parents, force=False):
+def publish_fields(oi):
+    """Reads an object's public and status fields without loading the object
+    
+    Applies jsonload_* functions and FIELDS defaults like models.load_json.
+    
+    @param oi: Identifier
+    @returns: dict {'public': ..., 'status': ...}
+    """
+    fieldnames = ['public', 'status']
+    data = fileio.read_fields(oi.path_abs('json'), fieldnames)
+    module = oi.fields_module()
+    codecs = modules.codecs(module)
+    for f in getattr(module, 'FIELDS', []):
+        fieldname = f['name']
+        if fieldname not in fieldnames:
+            continue
+        if fieldname in data:
+            value = codecs.apply('jsonload', fieldname, data[fieldname])
+            if isinstance(value, str):
+                value = value.strip()
+            data[fieldname] = value
+        else:
+            data[fieldname] = f.get('default', None)
+    return data
+
+def is_publishable(model, public, status):
+    """Determines if an object with these field values can be published
+    
+    Does not take the object's parents into account (see Publishability).
+    
+    @param model: str
+    @param public: Value of the object's public field
+    @param status: Value of the object's status field
+    @returns: boolean
+    """
+    # TODO Hard-coded - use identifier
+    if model == 'file':
+        return public in PUBLIC_OK
+    return bool(public and status) \
+        and (public in PUBLIC_OK) \
+        and (status in STATUS_OK)
+
+class Publishability():
+    """Memoized publishability of objects in the tree
+    
+    An object is publishable if its own public/status fields allow it
+    and its parent is publishable.  Only the public and status fields
+    are read from each object's JSON (see publish_fields), each object
+    is read at most once, and results are cached by object ID so
+    siblings share the work done for their parents.
+    
+    >>> resolver = Publishability()
+    >>> resolver.own(oi)        # object's own fields
+    >>> resolver.effective(oi)  # object and all its parents
+    
+    Ancestors that have no metadata file (e.g. organization) do not
+    affect publishability.
+    """
+    
+    def __init__(self, objects={}):
+        """
+        @param objects: dict Objects by ID, used instead of reading their JSON
+        """
+        self.own_cache: Dict[str, bool] = {}
+        self.effective_cache: Dict[str, bool] = {}
+        for oid,o in objects.items():
+            self.own_cache[oid] = is_publishable(
+                o.identifier.model,
+                getattr(o, 'public', None), getattr(o, 'status', None)
+            )
+    
+    def own(self, oi):
+        """Whether the object's own fields allow it to be published
+        
+        @param oi: Identifier
+        @returns: boolean
+        """
+        if oi.id not in self.own_cache:
+            fields = publish_fields(oi)
+            self.own_cache[oi.id] = is_publishable(
+                oi.model, fields.get('public'), fields.get('status')
+            )
+        return self.own_cache[oi.id]
+    
+    def parents(self, oi):
+        """Whether all of the object's parents are publishable
+        
+        @param oi: Identifier
+        @returns: boolean
+        """
+        pi = oi.parent()
+        if not pi:
+            return True
+        return self.effective(pi)
+    
+    def effective(self, oi):
+        """Whether the object and all of its parents are publishable
+        
+        @param oi: Identifier
+        @returns: boolean
+        """
+        if oi.id not in self.effective_cache:
+            if (oi.id not in self.own_cache) \
+            and not os.path.exists(oi.path_abs('json')):
+                # not an object with metadata (e.g. organization)
+                result = self.parents(oi)
+            else:
+                result = self.own(oi) and self.parents(oi)
+            self.effective_cache[oi.id] = result
+        return self.effective_cache[oi.id]
+
+def publishable(identifiers, parents={}, force=False):
     """Determines which paths represent publishable paths and which do not.
     
     @param identifiers list
-    @param parents dict: Parent objects by object ID
+    @param parents dict: Parent objects by object ID (optional)
     @param force: boolean Just publish the damn collection already.
     @returns list of dicts, e.g. [{'path':'/PATH/TO/OBJECT', 'action':'publish'}]
     """
-    def object_is_publishable(o):
-        """Determines if individual item is publishable."""
-        # TODO Hard-coded - use identifier
-        if o.identifier.model == 'file':
-            if o.public in PUBLIC_OK:
-                return True
-        else:
-            if (o.public and o.status) \
-            and (o.public in PUBLIC_OK) \
-            and (o.status in STATUS_OK):
-                return True
-        return False
+    return list(iter_publishable(identifiers, parents, force))
+
+def iter_publishable(identifiers, parents={}, force=False, resolver=None):
+    """Generator version of publishable
     
-    path_dicts = []
+    Parent objects are optional; any that are not provided are read
+    as needed and remembered by the resolver.
+    
+    @param identifiers iterable
+    @param parents dict: Parent objects by object ID (optional)
+    @param force: boolean Just publish the damn collection already.
+    @param resolver: Publishability (optional) Reuse across calls.
+    @returns generator of dicts, e.g. {'path':'/PATH/TO/OBJECT', 'action':'publish'}
+    """
+    if resolver is None:
+        resolver = Publishability(parents)
     for oi in identifiers:
         d = {
             'path': oi.path_abs(),
@@ -1057,38 +2039,19 @@ def publishable(identifiers, parents, force=False):
         # --force
         if force:
             d['action'] = 'POST'
-            path_dicts.append(d)
-            continue
         # check this object
         # (don't bother checking parents if object is unpublishable)
-        canpublish = object_is_publishable(oi.object())
-        if not canpublish:
+        elif not resolver.own(oi):
             d['action'] = 'SKIP'
             d['note'] = 'unpublishable'
-            path_dicts.append(d)
-            continue
-        # check parents
         # object is unpublishable if parents are unpublishable
-        UNPUBLISHABLE = []
-        for n,pi in enumerate(oi.lineage()[1:]):
-            if pi != oi:
-                canp = object_is_publishable(parents[pi.id])
-                if not object_is_publishable(parents[pi.id]):
-                    UNPUBLISHABLE.append(pi.id)
-        if UNPUBLISHABLE:
+        elif not resolver.parents(oi):
             d['action'] = 'SKIP'
             d['note'] = 'parent unpublishable'
-            path_dicts.append(d)
-            continue
         # passed all the tests
-        if canpublish:
+        else:
             d['action'] = 'POST'
-            path_dicts.append(d)
-            continue
-        # otherwise...
-        d['action'] = 'SKIP'
-        path_dicts.append(d)
-    return path_dicts
+        yield d
 
 def aggs_dict(aggregations):
     """Simplify aggregations data in search results
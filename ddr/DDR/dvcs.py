@@ -1,5 +1,6 @@
 # git and git-annex code
 
+import atexit
 from datetime import datetime
 import json
 import logging
@@ -7,6 +8,8 @@ logger = logging.getLogger(__name__)
 import os
 import re
 import socket
+import subprocess
+import threading
 from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from dateutil import parser
@@ -281,6 +284,36 @@ def list_staged(repo: git.Repo) -> List[str]:
     stdout = repo.git.diff('--cached', '--name-only')
     return _parse_list_staged(stdout)
 
+def _parse_list_changed(diff: str) -> Tuple[List[str], List[str]]:
+    """Parses output of "git diff --name-status --no-renames".
+    
+    @returns: (list of added/modified files, list of deleted files)
+    """
+    changed = []
+    deleted = []
+    for line in diff.strip().split('\n'):
+        if not line.strip():
+            continue
+        status,path = line.split('\t', 1)
+        if status.startswith('D'):
+            deleted.append(path)
+        else:
+            changed.append(path)
+    return changed,deleted
+
+def list_changed(repo: git.Repo, since: str, until: str='HEAD') -> Tuple[List[str], List[str]]:
+    """Returns lists of files changed and deleted between two commits
+    
+    $ git diff --name-status --no-renames SINCE..UNTIL
+    
+    @param repo: A Gitpython Repo object
+    @param since: str Commit hash
+    @param until: str Commit hash
+    @return: (list of added/modified files, list of deleted files)
+    """
+    stdout = repo.git.diff('--name-status', '--no-renames', '%s..%s' % (since, until))
+    return _parse_list_changed(stdout)
+
 def _parse_list_committed(entry: str) -> List[str]:
     entrylines = [line for line in entry.split('\n') if '|' in line]
     files = [line.split('|')[0].strip() for line in entrylines]
@@ -317,6 +350,69 @@ def list_conflicted(repo: git.Repo) -> List[str]:
     stdout = repo.git.ls_files('--unmerged')
     return _parse_list_conflicted(stdout)
 
+def _parse_status_v2(text: str) -> Dict[str, List[str]]:
+    """Parses output of "git status --porcelain=v2 -z".
+    
+    Paths are not quoted and a renamed/copied entry is followed by its
+    original path as a separate field.
+    
+    @param text: str
+    @returns: dict of staged, modified, untracked, conflicted lists
+    """
+    status: Dict[str, List[str]] = {
+        'staged': [],
+        'modified': [],
+        'untracked': [],
+        'conflicted': [],
+    }
+    entries = iter(text.split('\0'))
+    for entry in entries:
+        if not entry or entry.startswith('#'):
+            continue
+        kind = entry[0]
+        if kind == '?':
+            status['untracked'].append(entry[2:])
+        elif kind == 'u':
+            status['conflicted'].append(entry.split(' ', 10)[10])
+        elif kind in ['1', '2']:
+            if kind == '1':
+                fields = entry.split(' ', 8)
+            else:
+                fields = entry.split(' ', 9)
+                # skip the original path
+                next(entries, None)
+            xy = fields[1]
+            path = fields[-1]
+            if xy[0] != '.':
+                status['staged'].append(path)
+            if xy[1] != '.':
+                status['modified'].append(path)
+    return status
+
+def status_snapshot(repo: git.Repo) -> Dict[str, List[str]]:
+    """Staged, modified, untracked, and conflicted files from one git command
+    
+    Like git_status but runs a single "git status" instead of four
+    commands.  Untracked files in untracked directories are listed
+    individually.
+    
+    @param repo: A Gitpython Repo object
+    @returns: dict of staged, modified, untracked, conflicted lists
+    """
+    return _parse_status_v2(
+        repo.git.status('--porcelain=v2', '-z', '--untracked-files=all')
+    )
+
+def unstaged(status: Dict[str, List[str]], paths: List[str]) -> List[str]:
+    """Lists paths that are still modified or untracked
+    
+    @param status: dict From status_snapshot
+    @param paths: list of file paths, relative to repo base
+    @returns: list
+    """
+    pending = set(status['modified']) | set(status['untracked'])
+    return [path for path in paths if path in pending]
+
 def git_status(repo: git.Repo) -> Dict[str, List[str]]:
     return {
         'staged': list_staged(repo),
@@ -557,6 +653,57 @@ def stage(repo: git.Repo, git_files: List[str]=[]):
     """
     repo.git.add([git_files])
 
+def _git_stdin(repo: git.Repo, args: List[str], lines: List[str], sep: str='\n') -> str:
+    """Runs a git command in repo with lines on stdin; returns stdout
+    
+    For commands that read paths from stdin (e.g. "--batch",
+    "--pathspec-from-file=-") so that thousands of paths take one process
+    and don't hit the command-line length limit.
+    
+    @param repo: A GitPython repository
+    @param args: list Arguments after "git"
+    @param lines: list of str
+    @param sep: str Separator written after each line
+    @returns: str
+    """
+    cmd = ['git'] + args
+    proc = subprocess.run(
+        cmd,
+        input=''.join('%s%s' % (line, sep) for line in lines),
+        cwd=repo.working_dir,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if proc.returncode:
+        raise GitCommandError(cmd, proc.returncode, proc.stderr, proc.stdout)
+    return proc.stdout
+
+def stage_batch(repo: git.Repo,
+                git_files: List[str]=[],
+                annex_files: List[str]=[]) -> Dict[str, List[str]]:
+    """Stages many files at once and returns the resulting status
+    
+    Annex files (binaries) are added by the repository's "git annex add
+    --batch" process (see annex_client), which is ended before the metadata
+    files are added with one "git add"; otherwise
+    binaries in git_files might end up in .git/objects.  Paths in both
+    lists are only annexed.  Check the result with unstaged().
+    
+    @param repo: A GitPython repository
+    @param git_files: list of file paths, relative to repo base
+    @param annex_files: list of annex file paths, relative to repo base
+    @returns: dict From status_snapshot
+    """
+    annex_stage(repo, annex_files)
+    annexed = set(annex_files)
+    git_files = [path for path in git_files if path not in annexed]
+    if git_files:
+        _git_stdin(
+            repo, ['add', '--pathspec-from-file=-', '--pathspec-file-nul'],
+            git_files, sep='\0'
+        )
+    return status_snapshot(repo)
+
 def commit(repo: git.Repo, msg: str, agent: str) -> git.Commit:
     """Commit some changes.
     
@@ -1116,7 +1263,9 @@ def annex_whereis_file(repo, file_path_rel, info=None):
     @param collection_uid: A valid DDR collection UID
     @return: dict
     """
-    data = json.loads(repo.git.annex('whereis', '--json', file_path_rel))
+    data = annex_client(repo).whereis(file_path_rel)
+    if not data:
+        raise Exception('Not an annex file: %s' % file_path_rel)
     data['timestamp'] = datetime.now()
     # mark this repo
     if not info:
@@ -1158,12 +1307,13 @@ def annex_trim(repo, confirmed=False):
         else:
             drop.append(path_rel)
     dropped = []
-    for path_rel in drop:
+    client = annex_client(repo)
+    for path_rel in list(drop):
         logging.debug(path_rel)
         if confirmed:
-            p = drop.remove(path_rel)
-            repo.git.annex('drop', '--force', p)
-            dropped.append(p)
+            drop.remove(path_rel)
+            client.drop(path_rel, force=True)
+            dropped.append(path_rel)
     return {
         'keep':keep,
         'drop':drop,
@@ -1173,11 +1323,29 @@ def annex_trim(repo, confirmed=False):
 def annex_stage(repo: git.Repo, annex_files: List[str]=[]):
     """Stage some files with git-annex.
     
+    Files are added by the repository's "git annex add --batch" process
+    (see annex_client) rather than a new git-annex for each file.  The
+    process is ended afterwards: git-annex may hold back index updates
+    until it exits, and it must not hold .git/index.lock while the caller
+    runs "git add" or "git status".
+    
     @param repo: A GitPython repository
     @param annex_files: list of annex file paths, relative to repo base
     """
-    for path in annex_files:
-        repo.git.annex('add', path)
+    if not annex_files:
+        return
+    client = annex_client(repo)
+    failed = []
+    try:
+        for path in annex_files:
+            result = client.add(path)
+            # None means git-annex skipped the file, e.g. already annexed
+            if result and not result.get('success'):
+                failed.append(path)
+    finally:
+        client.batch('add').close()
+    if failed:
+        raise Exception('git annex add failed: %s' % failed)
 
 def annex_file_targets(repo: git.Repo,
                        relative: bool=False) -> List[Tuple[Any, Any]]:
@@ -1207,6 +1375,202 @@ def annex_file_targets(repo: git.Repo,
     return paths
 
 
+# git-annex batch mode -------------------------------------------------
+
+class AnnexBatch():
+    """A long-running "git annex COMMAND --batch" process
+    
+    git-annex reads one item (path or key) per line and writes one line
+    per item, so startup is paid once instead of for every file.  Output is
+    parsed as JSON unless json=False; a blank line (git-annex skipped the
+    item) is returned as None.  The process is started on first use and
+    restarted if it dies.  Safe to share between threads.
+    """
+    program: List[str] = ['git', 'annex']
+    working_dir: str = ''
+    command: str = ''
+    args: List[str] = []
+    json: bool = True
+    
+    def __init__(self, working_dir: str, command: str, args: List[str]=[], json: bool=True):
+        """
+        @param working_dir: str Absolute path to repository
+        @param command: str git-annex command e.g. 'add', 'whereis'
+        @param args: list Extra arguments e.g. ['--force']
+        @param json: bool Pass --json and parse output
+        """
+        self.working_dir = working_dir
+        self.command = command
+        self.args = list(args)
+        self.json = json
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+    
+    def __repr__(self):
+        return "<%s.%s %s %s>" % (
+            self.__module__, self.__class__.__name__, self.working_dir, self.cmd()
+        )
+    
+    def cmd(self) -> List[str]:
+        cmd = self.program + [self.command, '--batch']
+        if self.json:
+            cmd.append('--json')
+        return cmd + self.args
+    
+    def _start(self) -> subprocess.Popen:
+        logging.debug('starting %s' % ' '.join(self.cmd()))
+        self._proc = subprocess.Popen(
+            self.cmd(),
+            cwd=self.working_dir,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            universal_newlines=True, bufsize=1,
+        )
+        return self._proc
+    
+    def query(self, item: str) -> Optional[Any]:
+        """Sends one item, returns git-annex's response
+        
+        @param item: str Path relative to repository, or key
+        @returns: dict (or str if not json), or None if skipped
+        """
+        with self._lock:
+            proc = self._proc
+            if (proc is None) or (proc.poll() is not None):
+                proc = self._start()
+            assert proc.stdin and proc.stdout
+            try:
+                proc.stdin.write('%s\n' % item)
+                proc.stdin.flush()
+                line = proc.stdout.readline()
+            except BrokenPipeError:
+                line = ''
+            if not line:
+                # process exited
+                status = proc.wait()
+                self._proc = None
+                raise GitCommandError(self.cmd(), status)
+        line = line.strip()
+        if not line:
+            return None
+        if self.json:
+            return json.loads(line)
+        return line
+    
+    def close(self):
+        """Ends the git-annex process
+        """
+        with self._lock:
+            proc = self._proc
+            if proc:
+                assert proc.stdin and proc.stdout
+                proc.stdin.close()
+                proc.wait()
+                proc.stdout.close()
+                self._proc = None
+
+
+class AnnexClient():
+    """git-annex batch processes for one repository, started as needed
+    
+    Get one with annex_client(repo) so that processes are reused across
+    calls in a run.
+    """
+    working_dir: str = ''
+    
+    def __init__(self, working_dir: str):
+        """
+        @param working_dir: str Absolute path to repository
+        """
+        self.working_dir = working_dir
+        self._batches: Dict[Tuple[str, Tuple[str, ...], bool], AnnexBatch] = {}
+        self._lock = threading.Lock()
+    
+    def __repr__(self):
+        return "<%s.%s %s (%s processes)>" % (
+            self.__module__, self.__class__.__name__,
+            self.working_dir, len(self._batches)
+        )
+    
+    def batch(self, command: str, args: List[str]=[], json: bool=True) -> AnnexBatch:
+        """The AnnexBatch for a command and arguments, created if necessary
+        """
+        key = (command, tuple(args), json)
+        with self._lock:
+            if key not in self._batches:
+                self._batches[key] = AnnexBatch(self.working_dir, command, args, json)
+            return self._batches[key]
+    
+    def add(self, path_rel: str) -> Optional[Dict[str, Any]]:
+        """git annex add
+        """
+        return self.batch('add').query(path_rel)
+    
+    def whereis(self, path_rel: str) -> Optional[Dict[str, Any]]:
+        """git annex whereis; see annex_whereis_file
+        """
+        return self.batch('whereis').query(path_rel)
+    
+    def find(self, path_rel: str, args: List[str]=[]) -> Optional[Dict[str, Any]]:
+        """git annex find; None if file does not match e.g. ['--in=here']
+        """
+        return self.batch('find', args).query(path_rel)
+    
+    def info(self, item: str) -> Optional[Dict[str, Any]]:
+        """git annex info for a file, key, or remote
+        """
+        return self.batch('info').query(item)
+    
+    def contentlocation(self, key: str) -> Optional[str]:
+        """Path to a key's content relative to repository, or None if not present
+        """
+        return self.batch('contentlocation', json=False).query(key)
+    
+    def drop(self, path_rel: str, force: bool=False) -> Optional[Dict[str, Any]]:
+        """git annex drop
+        """
+        args = []
+        if force:
+            args.append('--force')
+        return self.batch('drop', args).query(path_rel)
+    
+    def close(self):
+        """Ends all of this repository's git-annex processes
+        """
+        with self._lock:
+            batches = list(self._batches.values())
+            self._batches = {}
+        for batch in batches:
+            batch.close()
+
+
+# AnnexClients by real path of repository
+ANNEX_CLIENTS: Dict[str, AnnexClient] = {}
+_annex_clients_lock = threading.Lock()
+
+def annex_client(repo: git.Repo) -> AnnexClient:
+    """The AnnexClient for a repository, shared by all callers in the process
+    
+    @param repo: A GitPython repository
+    @returns: AnnexClient
+    """
+    path = os.path.realpath(repo.working_dir)
+    with _annex_clients_lock:
+        if path not in ANNEX_CLIENTS:
+            ANNEX_CLIENTS[path] = AnnexClient(path)
+        return ANNEX_CLIENTS[path]
+
+def close_annex_clients():
+    """Ends all git-annex batch processes (runs automatically at exit)
+    """
+    with _annex_clients_lock:
+        clients = list(ANNEX_CLIENTS.values())
+        ANNEX_CLIENTS.clear()
+    for client in clients:
+        client.close()
+
+atexit.register(close_annex_clients)
+
+
 class Cgit():
     url = None
     
@@ -1,8 +1,12 @@
+from collections import OrderedDict
 import codecs
+import copy
 import csv
 import json
 import os
+import re
 import sys
+import threading
 from typing import Any, Dict, List, Match, Optional, Set, Tuple, Union
 
 
@@ -25,6 +29,7 @@ def write_text(text: str, path: str):
     """
     with open(path, 'w') as f:
         f.write(text)
+    forget_fields(path)
 
 def append_text(text: str, path: str):
     """Append text to UTF-8 file.
@@ -39,6 +44,139 @@ def append_text(text: str, path: str):
         if addnewline:
             f.write('\n')
         f.write(text)
+    forget_fields(path)
+
+
+# Number of documents kept by read_fields
+READ_FIELDS_CACHE_SIZE = 256
+
+# Skips whitespace and the commas between items of a JSON list
+_JSON_LIST_SEPARATOR = re.compile(r'[\s,]*')
+_JSON_DECODER = json.JSONDecoder()
+
+def _skip_separators(text: str, index: int=0) -> int:
+    """Index of the first non-separator character at or after index
+    """
+    match = _JSON_LIST_SEPARATOR.match(text, index)
+    assert match  # pattern matches the empty string
+    return match.end()
+
+
+class _PartialDocument():
+    """JSON list-of-dicts document decoded one item at a time
+    """
+    
+    def __init__(self, text: str, stat: Tuple[int,int]):
+        self.text = text
+        self.stat = stat
+        self.items: List[Any] = []
+        self.index = _skip_separators(text)
+        if text[self.index:self.index+1] != '[':
+            raise json.JSONDecodeError('Expecting list', text, self.index)
+        self.index += 1
+        self.done = False
+    
+    def iter_items(self):
+        """Yields items, decoding more of the text only as needed
+        """
+        n = 0
+        while True:
+            if n < len(self.items):
+                yield self.items[n]
+                n += 1
+                continue
+            if self.done:
+                return
+            self.index = _skip_separators(self.text, self.index)
+            if (self.index >= len(self.text)) or (self.text[self.index] == ']'):
+                self.done = True
+                self.text = ''  # no longer needed
+                return
+            item,self.index = _JSON_DECODER.raw_decode(self.text, self.index)
+            self.items.append(item)
+    
+    def find(self, needles: List[str]) -> int:
+        """Position of the first needle in the undecoded text, or -1
+        """
+        found = [
+            n for n in [self.text.find(needle, self.index) for needle in needles]
+            if n > -1
+        ]
+        if found:
+            return min(found)
+        return -1
+
+_read_fields_cache: 'OrderedDict[str, _PartialDocument]' = OrderedDict()
+_read_fields_lock = threading.Lock()
+
+def read_fields(path: str, fields: List[str]) -> Dict[str, Any]:
+    """Reads selected fields from a DDR metadata JSON file.
+    
+    Object .json files are lists of single-key dicts.  Items are decoded
+    one at a time and decoding stops as soon as all the requested fields
+    have been found (and the rest of the text doesn't mention them), so
+    reading e.g. "public" and "status" doesn't require parsing large fields
+    like XMP or transcripts.
+    Partially decoded documents are cached (keyed on path, mtime, and size)
+    so that repeated projections of the same file don't re-read the disk.
+    
+    Values are returned as they appear in the file; jsonload_* functions
+    are not applied.  If a field appears more than once the last wins,
+    as in models.common.load_json.  Values are copies and may be modified.
+    
+    >>> read_fields('/PATH/TO/ddr-test-123-1/entity.json', ['public', 'status'])
+    {'public': 1, 'status': 'completed'}
+    
+    @param path: str Absolute path to file.
+    @param fields: list Field names
+    @returns: dict Fields that were found, with values.
+    """
+    with _read_fields_lock:
+        return _read_fields(path, fields)
+
+def _read_fields(path: str, fields: List[str]) -> Dict[str, Any]:
+    st = os.stat(path)
+    stat = (st.st_mtime_ns, st.st_size)
+    document = _read_fields_cache.get(path)
+    if document and (document.stat == stat):
+        _read_fields_cache.move_to_end(path)
+    else:
+        document = _PartialDocument(read_text(path), stat)
+        _read_fields_cache[path] = document
+        if len(_read_fields_cache) > READ_FIELDS_CACHE_SIZE:
+            _read_fields_cache.popitem(last=False)
+    wanted = set(fields)
+    data: Dict[str, Any] = {}
+    if not wanted:
+        return data
+    needles = ['"%s"' % key for key in wanted]
+    # position of a possible later occurrence of a wanted field
+    mention = -1
+    for n,item in enumerate(document.iter_items()):
+        if isinstance(item, dict) and item:
+            key = next(iter(item))
+            if key in wanted:
+                data[key] = item[key]
+        if (len(data) == len(wanted)) and (n + 1 >= len(document.items)) \
+        and (document.index > mention):
+            mention = document.find(needles)
+            if mention < 0:
+                break
+    return copy.deepcopy(data)
+
+def forget_fields(path: Optional[str]=None):
+    """Drops file (or all files) from the read_fields cache
+    
+    Called when files are written; mtimes can be too coarse to tell that
+    a file has been rewritten with a same-size change.
+    
+    @param path: str Absolute path to file, or None for all files.
+    """
+    with _read_fields_lock:
+        if path:
+            _read_fields_cache.pop(path, None)
+        else:
+            _read_fields_cache.clear()
 
 
 # Some files' XMP data is wayyyyyy too big
@@ -1,14 +1,23 @@
 # coding: utf-8
 
 from collections import OrderedDict
-from functools import total_ordering
+from functools import lru_cache, total_ordering
 import importlib
 import os
 import re
 import string
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
+import sys
+import warnings
+from typing import Any, Dict, List, Optional, Pattern, Set, Tuple, Union
 from urllib.parse import urlparse
 
+# sre_parse is deprecated (an alias for re._parser) since Python 3.11
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore', DeprecationWarning)
+    import sre_parse
+
+from DDR import objectcache
+
 
 DEFINITIONS_IMPORT_ERR = """Could not import {}.
 This is likely a problem with `[cmdln] repo_models_path` in the config file,
@@ -440,6 +449,171 @@ class Definitions():
                                 parent_fields[x].append(child_field)
         return parent_fields
 
+    @staticmethod
+    def compile_patterns(patterns):
+        """Compile list of (regex, memo, model) patterns into a CompiledPatterns
+        
+        @param patterns: list of (regex, memo, model) tuples
+        @returns: CompiledPatterns
+        """
+        return CompiledPatterns(patterns)
+
+
+GROUPNAME_REGEX = re.compile(r'\(\?P<(\w+)>')
+BACKREF_REGEX = re.compile(r'\(\?P=(\w+)\)')
+
+def _has_numbered_backrefs(pattern: str) -> bool:
+    """Indicates whether pattern refers to groups by number
+    
+    Named backrefs ('(?P=name)') are rewritten by CompiledPatterns._combine
+    but the parser represents them the same way as numbered ones, so count
+    the group references in the parse tree and compare with the number of
+    named backrefs in the source.  Conditionals are never rewritten.
+    
+    >>> _has_numbered_backrefs(r'^(?P<a>x)-(?P=a)$')
+    False
+    >>> _has_numbered_backrefs(r'^(?P<a>x)-\\1$')
+    True
+    
+    @param pattern: str
+    @returns: bool
+    """
+    refs = 0
+    stack: List[Any] = [sre_parse.parse(pattern)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, sre_parse.SubPattern):
+            for op,av in item.data:
+                if op is sre_parse.GROUPREF_EXISTS:
+                    return True
+                if op is sre_parse.GROUPREF:
+                    refs += 1
+                stack.append(av)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return refs > len(BACKREF_REGEX.findall(pattern))
+
+
+class CompiledPatterns():
+    """Matches text against a list of (regex, memo, model) patterns in one pass
+    
+    identify_object used to call re.match on each pattern in turn until one
+    matched.  This class joins all the patterns into a single alternation
+    in which each pattern's named groups are prefixed with the pattern's
+    position in the list ('_3_cid').  The regex engine tries alternatives
+    left to right so the first pattern in the list that matches wins,
+    exactly as before, but the text is scanned only once.
+    
+    Numbered backrefs ('\\1') and conditionals ('(?(1)...)') would point
+    at the wrong group inside the alternation, and inline flags cannot be
+    combined at all.  If any pattern uses them matching falls back to the
+    original loop.
+    
+    >>> patterns = [
+    ...     (r'^(?P<repo>[a-z]+)-(?P<org>[a-z]+)-(?P<cid>[0-9]+)$', '', 'collection'),
+    ...     (r'^(?P<repo>[a-z]+)$', '', 'repository'),
+    ... ]
+    >>> cp = CompiledPatterns(patterns)
+    >>> cp.identify('ddr-test-123')
+    ('collection', '', {'repo': 'ddr', 'org': 'test', 'cid': '123'})
+    """
+    patterns: List[Tuple[Pattern, str, str]] = []
+    regex: Optional[Pattern] = None
+    groups: List[List[Tuple[str, str]]] = []
+    
+    def __init__(self, patterns):
+        """
+        @param patterns: list of (regex, memo, model) tuples
+        """
+        self.patterns = [
+            (re.compile(tpl[0]), tpl[1], tpl[-1])
+            for tpl in patterns
+        ]
+        self.regex,self.groups = self._combine(self.patterns)
+    
+    def __repr__(self) -> str:
+        return "<%s.%s %s>" % (
+            self.__module__, self.__class__.__name__, len(self.patterns)
+        )
+    
+    @staticmethod
+    def _combine(patterns):
+        """Join patterns into single regex; rename groups so they don't collide
+        
+        @param patterns: list of (compiled regex, memo, model) tuples
+        @returns: compiled regex (or None), list of [(renamed, name), ...]
+        """
+        alternatives = []
+        groups = []
+        combinable = True
+        for n,tpl in enumerate(patterns):
+            prefix = '_%s_' % n
+            groups.append([
+                (prefix + name, name) for name in tpl[0].groupindex.keys()
+            ])
+            if _has_numbered_backrefs(tpl[0].pattern):
+                combinable = False
+            source = GROUPNAME_REGEX.sub(
+                lambda m: '(?P<%s%s>' % (prefix, m.group(1)), tpl[0].pattern
+            )
+            source = BACKREF_REGEX.sub(
+                lambda m: '(?P=%s%s)' % (prefix, m.group(1)), source
+            )
+            alternatives.append('(?P<_%s>%s)' % (n, source))
+        if not combinable:
+            return None,groups
+        try:
+            regex = re.compile('|'.join(alternatives))
+        except re.error:
+            return None,groups
+        return regex,groups
+    
+    def _match(self, text: str):
+        """Returns index of the matching pattern and its groupdict
+        
+        @param text: str
+        @returns: (int, dict) or (None, None)
+        """
+        if self.regex:
+            m = self.regex.match(text)
+            if not m:
+                return None,None
+            # the pattern's enclosing group is the last to close
+            assert m.lastgroup
+            n = int(m.lastgroup[1:])
+            return n,{
+                name: m.group(renamed) for renamed,name in self.groups[n]
+            }
+        for n,tpl in enumerate(self.patterns):
+            m = tpl[0].match(text)
+            if m:
+                return n,m.groupdict()
+        return None,None
+    
+    def identify(self, text: str):
+        """Same output as identify_object
+        
+        @param text: str
+        @returns: model,memo,groupdict
+        """
+        n,groupdict = self._match(text)
+        if groupdict is None:
+            return None,None,None
+        pattern,memo,model = self.patterns[n]
+        return model,memo,groupdict
+    
+    def matches(self, text: str) -> Dict[str, int]:
+        """Same output as matches_pattern
+        
+        @param text: str
+        @returns: dict of idparts including model
+        """
+        n,groupdict = self._match(text)
+        if groupdict is None:
+            return {}
+        groupdict['model'] = self.patterns[n][-1]
+        return groupdict
+
 
 try:
     from repo_models.identifier import IDENTIFIERS
@@ -482,6 +656,9 @@ MODELS_IDPARTS = Definitions.models_idparts(IDENTIFIERS)
 ID_PATTERNS = Definitions.id_patterns(IDENTIFIERS)
 PATH_PATTERNS = Definitions.path_patterns(IDENTIFIERS)
 URL_PATTERNS = Definitions.url_patterns(IDENTIFIERS)
+ID_DISPATCH = Definitions.compile_patterns(ID_PATTERNS)
+PATH_DISPATCH = Definitions.compile_patterns(PATH_PATTERNS)
+URL_DISPATCH = Definitions.compile_patterns(URL_PATTERNS)
 ID_TEMPLATES = Definitions.id_templates(IDENTIFIERS)
 PATH_TEMPLATES = Definitions.path_templates(IDENTIFIERS)
 URL_TEMPLATES = Definitions.url_templates(IDENTIFIERS)
@@ -525,9 +702,11 @@ def identify_object(text: str, patterns: list):
     
     @param i: Identifier object
     @param text: str Text string to look for
-    @param patterns: list Patterns in which to look
+    @param patterns: list Patterns in which to look, or CompiledPatterns
     @returns: dict groupdict resulting from successful regex match
     """
+    if isinstance(patterns, CompiledPatterns):
+        return patterns.identify(text)
     model = None
     memo = None
     groupdict = None
@@ -571,21 +750,12 @@ def set_idparts(i, groupdict, components=ID_COMPONENTS, types=COMPONENT_TYPES):
     @param components: list [optional]
     @param types: dict
     """
-    i.basepath = groupdict.get('basepath', None)
-    if i.basepath:
-        i.basepath = os.path.normpath(i.basepath)
+    i.basepath = _groupdict_basepath(groupdict)
     # list of object ID components
-    id_components = [
-        (key, groupdict[key])
-        for key in components
-        if groupdict.get(key)
-    ]
-    i.parts = OrderedDict(id_components)
+    id_components = _groupdict_components(groupdict, components)
+    i.parts = OrderedDict(_typed_components(id_components, types))
     id_components.insert(0, ('model',i.model))
     i.idparts = OrderedDict(id_components)
-    # set ID parts to their assigned type
-    for key,val in list(i.parts.items()):
-        i.parts[key] = types[key](val)
 
 def set_idparts_sort(i, valid_components=VALID_COMPONENTS):
     """Ensure non-numeric idparts components sort in order of VALID_COMPONENTS
@@ -593,15 +763,72 @@ def set_idparts_sort(i, valid_components=VALID_COMPONENTS):
     Prefix each component with its index in VALID_COMPONENTS
     Call after set_idparts
     """
-    i.id_sort = []
-    for key,val in list(i.parts.items()):
-        if key in list(valid_components.keys()):
+    i.id_sort = _sort_components(list(i.parts.items()), valid_components)
+    i.sort_key = _sort_key(list(i.parts.items()), valid_components)
+
+def _groupdict_basepath(groupdict: dict) -> Optional[str]:
+    basepath = groupdict.get('basepath', None)
+    if basepath:
+        basepath = os.path.normpath(basepath)
+    return basepath
+
+def _groupdict_components(groupdict: dict, components: list=ID_COMPONENTS) -> list:
+    """List of (key,val) ID components from regex groupdict, in order
+    """
+    return [
+        (key, groupdict[key])
+        for key in components
+        if groupdict.get(key)
+    ]
+
+def _typed_components(id_components: list, types: dict=COMPONENT_TYPES) -> list:
+    """Coerce ID components to the types in IDENTIFIERS['component']['type']
+    """
+    return [(key, types[key](val)) for key,val in id_components]
+
+def _sort_components(parts: list, valid_components: dict=VALID_COMPONENTS) -> list:
+    """List of sortable values for each (key,val) ID component
+    """
+    id_sort = []
+    for key,val in parts:
+        if key in valid_components:
             try:
-                i.id_sort.append( valid_components[key].index(val) )
+                id_sort.append( valid_components[key].index(val) )
             except:
-                i.id_sort.append(0)
+                id_sort.append(0)
         else:
-            i.id_sort.append( val )
+            id_sort.append( val )
+    return id_sort
+
+def _sort_key(parts: list,
+              valid_components: dict=VALID_COMPONENTS,
+              components: list=ID_COMPONENTS) -> tuple:
+    """Canonical sort key for a list of (key,val) ID components
+    
+    Flattened tuple of (component position, sortable value) pairs, e.g.
+    ddr-test-123-4 -> (0,0, 1,'test', 2,123, 3,4).  The component
+    position keeps values of different components from being compared,
+    so parents sort before children and an entity's segments sort before
+    its files.  See Identifier.sort_key.
+    """
+    key = []
+    for (k,val),sortval in zip(parts, _sort_components(parts, valid_components)):
+        key.append(components.index(k))
+        key.append(sortval)
+    return tuple(key)
+
+def path_sort_key(path: str) -> tuple:
+    """Canonical sort key (Identifier.sort_key) for an absolute path
+    
+    Much cheaper than making an Identifier because it uses the _parse
+    cache.  Use to sort lists of metadata paths:
+    
+        >>> sorted(paths, key=path_sort_key)
+    
+    @param path: str Absolute path to object directory or metadata file
+    @returns: tuple
+    """
+    return _parse('path', os.path.normpath(path))[6]
 
 class IdentifierFormatException(Exception):
     pass
@@ -616,13 +843,23 @@ def format_id(i, model, templates=ID_TEMPLATES):
     @param templates: [optional] dict of str templates keyed to models
     @returns: str
     """
+    return _format_id(i.parts, model, templates)
+
+def _format_id(parts, model, templates=ID_TEMPLATES):
+    """Format ID for the requested model from dict of parts.
+    
+    @param parts: dict
+    @param model: str A legal model keyword
+    @param templates: [optional] dict of str templates keyed to models
+    @returns: str
+    """
     for template in templates[model]:
         # first one that works is the ID (probably)
         try:
-            return template.format(**i.parts)
+            return template.format(**parts)
         except KeyError:
             pass
-    raise IdentifierFormatException('Could not format ID for %s' % i.parts)
+    raise IdentifierFormatException('Could not format ID for %s' % parts)
 
 def format_path(i, model, path_type, templates=PATH_TEMPLATES):
     """Format absolute or relative path using PATH_TEMPLATES.
@@ -636,9 +873,9 @@ def format_path(i, model, path_type, templates=PATH_TEMPLATES):
     if path_type and (path_type == 'abs') and (not i.basepath):
         raise MissingBasepathException('%s basepath not set.'% i)
     key = '-'.join([model, path_type])
+    kwargs = dict(i.parts)
+    kwargs['basepath'] = i.basepath
     for template in templates[key]:
-        kwargs = {key: val for key,val in list(i.parts.items())}
-        kwargs['basepath'] = i.basepath
         # TODO put in try/except, first one that works is the path
         try:
             return template.format(**kwargs)
@@ -669,8 +906,11 @@ def matches_pattern(text: str, patterns: list) -> Dict[str, int]:
     Used for telling what kind of pattern (id, path, url) an arg is.
     
     @param text: str
+    @param patterns: list Patterns in which to look, or CompiledPatterns
     @returns: dict of idparts including model
     """
+    if isinstance(patterns, CompiledPatterns):
+        return patterns.matches(text)
     for tpl in patterns:
         pattern = tpl[0]
         model = tpl[-1]
@@ -686,21 +926,21 @@ def _is_id(text: str) -> Dict[str, int]:
     @param text: str
     @returns: dict of idparts including model
     """
-    return matches_pattern(text, ID_PATTERNS)
+    return matches_pattern(text, ID_DISPATCH)
 
 def _is_path(text: str) -> Dict[str, int]:
     """
     @param text: str
     @returns: dict of idparts including model
     """
-    return matches_pattern(text, PATH_PATTERNS)
+    return matches_pattern(text, PATH_DISPATCH)
 
 def _is_url(text: str) -> Dict[str, int]:
     """
     @param text: str
     @returns: dict of idparts including model
     """
-    return matches_pattern(text, URL_PATTERNS)
+    return matches_pattern(text, URL_DISPATCH)
 
 def _is_abspath(text: str) -> bool:
     if isinstance(text, str) and os.path.isabs(text):
@@ -721,11 +961,10 @@ def _parse_args_kwargs(keys, args, kwargs):
         if len(args) >= 2: blargs['base_path'] = args[1]
         if len(args) >= 1: arg = args[0]
         if arg:
-            # TODO refactor: lots of regex that's duplicated in identify_object
             if isinstance(arg, dict): blargs['parts'] = arg
-            elif _is_id(arg): blargs['id'] = arg
-            elif _is_url(arg): blargs['url'] = arg
-            elif _is_abspath(arg): blargs['path'] = arg
+            else:
+                argtype = _arg_type(arg)
+                if argtype: blargs[argtype] = arg
     # kwargs override args
     if kwargs:
         for key,val in list(kwargs.items()):
@@ -733,6 +972,91 @@ def _parse_args_kwargs(keys, args, kwargs):
                 blargs[key] = val
     return blargs
 
+# Max number of parsed IDs/paths/URLs to keep.
+# Entries are small tuples; this is enough for a very large collection.
+PARSE_CACHE_SIZE = 200000
+# Shared parent CompactIdentifiers (collections, entities), each of which
+# holds its memoized lineage
+FROM_PARTS_CACHE_SIZE = 10000
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _arg_type(text: str) -> Optional[str]:
+    """Indicates whether Identifier.__init__ arg is an ID, URL, or path.
+    
+    @param text: str
+    @returns: str 'id', 'url', 'path', or None
+    """
+    if _is_id(text): return 'id'
+    elif _is_url(text): return 'url'
+    elif _is_abspath(text): return 'path'
+    return None
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(method: str, text: str, base_path: Optional[str]=None) -> tuple:
+    """Parse ID, path, or URL into (immutable) data used by Identifier
+    
+    Results are kept in a bounded LRU cache keyed to (method, text, base_path)
+    so that the same ID/path/URL is only run through the regexes once.
+    Exceptions are not cached.
+    
+    @param method: str 'id', 'path', or 'url'
+    @param text: str ID, normalized absolute path, or URL
+    @param base_path: str Absolute path to Store's parent dir
+    @returns: tuple (model, basepath, idparts, parts, id_sort, object_id, sort_key)
+    """
+    if method == 'path':
+        if not os.path.isabs(text):
+            raise BadPathException('Path is not absolute: %s' % text)
+    elif base_path and not os.path.isabs(base_path):
+        raise BadPathException('Base path is not absolute: %s' % base_path)
+    if base_path:
+        base_path = os.path.normpath(base_path)
+    if method == 'id':
+        model,memo,groupdict = identify_object(text, ID_DISPATCH)
+        if not groupdict:
+            raise MalformedIDException('Malformed ID: "%s"' % text)
+    elif method == 'path':
+        model,memo,groupdict = identify_object(text, PATH_DISPATCH)
+        if not groupdict:
+            raise MalformedPathException('Malformed path: "%s"' % text)
+    elif method == 'url':
+        urlpath = urlparse(text).path  # ignore domain and queries
+        urlpath = os.path.normpath(urlpath)
+        model,memo,groupdict = identify_object(urlpath, URL_DISPATCH)
+        if not groupdict:
+            raise MalformedURLException('Malformed URL: "%s"' % text)
+    else:
+        raise InvalidInputException('Could not grok Identifier input: %s' % method)
+    idparts = _groupdict_components(groupdict)
+    parts = _typed_components(idparts)
+    id_sort = _sort_components(parts)
+    sort_key = _sort_key(parts)
+    basepath = _groupdict_basepath(groupdict)
+    # paths contain their own basepath
+    if base_path and (method != 'path') and not basepath:
+        basepath = base_path
+    if method == 'id':
+        object_id = text
+    else:
+        object_id = _format_id(dict(parts), model)
+    return model,basepath,tuple(idparts),tuple(parts),tuple(id_sort),object_id,sort_key
+
+def parse_cache_info():
+    """Hits, misses, and size of the Identifier parsing cache.
+    
+    @returns: functools._CacheInfo
+    """
+    return _parse.cache_info()
+
+def parse_cache_clear():
+    """Empty the Identifier parsing cache (e.g. after loading new definitions)
+    """
+    _arg_type.cache_clear()
+    _parse.cache_clear()
+    _parse_compact.cache_clear()
+    _compact_sort_key.cache_clear()
+    CompactIdentifier.from_parts.cache_clear()
+
 def module_for_name(module_name: str):
     """Returns specified module.
     
@@ -894,7 +1218,8 @@ class Identifier(object):
     parts: Any = OrderedDict()
     basepath = None
     id = None
-    id_sort = 0
+    id_sort: List[Any] = []
+    sort_key: tuple = ()
     
     @staticmethod
     def wellformed(idtype: str, text: str, models: list=MODELS) -> Dict[str, int]:
@@ -951,21 +1276,9 @@ class Identifier(object):
         @param base_path: str Absolute path to Store's parent dir
         @returns: Identifier
         """
-        if base_path and not os.path.isabs(base_path):
-            raise BadPathException('Base path is not absolute: %s' % base_path)
-        if base_path:
-            base_path = os.path.normpath(base_path)
         self.method = 'id'
         self.raw = object_id
-        self.id = object_id
-        model,memo,groupdict = identify_object(object_id, ID_PATTERNS)
-        if not groupdict:
-            raise MalformedIDException('Malformed ID: "%s"' % object_id)
-        self.model = model
-        set_idparts(self, groupdict)
-        set_idparts_sort(self, VALID_COMPONENTS)
-        if base_path and not self.basepath:
-            self.basepath = base_path
+        self._set_parsed(_parse('id', object_id, base_path))
     
     def _from_idparts(self, idparts, base_path=None):
         """Make Identifier from dict of parts.
@@ -1010,19 +1323,9 @@ class Identifier(object):
         @returns: Identifier
         """
         path_abs = os.path.normpath(path_abs)
-        if not os.path.isabs(path_abs):
-            raise BadPathException('Path is not absolute: %s' % path_abs)
-        if base_path:
-            base_path = os.path.normpath(base_path)
         self.method = 'path'
         self.raw = path_abs
-        model,memo,groupdict = identify_object(path_abs, PATH_PATTERNS)
-        if not groupdict:
-            raise MalformedPathException('Malformed path: "%s"' % path_abs)
-        self.model = model
-        set_idparts(self, groupdict)
-        set_idparts_sort(self, VALID_COMPONENTS)
-        self.id = format_id(self, self.model)
+        self._set_parsed(_parse('path', path_abs, base_path))
     
     def _from_url(self, url: str, base_path: str=None):
         """Make Identifier from URL or URI.
@@ -1040,23 +1343,26 @@ class Identifier(object):
         @param base_path: str Absolute path to Store's parent dir
         @returns: Identifier
         """
-        if base_path and not os.path.isabs(base_path):
-            raise BadPathException('Base path is not absolute: %s' % base_path)
-        if base_path:
-            base_path = os.path.normpath(base_path)
         self.method = 'url'
         self.raw = url
-        urlpath = urlparse(url).path  # ignore domain and queries
-        urlpath = os.path.normpath(urlpath)
-        model,memo,groupdict = identify_object(urlpath, URL_PATTERNS)
-        if not groupdict:
-            raise MalformedURLException('Malformed URL: "%s"' % url)
+        self._set_parsed(_parse('url', url, base_path))
+    
+    def _set_parsed(self, parsed: tuple):
+        """Set Identifier attributes from output of _parse
+        
+        Cached values are immutable; parts dicts are copied fresh for
+        each instance because some callers modify them.
+        
+        @param parsed: tuple
+        """
+        model,basepath,idparts,parts,id_sort,object_id,sort_key = parsed
         self.model = model
-        set_idparts(self, groupdict)
-        set_idparts_sort(self, VALID_COMPONENTS)
-        self.id = format_id(self, self.model)
-        if base_path and not self.basepath:
-            self.basepath = base_path
+        self.basepath = basepath
+        self.parts = OrderedDict(parts)
+        self.idparts = OrderedDict((('model', model),) + idparts)
+        self.id_sort = list(id_sort)
+        self.sort_key = sort_key
+        self.id = object_id
     
     def __repr__(self) -> str:
         return "<%s.%s %s:%s>" % (self.__module__, self.__class__.__name__, self.model, self.id)
@@ -1076,11 +1382,11 @@ class Identifier(object):
             return NotImplemented
         return self._key() < other._key()
     
-    def _key(self) -> int:
+    def _key(self) -> tuple:
         """Key for Pythonic object sorting.
         Integer components are returned as ints, enabling natural sorting.
         """
-        return self.id_sort
+        return self.sort_key
 
     @staticmethod
     def nextable(model: str) -> bool:
@@ -1127,11 +1433,19 @@ class Identifier(object):
     def object(self, mappings=MODEL_CLASSES, new=False):
         """Returns the object identified by the Identifier or None.
         
+        If DDR.objectcache is enabled, returns a copy of the cached object.
+        
         @param new: bool Create a new blank object if it doesn't already exist.
         """
         if new and not os.path.exists(self.path_abs('json')):
             return self.object_class(mappings).new(self)
-        return self.object_class(mappings).from_identifier(self)
+        object_class = self.object_class(mappings)
+        if objectcache.CACHE:
+            return objectcache.CACHE.get(
+                self.path_abs('json'), object_class,
+                lambda: object_class.from_identifier(self)
+            )
+        return object_class.from_identifier(self)
 
     def organization_id(self) -> str:
         return format_id(self, 'organization')
@@ -1294,3 +1608,427 @@ class Identifier(object):
         @returns: str
         """
         return format_url(self, self.model, url_type)
+    
+    def freeze(self):
+        """Returns a CompactIdentifier version of this Identifier.
+        
+        @returns: CompactIdentifier
+        """
+        if self.method in ['id', 'path', 'url']:
+            # reuses cached parse results
+            return CompactIdentifier(
+                **{self.method: self.raw}, base_path=self.basepath
+            )
+        return CompactIdentifier.from_parts(
+            self.model, tuple(self.parts.keys()), tuple(self.parts.values()),
+            self.basepath
+        )
+
+
+@lru_cache(maxsize=None)
+def _template_keys(model: str, keys: tuple) -> Optional[tuple]:
+    """Names of the parts used by the first of model's ID_TEMPLATES that fits keys
+    
+    @param model: str
+    @param keys: tuple Names of available ID components
+    @returns: tuple or None
+    """
+    for template in ID_TEMPLATES.get(model, []):
+        names = [name for name in _field_names(template) if name]
+        if set(names).issubset(keys):
+            return tuple(key for key in keys if key in names)
+    return None
+
+# Shared copies of the parts keys tuples used by CompactIdentifiers.
+# There are only a few distinct ones (one or two per model).
+_PARTS_KEYS: Dict[tuple, tuple] = {}
+
+def _intern_keys(keys: tuple) -> tuple:
+    return _PARTS_KEYS.setdefault(keys, keys)
+
+def _intern_values(values: tuple) -> tuple:
+    """Share str ID components other than the last one (repo, org, role...)
+    
+    The last component is what makes the ID unique so there's no point.
+    """
+    return tuple(
+        sys.intern(val) if isinstance(val, str) else val
+        for val in values[:-1]
+    ) + values[-1:]
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_compact(method: str, text: str, base_path: Optional[str]=None) -> tuple:
+    """_parse output rearranged for CompactIdentifier
+    
+    @returns: tuple (model, basepath, keys, values, object_id)
+    """
+    model,basepath,idparts,parts,id_sort,object_id,sort_key = _parse(method, text, base_path)
+    return (
+        model, basepath,
+        _intern_keys(tuple(key for key,val in parts)),
+        _intern_values(tuple(val for key,val in parts)),
+        object_id,
+    )
+
+def _compact_parts(idparts: dict, base_path: Optional[str]=None) -> tuple:
+    """Same as _parse_compact but for a dict of parts (see Identifier._from_idparts)
+    
+    @returns: tuple (model, basepath, keys, values, object_id)
+    """
+    if base_path and not os.path.isabs(base_path):
+        raise BadPathException('Base path is not absolute: %s' % base_path)
+    if base_path:
+        base_path = os.path.normpath(base_path)
+    model = idparts['model']
+    keys = tuple(key for key in ID_COMPONENTS if idparts.get(key))
+    values = tuple(idparts[key] for key in keys)
+    return (
+        model, base_path, _intern_keys(keys), _intern_values(values),
+        _format_id(dict(zip(keys, values)), model),
+    )
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _compact_sort_key(keys: tuple, values: tuple) -> tuple:
+    return _sort_key(list(zip(keys, values)))
+
+@total_ordering
+class CompactIdentifier(object):
+    """Immutable, memory-efficient version of Identifier
+    
+    Identifier builds two OrderedDicts, a sort list, and various strings
+    for every instance.  Indexing and checking runs may hold hundreds of
+    thousands of Identifiers in memory at once.
+    
+    CompactIdentifier uses __slots__ and stores ID parts in tuples
+    (the keys tuple is shared by all CompactIdentifiers with the same
+    layout).  Parents, lineage, collection ID and absolute path are
+    computed the first time they are requested and then memoized.
+    Parents are themselves shared via an LRU cache so that e.g. all the
+    files in an entity point to the same entity and collection objects.
+    
+    Has the same read-only API as Identifier.  Use thaw() to get a regular
+    (mutable) Identifier, e.g. to pass to model classes.
+    
+    >>> ci = CompactIdentifier('ddr-testing-123-456', '/var/www/media/ddr')
+    >>> ci.parent_id()
+    'ddr-testing-123'
+    >>> ci.path_abs('json')
+    '/var/www/media/ddr/ddr-testing-123/files/ddr-testing-123-456/entity.json'
+    """
+    __slots__ = (
+        'method', 'raw', 'model', 'basepath', 'id', '_keys', '_values',
+        '_path_abs', '_collection_id',
+        '_parent', '_parent_stubs', '_lineage', '_lineage_stubs',
+    )
+    method: str
+    raw: Any
+    model: str
+    basepath: Optional[str]
+    id: str
+    _keys: Tuple[str, ...]
+    _values: Tuple[Any, ...]
+    _path_abs: Optional[str]
+    _collection_id: Optional[str]
+    # None until computed; False means no parent
+    _parent: Union['CompactIdentifier', bool, None]
+    _parent_stubs: Union['CompactIdentifier', bool, None]
+    _lineage: Optional[Tuple['CompactIdentifier', ...]]
+    _lineage_stubs: Optional[Tuple['CompactIdentifier', ...]]
+    
+    def __init__(self, *args, **kwargs):
+        blargs = _parse_args_kwargs(KWARG_KEYS, args, kwargs)
+        if blargs['id']:
+            method,raw = 'id',blargs['id']
+        elif blargs['parts']:
+            method,raw = 'parts',blargs['parts']
+        elif blargs['path']:
+            method,raw = 'path',os.path.normpath(blargs['path'])
+        elif blargs['url']:
+            method,raw = 'url',blargs['url']
+        else:
+            raise InvalidInputException('Could not grok Identifier input: %s' % blargs)
+        if method == 'parts':
+            model,basepath,keys,values,object_id = _compact_parts(
+                raw, blargs['base_path']
+            )
+        else:
+            model,basepath,keys,values,object_id = _parse_compact(
+                method, raw, blargs['base_path']
+            )
+        setattr_ = object.__setattr__
+        setattr_(self, 'method', method)
+        setattr_(self, 'raw', raw)
+        setattr_(self, 'model', model)
+        setattr_(self, 'basepath', basepath)
+        setattr_(self, 'id', object_id)
+        setattr_(self, '_keys', keys)
+        setattr_(self, '_values', values)
+        setattr_(self, '_path_abs', None)
+        setattr_(self, '_collection_id', None)
+        setattr_(self, '_parent', None)
+        setattr_(self, '_parent_stubs', None)
+        setattr_(self, '_lineage', None)
+        setattr_(self, '_lineage_stubs', None)
+    
+    @staticmethod
+    @lru_cache(maxsize=FROM_PARTS_CACHE_SIZE)
+    def from_parts(model: str, keys: tuple, values: tuple, basepath: Optional[str]=None):
+        """Shared CompactIdentifier for the given model, parts, and basepath
+        
+        @param model: str
+        @param keys: tuple of ID component names
+        @param values: tuple of ID component values
+        @param basepath: str Absolute path to Store's parent dir
+        @returns: CompactIdentifier
+        """
+        parts = dict(zip(keys, values))
+        parts['model'] = model
+        return CompactIdentifier(parts=parts, base_path=basepath)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+    
+    def __delattr__(self, name):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+    
+    def __repr__(self) -> str:
+        return "<%s.%s %s:%s>" % (self.__module__, self.__class__.__name__, self.model, self.id)
+    
+    def __eq__(self, other: object) -> bool:
+        """Enable Pythonic sorting"""
+        if not isinstance(other, (CompactIdentifier, Identifier)):
+            return NotImplemented
+        return self.path_abs() == other.path_abs()
+    
+    def __lt__(self, other: object) -> bool:
+        """Enable Pythonic sorting"""
+        if not isinstance(other, CompactIdentifier):
+            return NotImplemented
+        return self._key() < other._key()
+    
+    def __hash__(self) -> int:
+        return hash((self.model, self.id, self.basepath))
+    
+    def _key(self) -> tuple:
+        """Key for Pythonic object sorting.
+        """
+        return self.sort_key
+    
+    @property
+    def id_sort(self) -> list:
+        """Sortable values for each ID component (see set_idparts_sort)
+        """
+        return _sort_components(list(zip(self._keys, self._values)))
+    
+    @property
+    def sort_key(self) -> tuple:
+        """Canonical sort key (see Identifier.sort_key)
+        """
+        return _compact_sort_key(self._keys, self._values)
+    
+    @property
+    def parts(self) -> OrderedDict:
+        """ID components (new OrderedDict each time; modifying it does nothing)
+        """
+        return OrderedDict(zip(self._keys, self._values))
+    
+    @property
+    def idparts(self) -> OrderedDict:
+        """Model and ID components (new OrderedDict each time)
+        
+        NOTE: Unlike Identifier.idparts, values are typed just like parts
+        (e.g. 'cid' is an int), regardless of how the object was created.
+        """
+        idparts = OrderedDict(model=self.model)
+        idparts.update(zip(self._keys, self._values))
+        return idparts
+    
+    def thaw(self) -> Identifier:
+        """Returns a regular Identifier version of this CompactIdentifier.
+        
+        @returns: Identifier
+        """
+        parts = self.parts
+        parts['model'] = self.model
+        return Identifier(parts=parts, base_path=self.basepath)
+    
+    def components(self) -> List[Union[str, int]]:
+        """Model and parts of the ID as a list.
+        """
+        return [self.model] + list(self._values)
+    
+    def fields_module(self, mappings: dict=MODEL_REPO_MODELS) -> object:
+        """Identifier's fields definitions module from repo_models.
+        """
+        return module_for_name(mappings[self.model]['module'])
+    
+    def object_class(self, mappings: dict=MODEL_CLASSES) -> object:
+        """Identifier's object class according to mappings.
+        """
+        return class_for_name(
+            mappings[self.model]['module'],
+            mappings[self.model]['class']
+        )
+    
+    def object(self, mappings=MODEL_CLASSES, new=False):
+        """Returns the object identified by the Identifier or None.
+        
+        Model classes get a regular Identifier.
+        
+        @param new: bool Create a new blank object if it doesn't already exist.
+        """
+        return self.thaw().object(mappings=mappings, new=new)
+    
+    def organization_id(self) -> str:
+        return format_id(self, 'organization')
+    
+    def collection_id(self) -> str:
+        """ID of the collection to which the Identifier belongs, if any.
+        """
+        collection_id = self._collection_id
+        if collection_id is None:
+            if not self.model in COLLECTION_MODELS:
+                raise Exception('%s objects do not have collection IDs' % self.model.capitalize())
+            collection_id = format_id(self, 'collection')
+            object.__setattr__(self, '_collection_id', collection_id)
+        return collection_id
+    
+    def collection_path(self) -> str:
+        """Absolute path of the collection to which the Identifier belongs, if any.
+        """
+        return self.collection().path_abs()
+    
+    def collection(self):
+        """Collection Identifier to which the Identifier belongs, if any.
+        """
+        if self.model == 'collection':
+            return self
+        for i in self.lineage():
+            if i.model == 'collection':
+                return i
+        # collection_id() raises if there is no collection
+        return self.__class__(id=self.collection_id(), base_path=self.basepath)
+    
+    def _parent_models(self, stubs: bool=False) -> List[str]:
+        if stubs:
+            return PARENTS_ALL.get(self.model, [])
+        return PARENTS.get(self.model, [])
+    
+    def parent(self, stubs: bool=False):
+        """Parent of the Identifier (memoized)
+        
+        @param stubs: boolean Whether or not to include Stub objects.
+        @returns: CompactIdentifier or None
+        """
+        slot = '_parent_stubs' if stubs else '_parent'
+        parent = getattr(self, slot)
+        if parent is None:
+            # False means no parent
+            parent = False
+            parts = dict(zip(self._keys[:-1], self._values[:-1]))
+            for model in self._parent_models(stubs):
+                # keep only the parts used in the parent's ID so that
+                # siblings share the same parent object
+                keys = _template_keys(model, tuple(parts.keys()))
+                if keys:
+                    parent = CompactIdentifier.from_parts(
+                        model, keys, tuple(parts[key] for key in keys),
+                        self.basepath
+                    )
+                    break
+            object.__setattr__(self, slot, parent)
+        return parent or None
+    
+    def parent_id(self, stubs: bool=False) -> str:
+        """ID of the Identifier's parent, if any.
+        
+        @param stubs: boolean Whether or not to include Stub objects.
+        """
+        parent = self.parent(stubs=stubs)
+        if parent:
+            return parent.id
+        return ''
+    
+    def parent_path(self, stubs: bool=False) -> str:
+        """Absolute path to parent object
+        
+        @param stubs: boolean Whether or not to include Stub objects.
+        """
+        parent = self.parent(stubs=stubs)
+        if parent:
+            return parent.path_abs()
+        return ''
+    
+    def lineage(self, stubs: bool=False) -> List[Any]:
+        """Identifier's lineage, starting with the Identifier itself (memoized)
+        
+        @param stubs: boolean Whether or not to include Stub objects.
+        """
+        slot = '_lineage_stubs' if stubs else '_lineage'
+        lineage = getattr(self, slot)
+        if lineage is None:
+            parent = self.parent(stubs=stubs)
+            if parent:
+                lineage = (self,) + tuple(parent.lineage(stubs=stubs))
+            else:
+                lineage = (self,)
+            object.__setattr__(self, slot, lineage)
+        return list(lineage)
+    
+    def child_models(self, stubs: bool=False) -> List[Any]:
+        if stubs:
+            return CHILDREN_ALL.get(self.model, [])
+        return CHILDREN.get(self.model, [])
+    
+    def path_abs(self, append: str='') -> str:
+        """Return absolute path to object with optional file appended.
+        
+        @param append: str File descriptor. Must be present in ADDITIONAL_PATHS!
+        @returns: str
+        """
+        path = self._path_abs
+        if path is None:
+            if not self.basepath:
+                raise MissingBasepathException('%s basepath not set.'% self)
+            path = os.path.normpath(format_path(self, self.model, 'abs'))
+            object.__setattr__(self, '_path_abs', path)
+        if append:
+            filename = ADDITIONAL_PATHS.get(self.model,None).get(append,None)
+            if filename and (self.model in NODES):
+                # For files, bits are appended to file ID using string formatter
+                dirname,basename = os.path.split(path)
+                path = os.path.join(dirname, filename.format(id=self.id))
+            elif filename:
+                path = os.path.join(path, filename)
+            else:
+                return ''
+            path = os.path.normpath(path)
+        return path
+    
+    def path_rel(self, append: str='') -> str:
+        """Return relative path to object with optional file appended.
+        
+        @param append: str Descriptor of file in ADDITIONAL_PATHS!
+        @returns: str
+        """
+        path = format_path(self, self.model, 'rel')
+        if append:
+            filename = ADDITIONAL_PATHS[self.model][append]
+            if self.model == 'file':
+                filename = filename.format(id=self.id)
+                path = os.path.dirname(path)
+            if path:
+                path = os.path.join(path, filename)
+            else:
+                path = filename
+        if path:
+            path = os.path.normpath(path)
+        return path
+    
+    def urlpath(self, url_type: str) -> str:
+        """Return object URL or URI.
+        
+        @param url_type: str 'public' or 'editor'
+        @returns: str
+        """
+        return format_url(self, self.model, url_type)
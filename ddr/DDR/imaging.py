@@ -21,17 +21,38 @@ CalledProcessError: Command 'identify /tmp/DDRWorkbenchScreenShots.docx' returne
 
 """
 
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 import os
 import subprocess
+from typing import Any, Deque, Dict, Iterable, Iterator, Optional, Tuple
 
 import envoy
 import libxmp
 
+# pyvips and Pillow are optional; without them ImageMagick does everything
+try:
+    import pyvips
+except (ImportError, OSError):
+    pyvips = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from DDR import config
+
 IDENTIFY_CMD = 'identify "{path}"'
 CONVERT_CMD  = "convert {options} \"{src}\"[0] -resize '{geometry}' {dest}"
-CONVERT_LARGEFILE_THRESHOLD = 768 * 1000
-CONVERT_LARGEFILE_OPTIONS = '-limit memory 2GB -limit map 4GB'
+CONVERT_LARGEFILE_THRESHOLD = config.CONVERT_LARGEFILE_THRESHOLD
+CONVERT_LARGEFILE_OPTIONS = config.CONVERT_LARGEFILE_OPTIONS
+# Source formats resized in-process (see thumbnail_fast)
+FAST_PATH_EXTENSIONS = ['.jpg', '.jpeg', '.tif', '.tiff', '.png']
+# Pillow image modes that can be written as JPEG (after convert to RGB)
+# CMYK is left to ImageMagick, which applies the embedded ICC profile
+FAST_PATH_MODES = ['1', 'L', 'P', 'RGB', 'RGBA', 'LA', 'YCbCr']
+FAST_PATH_JPEG_QUALITY = 90
 
 
 def analyze_magick(std_out, std_err):
@@ -120,16 +141,136 @@ def _convert_cmd(src, dest, geometry, options=''):
         options=options, src=src, geometry=geometry, dest=dest
     )
 
-def thumbnail(src, dest, geometry, options=''):
+def parse_geometry(geometry: str) -> Tuple[Optional[int], Optional[int], bool]:
+    """Parses the simple ImageMagick geometries used for access files
+    
+    >>> parse_geometry('1024x1024>')
+    (1024, 1024, True)
+    >>> parse_geometry('x200')
+    (None, 200, False)
+    
+    @param geometry: str WIDTHxHEIGHT with optional '>' (only shrink)
+    @returns: (width, height, shrink_only) width or height may be None
+    """
+    shrink_only = geometry.endswith('>')
+    parts = geometry[:-1].split('x') if shrink_only else geometry.split('x')
+    if (len(parts) != 2) or (not any(parts)) \
+       or [part for part in parts if part and not part.isdigit()]:
+        raise ValueError('Unsupported geometry: "%s"' % geometry)
+    w,h = parts
+    return (int(w) if w else None), (int(h) if h else None), shrink_only
+
+def _fit(size: Tuple[int, int], width: Optional[int], height: Optional[int]) -> float:
+    """Scale that fits size into width x height, keeping aspect ratio
+    """
+    scales = []
+    if width:
+        scales.append(width / size[0])
+    if height:
+        scales.append(height / size[1])
+    return min(scales)
+
+def can_thumbnail_fast(src: str, geometry: str, options: str='') -> bool:
+    """Whether thumbnail_fast can try this file
+    
+    Extra ImageMagick options can't be imitated so they always use convert.
+    
+    @param src: Absolute path to source file.
+    @param geometry: String (ex: '200x200')
+    @param options: str ImageMagick options
+    @returns: bool
+    """
+    if not (pyvips or Image) or (options and options.strip()):
+        return False
+    if os.path.splitext(src)[1].lower() not in FAST_PATH_EXTENSIONS:
+        return False
+    try:
+        parse_geometry(geometry)
+    except ValueError:
+        return False
+    return True
+
+def thumbnail_fast(src: str, dest: str, geometry: str) -> Dict[str, Any]:
+    """Makes a JPEG thumbnail of the first frame in-process
+    
+    pyvips shrinks while loading, and Pillow's draft() lets the JPEG
+    decoder scale by 1/2-1/8, so a large master is never fully decoded.
+    Raises an exception for anything they can't read (e.g. unusual TIFF
+    compression or 16-bit modes) or that needs color management (CMYK);
+    see thumbnail().
+    
+    @param src: Absolute path to source file.
+    @param dest: Absolute path to destination file.
+    @param geometry: String (ex: '200x200')
+    @returns: dict with 'method', 'format', 'frames', 'size_orig'
+    """
+    width,height,shrink_only = parse_geometry(geometry)
+    if pyvips:
+        img = pyvips.Image.new_from_file(src, access='sequential')
+        if img.interpretation == 'cmyk':
+            raise Exception('Unsupported image mode CMYK')
+        scale = _fit((img.width, img.height), width, height)
+        thumb = pyvips.Image.thumbnail(
+            src,
+            max(1, round(img.width * scale)),
+            height=max(1, round(img.height * scale)),
+            size='down' if shrink_only else 'both',
+        )
+        if thumb.hasalpha():
+            thumb = thumb.flatten(background=255)
+        thumb.write_to_file(dest, Q=FAST_PATH_JPEG_QUALITY)
+        return {
+            'method': 'pyvips',
+            'format': img.get('vips-loader') if img.get_typeof('vips-loader') else None,
+            'frames': img.get('n-pages') if img.get_typeof('n-pages') else 1,
+            'size_orig': (img.width, img.height),
+        }
+    with Image.open(src) as img:
+        fmt = img.format
+        frames = getattr(img, 'n_frames', 1)
+        size_orig = img.size
+        if img.mode not in FAST_PATH_MODES:
+            raise Exception('Unsupported image mode %s' % img.mode)
+        scale = _fit(img.size, width, height)
+        if shrink_only:
+            scale = min(scale, 1.0)
+        size = (
+            max(1, round(img.size[0] * scale)),
+            max(1, round(img.size[1] * scale)),
+        )
+        if scale < 1.0:
+            img.draft('RGB', size)
+        if img.mode in ['RGBA', 'LA'] or (img.mode == 'P' and 'transparency' in img.info):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        elif img.mode not in ['RGB', 'L']:
+            img = img.convert('RGB')
+        if img.size != size:
+            img = img.resize(size, Image.LANCZOS)
+        img.save(dest, 'JPEG', quality=FAST_PATH_JPEG_QUALITY)
+    return {
+        'method': 'pillow',
+        'format': fmt,
+        'frames': frames,
+        'size_orig': size_orig,
+    }
+
+def thumbnail(src, dest, geometry, options='', fast=config.THUMBNAIL_FAST_PATH):
     """Attempt to make thumbnail
     
-    Note: uses Imagemagick 'convert' and 'identify'.
+    JPEG, TIFF, and PNG files are resized in-process if pyvips or Pillow is
+    installed (see thumbnail_fast).  Other files, or if that fails, use
+    Imagemagick 'convert' and 'identify'.
     Note: Writes log to DDRLocalEntity.files_log so entries appear
           alongside add_file() and add_access()
     
     @param src: Absolute path to source file.
     @param dest: Absolute path to destination file.
     @param geometry: String (ex: '200x200')
+    @param options: str ImageMagick options
+    @param fast: bool Try the in-process fast path first
     @returns: Path to destination file
     """
     assert os.path.exists(src)
@@ -140,6 +281,7 @@ def thumbnail(src, dest, geometry, options=''):
         'size_src': os.path.getsize(src),
         'dest': dest,
         'geometry': geometry,
+        'method': None,
         'analysis': None,
         'convert': None,
         'attempted': None,
@@ -151,7 +293,53 @@ def thumbnail(src, dest, geometry, options=''):
         'size': None,
         'islink': None,
     }
+    if fast and can_thumbnail_fast(src, geometry, options):
+        start = datetime.now()
+        try:
+            info = thumbnail_fast(src, dest, geometry)
+            data['method'] = info['method']
+            data['analysis'] = {
+                'path': src,
+                'format': info['format'],
+                'frames': info['frames'],
+                'image': True,
+                'can_thumbnail': True,
+                'std_out': '%s %s %sx%s' % (
+                    src, info['format'], info['size_orig'][0], info['size_orig'][1]
+                ),
+                'std_err': '',
+            }
+            data['convert'] = '%s %s -> %s (%s)' % (info['method'], src, dest, geometry)
+            data['status_code'] = 0
+            data['std_out'] = ''
+            data['std_err'] = ''
+        except Exception as err:
+            # fall back to ImageMagick
+            data['fast_path_error'] = '%s: %s' % (type(err).__name__, err)
+            if os.path.exists(dest) and not os.path.islink(dest):
+                os.remove(dest)
+        data['elapsed'] = str(datetime.now() - start)
+        data['attempted'] = True
+    if data['status_code'] != 0:
+        thumbnail_magick(src, dest, geometry, options, data)
+    data['exists'] = os.path.exists(dest)
+    if os.path.exists(dest):
+        data['size'] = os.path.getsize(dest)
+    data['islink'] = os.path.islink(dest)
+    return data
+
+def thumbnail_magick(src, dest, geometry, options, data):
+    """Make thumbnail with ImageMagick 'identify' and 'convert'
+    
+    @param src: Absolute path to source file.
+    @param dest: Absolute path to destination file.
+    @param geometry: String (ex: '200x200')
+    @param options: str ImageMagick options
+    @param data: dict (see thumbnail) updated in place
+    @returns: dict data
+    """
     analysis = analyze(src)
+    data['method'] = 'imagemagick'
     data['analysis'] = analysis
     cmd = _convert_cmd(src, dest, geometry, options)
     data['convert'] = cmd
@@ -162,12 +350,49 @@ def thumbnail(src, dest, geometry, options=''):
     data['status_code'] = r.status_code
     data['std_out'] = r.std_out
     data['std_err'] = r.std_err
-    data['exists'] = os.path.exists(dest)
-    if os.path.exists(dest):
-        data['size'] = os.path.getsize(dest)
-    data['islink'] = os.path.islink(dest)
     return data
 
+def thumbnails(jobs: Iterable[Tuple[str, str, str, str]],
+               workers: int=config.THUMBNAIL_WORKERS,
+               fast: bool=config.THUMBNAIL_FAST_PATH) -> Iterator[Tuple[str, str, Any]]:
+    """Makes many thumbnails with a pool of threads
+    
+    ImageMagick runs in subprocesses and pyvips/Pillow release the GIL
+    while decoding and resizing, so threads are enough.  At most workers*2
+    jobs are in flight; results are yielded in the order of jobs.  A job
+    that fails yields its exception instead of a data dict.
+    
+    @param jobs: iterable of (src, dest, geometry, options)
+    @param workers: int Number of threads (1 makes thumbnails serially)
+    @param fast: bool Try the in-process fast path first
+    @returns: generator of (src, dest, data dict or Exception)
+    """
+    def run(job):
+        src,dest,geometry,options = job
+        try:
+            return thumbnail(src, dest, geometry, options, fast)
+        except Exception as err:
+            return err
+    
+    if workers < 2:
+        for job in jobs:
+            yield job[0], job[1], run(job)
+        return
+    pending: Deque[Tuple[str, str, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for job in jobs:
+                pending.append((job[0], job[1], pool.submit(run, job)))
+                if len(pending) >= workers * 2:
+                    src,dest,future = pending.popleft()
+                    yield src, dest, future.result()
+            while pending:
+                src,dest,future = pending.popleft()
+                yield src, dest, future.result()
+        finally:
+            for src,dest,future in pending:
+                future.cancel()
+
 def extract_xmp(path_abs):
     """Attempts to extract XMP data from a file, returns as dict.
     
@@ -12,6 +12,7 @@ from DDR import dvcs
 from DDR import fileio
 from DDR import identifier
 from DDR import imaging
+from DDR import pipeline
 from DDR import util
 
 FILE_BINARY_FIELDS = [
@@ -128,6 +129,33 @@ def add_file(rowd, entity, git_name, git_mail, agent,
     else:
         log = addfile_logger(identifier=entity.identifier)
     
+    file_,annex_files = prepare_file(rowd, entity, log)
+    git_files = save_file(file_, entity, git_name, git_mail, agent, log)
+
+    log.ok('Staging files')
+    repo = stage_files(
+        entity,
+        git_files,
+        annex_files,
+        log, show_staged=show_staged
+    )
+    # IMPORTANT: Files are only staged! Be sure to commit!
+    # IMPORTANT: changelog is not staged!
+    return file_,repo,log
+
+def prepare_file(rowd, entity, log):
+    """Hash, copy, and make access file for a new file; don't write metadata
+    
+    The slow part of add_file.  Does not modify the entity or the
+    repository index so rows can be prepared in parallel threads
+    (see batch.Importer._add_new_files), but files must be saved with
+    save_file one at a time.
+    
+    @param rowd: dict Row from a CSV import file in dict form.
+    @param entity: Entity object
+    @param log: AddFileLogger
+    @returns: File,annex_files (paths relative to collection)
+    """
     log.ok('------------------------------------------------------------------------')
     log.ok('DDR.models.Entity.add_local_file: START')
     log.ok('rowd: %s' % rowd)
@@ -177,21 +205,31 @@ def add_file(rowd, entity, git_name, git_mail, agent,
         else:
             log.not_ok('no access file')
     
+    return file_, [
+        path.replace('%s/' % file_.collection_path, '') for path in annex_files
+    ]
+
+def save_file(file_, entity, git_name, git_mail, agent, log):
+    """Write file and entity metadata for a prepared file; don't stage
+    
+    Rewrites the entity JSON, so must not run for two files of the same
+    entity at the same time.
+    
+    @param file_: File from prepare_file
+    @param entity: Entity object
+    @param git_name: Username of git committer.
+    @param git_mail: Email of git committer.
+    @param agent: str (optional) Name of software making the change.
+    @param log: AddFileLogger
+    @returns: list git_files (paths relative to collection)
+    """
     log.ok('Writing file and entity rowd')
     exit,status,git_files = file_.save(
         git_name, git_mail, agent, parent=entity, commit=False
     )
-
-    log.ok('Staging files')
-    repo = stage_files(
-        entity,
-        [path.replace('%s/' % file_.collection_path, '') for path in git_files],
-        [path.replace('%s/' % file_.collection_path, '') for path in annex_files],
-        log, show_staged=show_staged
-    )
-    # IMPORTANT: Files are only staged! Be sure to commit!
-    # IMPORTANT: changelog is not staged!
-    return file_,repo,log
+    return [
+        path.replace('%s/' % file_.collection_path, '') for path in git_files
+    ]
 
 def _log_path(identifier, base_dir=config.LOG_DIR):
     """Generates path to collection addfiles.log.
@@ -245,9 +283,11 @@ def check_dir(label, path, log, mkdir=False, perm=os.W_OK):
     return True
 
 def checksums(src_path, log):
-    md5    = util.file_hash(src_path, 'md5');    log.ok('| md5: %s' % md5)
-    sha1   = util.file_hash(src_path, 'sha1');   log.ok('| sha1: %s' % sha1)
-    sha256 = util.file_hash(src_path, 'sha256'); log.ok('| sha256: %s' % sha256)
+    digests,size,elapsed = util.file_digests(src_path, ['md5', 'sha1', 'sha256'])
+    md5    = digests['md5'];    log.ok('| md5: %s' % md5)
+    sha1   = digests['sha1'];   log.ok('| sha1: %s' % sha1)
+    sha256 = digests['sha256']; log.ok('| sha256: %s' % sha256)
+    log.ok('| hashed %s' % util.throughput(size, elapsed))
     if not (sha1 and md5 and sha256):
         log.crash('Could not calculate checksums')
     return md5,sha1,sha256
@@ -326,6 +366,9 @@ def make_access_file(src_path, access_dest_path, log):
             geometry=config.ACCESS_FILE_GEOMETRY,
             options=config.ACCESS_FILE_OPTIONS,
         )
+        log.ok('| method: %s' % data['method'])
+        if data.get('fast_path_error'):
+            log.not_ok('| fast path: %s' % data['fast_path_error'])
         # identify
         log.ok('| identify: %s' % data['analysis']['std_out'])
         if data['analysis'].get('std_err'):
@@ -355,6 +398,58 @@ def make_access_file(src_path, access_dest_path, log):
         tmp_access_path = None
     return tmp_access_path
 
+def regenerate_access_files(collection_path, force=False,
+                            workers=config.THUMBNAIL_WORKERS,
+                            geometry=config.ACCESS_FILE_GEOMETRY,
+                            options=config.ACCESS_FILE_OPTIONS):
+    """Remakes access files for all files in a collection with binaries present
+    
+    Access files are made by a pool of threads (see imaging.thumbnails),
+    written to a temporary name, and moved over the old access file (or
+    its git-annex symlink) only if successful.  Nothing is staged; pass
+    the returned paths to dvcs.stage_batch as annex files.
+    
+    @param collection_path: str Absolute path to collection repo
+    @param force: bool Remake access files that already exist
+    @param workers: int Number of threads
+    @param geometry: str
+    @param options: str ImageMagick options
+    @returns: (list of access paths relative to collection, list of (src, error))
+    """
+    def jobs():
+        for fi in pipeline.meta_files(collection_path, models=['file']):
+            file_ = fi.object()
+            src = file_.path_abs
+            dest = file_.access_abs
+            # binary not present (e.g. git-annex content not in this repo)
+            if not (src and dest and os.path.exists(src)):
+                continue
+            if os.path.lexists(dest) and not force:
+                continue
+            tmp = '%s.tmp%s' % os.path.splitext(dest)
+            dests[tmp] = dest
+            yield src, tmp, geometry, options
+    
+    dests = {}
+    regenerated = []
+    errors = []
+    for src,tmp,data in imaging.thumbnails(jobs(), workers):
+        dest = dests.pop(tmp)
+        error = None
+        if isinstance(data, Exception):
+            error = data
+        elif not (data['exists'] and data['size']):
+            error = data['std_err'] or 'Access file was not created'
+        if error:
+            errors.append((src, error))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            continue
+        os.replace(tmp, dest)
+        regenerated.append(os.path.relpath(dest, collection_path))
+        logger.debug('%s %s' % (data['method'], dest))
+    return regenerated,errors
+
 def write_object_metadata(obj, tmp_dir, log):
     tmp_json = os.path.join(tmp_dir, os.path.basename(obj.json_path))
     log.ok('| %s' % tmp_json)
@@ -439,13 +534,16 @@ def predict_staged(already, planned):
     return total
 
 def stage_files(entity, git_files, annex_files, log, show_staged=True):
-    """Stage files; check before and after to ensure all files get staged
+    """Stage files; check afterwards to ensure all files get staged
+    
+    Files are staged in one batch (see dvcs.stage_batch) and checked
+    against a single git status.
 
     @param entity: DDR.models.entities.Entity
     @param git_files: list
     @param annex_files: list
     @param log: AddFileLogger
-    @param show_staged: bool
+    @param show_staged: bool Log each staged/modified/untracked file
     @returns: repo
     """
     repo = dvcs.repository(entity.collection_path)
@@ -457,34 +555,32 @@ def stage_files(entity, git_files, annex_files, log, show_staged=True):
         if path not in annex_files
     ]
     
-    log.ok('| BEFORE staging')
-    staged_before,modified_before,untracked_before = repo_status(repo, log)
-    
     stage_these = sorted(list(set(git_files + annex_files)))
     log.ok('| staging %s files:' % len(stage_these))
     for path in stage_these:
         log.ok('|   %s' % path)
     
-    stage_ok = False
-    staged = []
+    status = None
     try:
-        log.ok('| annex stage')
-        # Stage annex files (binaries) before non-binary git files
+        log.ok('| stage')
+        # Annex files (binaries) are staged before non-binary git files
         # else binaries might end up in .git/objects/ which would be NOT GOOD
-        dvcs.annex_stage(repo, annex_files)
-        log.ok('| git stage')
-        # If git_files contains binaries they are already staged by now.
-        dvcs.stage(repo, git_files)
+        status = dvcs.stage_batch(repo, git_files, annex_files)
         log.ok('| ok')
     except:
         # FAILED! print traceback to addfile log
         log.not_ok(traceback.format_exc().strip())
         
     log.ok('| AFTER staging')
-    staged_after,modified_after,untracked_after = repo_status(repo, log)
+    staged_after,modified_after,untracked_after = repo_status(
+        repo, log, status, show_staged
+    )
     
     # Crash if not staged
-    still_modified = [path for path in stage_these if path in modified_after]
+    still_modified = dvcs.unstaged(
+        {'modified': modified_after, 'untracked': untracked_after},
+        stage_these
+    )
     if still_modified:
         log.not_ok('These files are still modified')
         for path in still_modified:
@@ -493,26 +589,31 @@ def stage_files(entity, git_files, annex_files, log, show_staged=True):
     
     return repo
 
-def repo_status(repo, log):
+def repo_status(repo, log, status=None, show_files=True):
     """Logs staged, modified, and untracked files and returns same
     
     @param repo
     @param log
+    @param status: dict (optional) From dvcs.status_snapshot
+    @param show_files: bool Log each file, not just counts
     @returns: staged,modified,untracked
     """
     log.ok('| %s' % repo)
-    staged = dvcs.list_staged(repo)
-    modified = dvcs.list_modified(repo)
-    untracked = dvcs.list_untracked(repo)
+    if status is None:
+        status = dvcs.status_snapshot(repo)
+    staged = status['staged']
+    modified = status['modified']
+    untracked = status['untracked']
     log.ok('|   %s staged, %s modified, %s untracked' % (
         len(staged), len(modified), len(untracked),
     ))
-    for path in staged:
-        log.ok('|   staged: %s' % path)
-    for path in modified:
-        log.ok('|   modified: %s' % path)
-    for path in untracked:
-        log.ok('|   untracked: %s' % path)
+    if show_files:
+        for path in staged:
+            log.ok('|   staged: %s' % path)
+        for path in modified:
+            log.ok('|   modified: %s' % path)
+        for path in untracked:
+            log.ok('|   untracked: %s' % path)
     return staged, modified, untracked
 
 def file_info(src_path, log):
@@ -533,7 +634,8 @@ def file_info(src_path, log):
 def file_identifier(entity, data, sha1, log):
     log.ok('Identifier')
     # note: we can't make this until we have the sha1
-    idparts = entity.identifier.idparts
+    # copy so that the entity's Identifier is not modified
+    idparts = dict(entity.identifier.idparts)
     idparts['model'] = 'file'
     idparts['role'] = data['role']
     idparts['sha1'] = sha1[:10]
@@ -0,0 +1,547 @@
+"""Persistent manifest of a collection repository's metadata JSON files
+
+Walking a large collection with os.walk and regex-matching every filename
+is slow, especially on network filesystems.  The manifest records, for
+each metadata .json in the repo, its model, object ID, parent ID, mtime,
+size, and git blob hash, and answers find_meta_files-style queries from
+sorted in-memory indexes.
+
+The manifest is built from the git index (`git ls-files`) and is stored
+inside the repository's .git directory so it never shows up in
+`git status`.  It is kept up to date incrementally:
+
+- Commits, merges, checkouts, and resets move HEAD.  Files that changed
+  between the recorded HEAD and the current one (`git diff`) are re-read.
+- Files that `git status` reports as added/modified/deleted/untracked are
+  re-read.
+- `git status` is only run when .git/index, .git/HEAD, or the HEAD reflog
+  has changed since the last refresh, or when the mtime of a directory
+  containing (or above) a manifest entry has changed.  Creating, deleting,
+  or renaming a file changes its directory's mtime, so files written or
+  removed but not yet staged are picked up by the next refresh.  Files
+  rewritten in place are not noticed until they are staged; use
+  refresh(force=True) to check everything.
+- Only the entries that changed are re-read and re-indexed, and the
+  manifest file is rewritten at most every SAVE_INTERVAL seconds (and at
+  exit).  A manifest file that is out of date is still consistent with
+  the HEAD/index state it records, so the next refresh catches up.
+
+Usage:
+    >>> from DDR import manifest
+    >>> m = manifest.get('/var/www/media/ddr/ddr-testing-123')
+    >>> m.paths('/var/www/media/ddr/ddr-testing-123', recursive=True, model='entity')
+    ['/var/www/media/ddr/ddr-testing-123/files/ddr-testing-123-1/entity.json', ...]
+    >>> m.children('ddr-testing-123-1')
+    ['/var/www/media/ddr/ddr-testing-123/files/ddr-testing-123-1/files/ddr-testing-123-1-master-a1b2c3d4e5.json', ...]
+"""
+
+import atexit
+from bisect import bisect_left, insort
+import json
+import logging
+logger = logging.getLogger(__name__)
+import os
+import time
+from typing import Any, Dict, List, Match, Optional, Set, Tuple, Union
+
+import git
+from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
+
+from DDR import identifier
+
+MANIFEST_FILENAME = 'ddr-manifest.json'
+MANIFEST_VERSION = 2
+PATHSPEC = '*.json'
+LS_FILES_MAX_ARGS = 1000
+# Re-sort all entries rather than updating indexes one at a time
+REINDEX_MIN_CHANGED = 1000
+# Minimum seconds between rewrites of the manifest file
+SAVE_INTERVAL = 60
+
+# indexes of values in Manifest.entries records
+MODEL = 0
+OBJECT_ID = 1
+PARENT_ID = 2
+MTIME = 3
+SIZE = 4
+BLOB = 5
+
+# in-process copies of manifests, by repository path
+_MANIFESTS: Dict[str, 'Manifest'] = {}
+
+
+def repo_root(path: str) -> Optional[str]:
+    """Absolute path of the git working tree containing path, or None
+    
+    @param path: str Absolute path to file or directory.
+    @returns: str or None
+    """
+    path = os.path.normpath(path)
+    while True:
+        if os.path.isdir(os.path.join(path, '.git')):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+def get(path: str) -> Optional['Manifest']:
+    """Returns an up-to-date Manifest for the repository containing path
+    
+    Loads the manifest from disk (or builds it) the first time a repository
+    is requested, and keeps a copy in memory for subsequent calls.
+    
+    @param path: str Absolute path to (a directory in) a collection repo.
+    @returns: Manifest or None if path is not in a usable git repository.
+    """
+    root = repo_root(path)
+    if not root:
+        return None
+    manifest = _MANIFESTS.get(root)
+    try:
+        if not manifest:
+            manifest = Manifest.load(root)
+            if not manifest:
+                manifest = Manifest(root)
+                manifest.build()
+            _MANIFESTS[root] = manifest
+        manifest.refresh()
+    except (GitCommandError, InvalidGitRepositoryError, NoSuchPathError, OSError) as err:
+        logger.debug('No manifest for %s: %s' % (root, err))
+        _MANIFESTS.pop(root, None)
+        return None
+    return manifest
+
+def invalidate(path: str):
+    """Discards the manifest for the repository containing path
+    
+    The next get() will rebuild it from scratch.
+    
+    @param path: str Absolute path to (a directory in) a collection repo.
+    """
+    root = repo_root(path)
+    if not root:
+        return
+    _MANIFESTS.pop(root, None)
+    manifest_path = os.path.join(root, '.git', MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+def _git_state(git_dir: str) -> List[int]:
+    """mtimes of the files git touches when the index or HEAD changes
+    
+    @param git_dir: str Absolute path to .git directory
+    @returns: list of mtime_ns ints (0 if file absent)
+    """
+    state = []
+    for name in ['index', 'HEAD', os.path.join('logs', 'HEAD')]:
+        try:
+            state.append(os.stat(os.path.join(git_dir, name)).st_mtime_ns)
+        except FileNotFoundError:
+            state.append(0)
+    return state
+
+def _dir_state(path: str, paths_rel: List[str], known: Dict[str, int]={}) -> Dict[str, int]:
+    """mtimes of directories containing, or above, the listed files
+    
+    @param path: str Absolute path to repository working tree.
+    @param paths_rel: list of file paths relative to path
+    @param known: dict Directories (and their parents) to leave out
+    @returns: dict {dir_rel: mtime_ns} (0 if directory absent)
+    """
+    dirs = set()
+    if '' not in known:
+        dirs.add('')
+    for path_rel in paths_rel:
+        dir_rel = os.path.dirname(path_rel)
+        while (dir_rel not in dirs) and (dir_rel not in known):
+            dirs.add(dir_rel)
+            dir_rel = os.path.dirname(dir_rel)
+    state = {}
+    for dir_rel in dirs:
+        try:
+            state[dir_rel] = os.stat(os.path.join(path, dir_rel)).st_mtime_ns
+        except FileNotFoundError:
+            state[dir_rel] = 0
+    return state
+
+def _changed_dirs(path: str, dirs: Dict[str, int]) -> Dict[str, int]:
+    """Recorded directories whose mtimes have changed
+    
+    @param path: str Absolute path to repository working tree.
+    @param dirs: dict {dir_rel: mtime_ns} from _dir_state
+    @returns: dict {dir_rel: new mtime_ns} (0 if directory absent)
+    """
+    changed = {}
+    for dir_rel,mtime in dirs.items():
+        try:
+            new = os.stat(os.path.join(path, dir_rel)).st_mtime_ns
+        except FileNotFoundError:
+            new = 0
+        if new != mtime:
+            changed[dir_rel] = new
+    return changed
+
+def save_all():
+    """Writes in-process manifests that have unsaved changes (runs at exit)
+    """
+    for manifest in list(_MANIFESTS.values()):
+        if manifest._unsaved:
+            manifest.save()
+
+atexit.register(save_all)
+
+def _split_z(text: str) -> List[str]:
+    """Split NUL-separated git output
+    """
+    return [x for x in text.split('\0') if x]
+
+def _parse_ls_files_stage(text: str) -> Dict[str, str]:
+    """Parses output of "git ls-files --stage -z" into {path_rel: blob}
+    
+    >>> _parse_ls_files_stage('100644 a1b2c3 0\\tcollection.json\\0')
+    {'collection.json': 'a1b2c3'}
+    """
+    blobs = {}
+    for line in _split_z(text):
+        info,path_rel = line.split('\t', 1)
+        blobs[path_rel] = info.split()[1]
+    return blobs
+
+def _parse_status_z(text: str) -> List[str]:
+    """Parses output of "git status --porcelain -z" into list of path_rels
+    
+    Renames and copies list both the new and original paths.
+    
+    >>> _parse_status_z('?? new.json\\0R  b.json\\0a.json\\0')
+    ['new.json', 'b.json', 'a.json']
+    """
+    paths = []
+    items = _split_z(text)
+    n = 0
+    while n < len(items):
+        item = items[n]
+        paths.append(item[3:])
+        if item[0] in 'RC':
+            # next item is the original path
+            n += 1
+            paths.append(items[n])
+        n += 1
+    return paths
+
+def _identify(path_abs: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Model, object ID, and parent ID for a metadata file path
+    
+    @param path_abs: str
+    @returns: tuple (model, id, parent_id); all None if not a DDR object
+    """
+    try:
+        oi = identifier.Identifier(path_abs)
+        return oi.model, oi.id, oi.parent_id()
+    except Exception:
+        return None, None, None
+
+
+class Manifest():
+    """Index of metadata JSON files in a collection repository
+    
+    entries: {path_rel: [model, id, parent_id, mtime, size, blob]}
+    dirs: {dir_rel: mtime_ns} for directories that contain entries
+    """
+    path: str = ''
+    git_dir: str = ''
+    manifest_path: str = ''
+    head: Optional[str] = None
+    state: List[int] = []
+    dirs: Dict[str, int] = {}
+    dirty: List[str] = []
+    entries: Dict[str, list] = {}
+    _paths: List[str] = []
+    _children: Dict[str, List[str]] = {}
+    
+    def __init__(self, path: str):
+        """
+        @param path: str Absolute path to repository working tree.
+        """
+        self.path = os.path.normpath(path)
+        self.git_dir = os.path.join(self.path, '.git')
+        self.manifest_path = os.path.join(self.git_dir, MANIFEST_FILENAME)
+        self.head = None
+        self.state = []
+        self.dirs = {}
+        self.dirty = []
+        self.entries = {}
+        self._paths = []
+        self._children = {}
+        self._unsaved = False
+        self._saved = time.monotonic()
+    
+    def __repr__(self):
+        return "<%s.%s %s (%s entries)>" % (
+            self.__module__, self.__class__.__name__, self.path, len(self.entries)
+        )
+    
+    @staticmethod
+    def load(path: str) -> Optional['Manifest']:
+        """Loads manifest for repository from disk
+        
+        @param path: str Absolute path to repository working tree.
+        @returns: Manifest or None if absent, unreadable, or outdated format
+        """
+        manifest = Manifest(path)
+        if not os.path.exists(manifest.manifest_path):
+            return None
+        try:
+            with open(manifest.manifest_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as err:
+            logger.debug('Could not read %s: %s' % (manifest.manifest_path, err))
+            return None
+        if data.get('version') != MANIFEST_VERSION:
+            return None
+        manifest.head = data['head']
+        manifest.state = data['state']
+        manifest.dirs = data['dirs']
+        manifest.dirty = data['dirty']
+        manifest.entries = data['entries']
+        manifest._reindex()
+        return manifest
+    
+    def save(self):
+        """Writes manifest to disk; failures (e.g. read-only repo) are logged
+        """
+        self._unsaved = False
+        self._saved = time.monotonic()
+        data = {
+            'version': MANIFEST_VERSION,
+            'head': self.head,
+            'state': self.state,
+            'dirs': self.dirs,
+            'dirty': self.dirty,
+            'entries': self.entries,
+        }
+        tmp_path = '%s.tmp' % self.manifest_path
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as err:
+            logger.debug('Could not write %s: %s' % (self.manifest_path, err))
+    
+    def save_later(self):
+        """Saves if SAVE_INTERVAL has passed since the last save
+        
+        Otherwise the manifest is saved by a later call or by save_all()
+        at exit.
+        """
+        self._unsaved = True
+        if time.monotonic() - self._saved >= SAVE_INTERVAL:
+            self.save()
+    
+    def _repo(self) -> git.Repo:
+        return git.Repo(self.path)
+    
+    @staticmethod
+    def _head(repo: git.Repo) -> Optional[str]:
+        """Hexsha of HEAD commit, or None if repo has no commits yet
+        """
+        try:
+            return repo.head.commit.hexsha
+        except ValueError:
+            return None
+    
+    def build(self):
+        """Builds manifest from the git index plus untracked files
+        """
+        repo = self._repo()
+        self.state = _git_state(self.git_dir)
+        self.head = self._head(repo)
+        blobs = _parse_ls_files_stage(
+            repo.git.ls_files('--stage', '-z', '--', PATHSPEC)
+        )
+        untracked = _split_z(repo.git.ls_files(
+            '--others', '--exclude-standard', '-z', '--', PATHSPEC
+        ))
+        self.dirty = _parse_status_z(repo.git.status(
+            '--porcelain', '-z', '--untracked-files=all', '--', PATHSPEC
+        ))
+        self.entries = {}
+        dirty = set(self.dirty)
+        for path_rel in list(blobs.keys()) + untracked:
+            self._update(path_rel, blobs.get(path_rel), dirty, index=False)
+        self._reindex()
+        self.dirs = _dir_state(self.path, self._paths)
+        self.save()
+    
+    def refresh(self, force: bool=False) -> bool:
+        """Brings manifest up to date with the repository
+        
+        @param force: bool Check `git status` even if nothing seems changed.
+        @returns: bool True if anything was checked
+        """
+        state = _git_state(self.git_dir)
+        changed_dirs = _changed_dirs(self.path, self.dirs)
+        if (state == self.state) and not force and not changed_dirs:
+            return False
+        repo = self._repo()
+        head = self._head(repo)
+        changed = set(self.dirty)
+        if head != self.head:
+            if not (self.head and head):
+                self.build()
+                return True
+            try:
+                changed.update(_split_z(repo.git.diff(
+                    '--name-only', '--no-renames', '-z', self.head, head, '--', PATHSPEC
+                )))
+            except GitCommandError:
+                # recorded HEAD no longer exists (e.g. history rewritten)
+                self.build()
+                return True
+        self.dirty = _parse_status_z(repo.git.status(
+            '--porcelain', '-z', '--untracked-files=all', '--', PATHSPEC
+        ))
+        changed.update(self.dirty)
+        if changed:
+            # avoid overlong command lines after e.g. a big merge
+            pathspecs = sorted(changed)
+            if len(pathspecs) > LS_FILES_MAX_ARGS:
+                pathspecs = [PATHSPEC]
+            blobs = _parse_ls_files_stage(
+                repo.git.ls_files('--stage', '-z', '--', *pathspecs)
+            )
+            dirty = set(self.dirty)
+            reindex = len(changed) >= REINDEX_MIN_CHANGED
+            for path_rel in changed:
+                self._update(path_rel, blobs.get(path_rel), dirty, index=not reindex)
+            if reindex:
+                self._reindex()
+        # only stat directories that are new to the manifest
+        self.dirs.update(changed_dirs)
+        self.dirs.update(_dir_state(
+            self.path, [p for p in changed if p in self.entries], self.dirs
+        ))
+        self.head = head
+        self.state = state
+        self.save_later()
+        return True
+    
+    def _update(self, path_rel: str, blob: Optional[str], dirty: Set[str], index: bool=True):
+        """Adds, updates, or removes the record for one file
+        
+        @param index: bool Update the sorted indexes too (else use _reindex)
+        """
+        if not path_rel.endswith('.json'):
+            return
+        if index:
+            self._unindex(path_rel)
+        path_abs = os.path.join(self.path, path_rel)
+        try:
+            st = os.stat(path_abs)
+        except FileNotFoundError:
+            self.entries.pop(path_rel, None)
+            return
+        if path_rel in dirty:
+            # working-tree contents don't match the index blob
+            blob = None
+        model,oid,parent_id = _identify(path_abs)
+        self.entries[path_rel] = [
+            model, oid, parent_id, st.st_mtime, st.st_size, blob
+        ]
+        if index:
+            self._index(path_rel)
+    
+    def _index(self, path_rel: str):
+        """Adds one entry to the sorted path list and parent->children index
+        """
+        insort(self._paths, path_rel)
+        parent_id = self.entries[path_rel][PARENT_ID]
+        if parent_id:
+            insort(self._children.setdefault(parent_id, []), path_rel)
+    
+    def _unindex(self, path_rel: str):
+        """Removes one entry from the sorted path list and parent->children index
+        """
+        entry = self.entries.get(path_rel)
+        if not entry:
+            return
+        n = bisect_left(self._paths, path_rel)
+        if (n < len(self._paths)) and (self._paths[n] == path_rel):
+            del self._paths[n]
+        siblings = self._children.get(entry[PARENT_ID])
+        if siblings:
+            n = bisect_left(siblings, path_rel)
+            if (n < len(siblings)) and (siblings[n] == path_rel):
+                del siblings[n]
+            if not siblings:
+                self._children.pop(entry[PARENT_ID])
+    
+    def _reindex(self):
+        """Rebuilds sorted path list and parent->children index
+        """
+        self._paths = sorted(self.entries.keys())
+        self._children = {}
+        for path_rel in self._paths:
+            parent_id = self.entries[path_rel][PARENT_ID]
+            if parent_id:
+                self._children.setdefault(parent_id, []).append(path_rel)
+    
+    def record(self, path: str) -> Optional[Dict[str, Any]]:
+        """Manifest record for a metadata file
+        
+        @param path: str Absolute path to metadata file
+        @returns: dict or None
+        """
+        path_rel = os.path.relpath(path, self.path)
+        entry = self.entries.get(path_rel)
+        if not entry:
+            return None
+        return {
+            'path_rel': path_rel,
+            'model': entry[MODEL],
+            'id': entry[OBJECT_ID],
+            'parent_id': entry[PARENT_ID],
+            'mtime': entry[MTIME],
+            'size': entry[SIZE],
+            'blob': entry[BLOB],
+        }
+    
+    def paths(self, basedir: str, recursive: bool=False, model: Optional[str]=None) -> List[str]:
+        """Absolute paths to metadata files in or under basedir
+        
+        Files under .git or ending in '~' are never listed.
+        
+        @param basedir: str Absolute path to directory inside repository.
+        @param recursive: bool Include subdirectories.
+        @param model: str Restrict to the named model ('collection','entity','file').
+        @returns: list of absolute paths, sorted
+        """
+        prefix = os.path.relpath(os.path.normpath(basedir), self.path)
+        if prefix == '.':
+            prefix = ''
+        else:
+            prefix = prefix + '/'
+        start = bisect_left(self._paths, prefix)
+        paths = []
+        for path_rel in self._paths[start:]:
+            if not path_rel.startswith(prefix):
+                break
+            if not recursive and ('/' in path_rel[len(prefix):]):
+                continue
+            if model and self.entries[path_rel][MODEL] != model:
+                continue
+            paths.append(os.path.join(self.path, path_rel))
+        return paths
+    
+    def children(self, parent_id: str, model: Optional[str]=None) -> List[str]:
+        """Absolute paths to metadata files of parent_id's direct children
+        
+        @param parent_id: str Object ID
+        @param model: str Restrict to the named model.
+        @returns: list of absolute paths, sorted by path
+        """
+        return [
+            os.path.join(self.path, path_rel)
+            for path_rel in self._children.get(parent_id, [])
+            if (not model) or (self.entries[path_rel][MODEL] == model)
+        ]
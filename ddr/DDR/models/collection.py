@@ -15,12 +15,13 @@ from DDR import docstore
 from DDR import dvcs
 from DDR import fileio
 from DDR import format_json
-from DDR.identifier import Identifier, ID_COMPONENTS
+from DDR.identifier import Identifier, ID_COMPONENTS, path_sort_key
 from DDR import inheritance
 from DDR import locking
 from DDR.models import common
 from DDR.models.entity import ListEntity, Entity
 from DDR import modules
+from DDR import objectcache
 from DDR import util
 
 COLLECTION_FILES_PREFIX = 'files'
@@ -279,26 +280,26 @@ class Collection(common.DDRObject):
             # TODO use cached list if available
             for eid in os.listdir(self.files_path):
                 path = os.path.join(self.files_path, eid)
-                entity_paths.append(path)
-        entity_paths = util.natural_sort(entity_paths)
+                # skip strays (.DS_Store, tmp dirs) that aren't entities
+                if os.path.exists(os.path.join(path, 'entity.json')):
+                    entity_paths.append(path)
+        entity_paths.sort(key=path_sort_key)
         entities = []
         for path in entity_paths:
             if quick:
                 # fake Entity with just enough info for lists
-                entity_json_path = os.path.join(path,'entity.json')
-                if os.path.exists(entity_json_path):
-                    with open(entity_json_path, 'r') as f:
-                        data = json.loads(f.read())
-                    e = ListEntity()
-                    e.identifier = Identifier(path=path)
-                    e.id = e.identifier.id
-                    for line in data[1:]:
-                        if 'title' in list(line.keys()):
-                            e.title = line['title']
-                        elif 'signature_id' in list(line.keys()):
-                            e.signature_id = line['signature_id']
-                    e.signature_abs = common.signature_abs(e, self.identifier.basepath)
-                    entities.append(e)
+                data = fileio.read_fields(
+                    os.path.join(path, 'entity.json'), ['title', 'signature_id']
+                )
+                e = ListEntity()
+                e.identifier = Identifier(path=path)
+                e.id = e.identifier.id
+                if 'title' in data:
+                    e.title = data['title']
+                if 'signature_id' in data:
+                    e.signature_id = data['signature_id']
+                e.signature_abs = common.signature_abs(e, self.identifier.basepath)
+                entities.append(e)
             else:
                 entity = Entity.from_identifier(Identifier(path=path))
                 for lv in entity.labels_values():
@@ -364,6 +365,7 @@ class Collection(common.DDRObject):
             self.dump_json(doc_metadata=True, obj_metadata=obj_metadata),
             self.json_path
         )
+        objectcache.invalidate(self.json_path)
     
     def post_json(self):
         # NOTE: this is same basic code as Docstore.index
@@ -448,7 +450,7 @@ class Collection(common.DDRObject):
                 colldir = os.path.join(collections_root,x)
                 if 'collection.json' in os.listdir(colldir):
                     paths.append(colldir)
-        return util.natural_sort(paths)
+        return sorted(paths, key=path_sort_key)
     
     def repo_fetch( self ):
         """Fetch latest changes to collection repo from origin/master.
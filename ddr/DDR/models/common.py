@@ -1,5 +1,4 @@
 from collections import OrderedDict
-from copy import deepcopy
 from datetime import datetime
 from functools import total_ordering
 import json
@@ -9,18 +8,18 @@ import re
 from deepdiff import DeepDiff
 import elasticsearch_dsl as dsl
 
-from DDR import VERSION
+from DDR import VERSION, json_loads
 from DDR import archivedotorg
 from DDR import config
 from DDR import converters
 from DDR import docstore
 from DDR import dvcs
 from DDR import fileio
-from DDR.identifier import Identifier, ID_COMPONENTS, MODELS_IDPARTS, MODULES
-from DDR.identifier import ELASTICSEARCH_CLASSES_BY_MODEL
+from DDR.identifier import Identifier, ID_COMPONENTS, MODULES
 from DDR import inheritance
 from DDR import locking
 from DDR import modules
+from DDR import objectcache
 from DDR import util
 
 INTERVIEW_SIG_PATTERN = r'^denshovh-[a-z_0-9]{1,}-[0-9]{2,2}$'
@@ -83,7 +82,7 @@ class DDRObject(object):
 
     def __lt__(self, other):
         """Enable Pythonic sorting"""
-        return self.identifier.id_sort < other.identifier.id_sort
+        return self.identifier.sort_key < other.identifier.sort_key
     
     #exists
     #create
@@ -298,39 +297,39 @@ class DDRObject(object):
         """
         # instantiate appropriate subclass of ESObject / DocType
         # TODO Devil's advocate: why are we doing this? We already have the object.
-        ES_Class = ELASTICSEARCH_CLASSES_BY_MODEL[self.identifier.model]
-        fields_module = self.identifier.fields_module()
-        if not public_fields:
-            public_fields = [
-                f['name']
-                for f in fields_module.FIELDS
-                if f['elasticsearch']['public']
-            ]
+        # public fields, index_* functions, doctype fields are worked out once per model
+        plan = docstore.field_plan(
+            self.identifier.model, self.identifier.fields_module()
+        )
+        ES_Class = plan.es_class
+        if public_fields:
+            public_fields = set(public_fields)
+        collection_id = self.identifier.collection_id()
         
         img_path = ''
         if hasattr(self, 'mimetype') and (self.mimetype == 'text/html'):
             # file with html transcript  TODO test this
             img_path = os.path.join(
-                self.identifier.collection_id(),
+                collection_id,
                 '%s%s' % (self.id, self.ext),
             )
         elif hasattr(self, 'access_rel'):
             # file with image            TODO test this
             img_path = os.path.join(
-                self.identifier.collection_id(),
+                collection_id,
                 os.path.basename(self.access_rel),
             )
         elif self.signature_id:
             # entity with signature      TODO test this
             img_path = os.path.join(
-                self.identifier.collection_id(),
+                collection_id,
                 access_filename(self.signature_id),
             )
         
         download_path = ''
         if (self.identifier.model in ['file']):
             download_path = os.path.join(
-                self.identifier.collection_id(),
+                collection_id,
                 '%s%s' % (self.id, self.ext),
             )
         
@@ -338,26 +337,26 @@ class DDRObject(object):
         d.meta.id = self.identifier.id
         d.id = self.identifier.id
         d.model = self.identifier.model
-        if self.identifier.collection_id() != self.identifier.id:
+        parent_id_stubs = self.identifier.parent_id(stubs=True)
+        if collection_id != self.identifier.id:
             # we don't want file-role (a stub) as parent
             d.parent_id = self.identifier.parent_id(stubs=0)
         else:
             # but we do want repository,organization (both stubs)
-            d.parent_id = self.identifier.parent_id(stubs=1)
+            d.parent_id = parent_id_stubs
         d.organization_id = self.identifier.organization_id()
-        d.collection_id = self.identifier.collection_id()
+        d.collection_id = collection_id
         d.signature_id = self.signature_id
         # ID components (repo, org, cid, ...) as separate fields
-        idparts = deepcopy(self.identifier.idparts)
-        idparts.pop('model')
 #        for k in ID_COMPONENTS:
 #            setattr(d, k, '') # ensure all fields present
-        for k,v in idparts.items():
-            setattr(d, k, v)
+        for k,v in self.identifier.idparts.items():
+            if k != 'model':
+                setattr(d, k, v)
         # links
         d.links_html = self.identifier.id
         d.links_json = self.identifier.id
-        d.links_parent = self.identifier.parent_id(stubs=True)
+        d.links_parent = parent_id_stubs
         d.links_children = self.identifier.id
         d.links_img = img_path
         d.links_thumb = img_path
@@ -366,30 +365,23 @@ class DDRObject(object):
         else: d.title = self.label
         if hasattr(self, 'description'): d.description = self.description
         else: d.description = ''
-        # breadcrumbs
-        d.lineage = [
-            {
-                'id': i.id,
-                'model': i.model,
-                'idpart': str(MODELS_IDPARTS[i.model][-1][-1]),
-                'label': str(i.idparts[
-                    MODELS_IDPARTS[i.model][-1][-1]
-                ]),
-            }
-            for i in self.identifier.lineage(stubs=0)
-        ]
+        # breadcrumbs (ancestors are shared with siblings)
+        d.lineage = docstore.lineage_breadcrumbs(self.identifier)
         # module-specific fields
-        if hasattr(ES_Class, 'list_fields'):
-            setattr(d, '_fields', ES_Class.list_fields())
+        if plan.list_fields is not None:
+            setattr(d, '_fields', plan.list_fields)
         # module-specific fields
-        for fieldname in docstore.doctype_fields(ES_Class):
+        for fieldname,is_public,index_function in plan.fields:
             # hide non-public fields if this is public
-            if public and (fieldname not in public_fields):
-                continue
+            if public:
+                if public_fields:
+                    if fieldname not in public_fields:
+                        continue
+                elif not is_public:
+                    continue
             # complex fields use repo_models.MODEL.index_FIELD if present
-            if hasattr(fields_module, 'index_%s' % fieldname):
-                field_data = modules.Module(fields_module).function(
-                    'index_%s' % fieldname,
+            if index_function:
+                field_data = index_function(
                     getattr(self, fieldname),
                 )
             else:
@@ -455,6 +447,7 @@ class DDRObject(object):
                 ),
                 path
             )
+            objectcache.invalidate(path)
     
     #post_json
     #load_csv
@@ -477,39 +470,27 @@ class DDRObject(object):
 def sort_file_paths(json_paths, rank='role-eid-sort'):
     """Sort file JSON paths in human-friendly order.
     
-    TODO this belongs in DDR.identifier
+    Keys are made from the components of the canonical Identifier.sort_key
+    plus the file's sort field.
+    NOTE: paths are returned in descending order.
     
     @param json_paths: 
     @param rank: 'role-eid-sort' or 'eid-sort-role'
     """
-    paths = {}
-    keys = []
-    while json_paths:
-        path = json_paths.pop()
+    def key(path):
         identifier = Identifier(path=path)
-        eid = identifier.parts.get('eid',None)
-        role = identifier.parts.get('role',None)
-        sha1 = identifier.parts.get('sha1',None)
-        sort = 0
-        for line in fileio.read_text(path).splitlines():
-            if 'sort' in line:
-                sort = line.split(':')[1].replace('"','').strip()
-        eid = str(eid)
-        sha1 = str(sha1)
-        sort = str(sort)
+        values = dict(zip(identifier.parts.keys(), identifier.sort_key[1::2]))
+        try:
+            sort = int(fileio.read_fields(path, ['sort']).get('sort', 0))
+        except (TypeError, ValueError):
+            sort = 0
+        eid = values.get('eid', 0)
+        role = values.get('role', 0)
+        sha1 = values.get('sha1', '')
         if rank == 'eid-sort-role':
-            key = '-'.join([str(eid),sort,role,sha1])
-        elif rank == 'role-eid-sort':
-            key = '-'.join([role,eid,sort,sha1])
-        paths[key] = path
-        keys.append(key)
-    keys_sorted = [key for key in util.natural_sort(keys)]
-    paths_sorted = []
-    while keys_sorted:
-        val = paths.pop(keys_sorted.pop(), None)
-        if val:
-            paths_sorted.append(val)
-    return paths_sorted
+            return eid,sort,role,sha1
+        return role,eid,sort,sha1
+    return sorted(json_paths, key=key, reverse=True)
 
 def new_object(identifier, parent=None, inherit=True):
     """Creates a new object initial values from module.FIELDS.
@@ -639,14 +620,14 @@ def form_prep(document, module):
     @returns data: dict object as used by Django Form object.
     """
     data = {}
+    formprep = modules.codecs(module).formprep
     for f in module.FIELDS:
         if hasattr(document, f['name']) and f.get('form',None):
             fieldname = f['name']
             # run formprep_* functions on field data if present
-            field_data = modules.Module(module).function(
-                'formprep_%s' % fieldname,
-                getattr(document, f['name'])
-            )
+            field_data = getattr(document, f['name'])
+            if fieldname in formprep:
+                field_data = formprep[fieldname](field_data)
             data[fieldname] = field_data
     return data
     
@@ -662,14 +643,14 @@ def form_post(document, module, cleaned_data):
     @param module: collection, entity, files model definitions module
     @param cleaned_data: dict cleaned_data from DDRForm
     """
+    formpost = modules.codecs(module).formpost
     for f in module.FIELDS:
         if hasattr(document, f['name']) and f.get('form',None):
             fieldname = f['name']
             # run formpost_* functions on field data if present
-            field_data = modules.Module(module).function(
-                'formpost_%s' % fieldname,
-                cleaned_data[fieldname]
-            )
+            field_data = cleaned_data[fieldname]
+            if fieldname in formpost:
+                field_data = formpost[fieldname](field_data)
             setattr(document, fieldname, field_data)
     # update record_lastmod
     if hasattr(document, 'record_lastmod'):
@@ -683,7 +664,7 @@ def load_json_lite(json_path, model, object_id):
     @param object_id: str
     @returns: list of dicts
     """
-    document = json.loads(fileio.read_text(json_path))
+    document = json_loads(fileio.read_text(json_path))
     if model == 'file':
         document.append( {'id':object_id} )
     return document
@@ -700,30 +681,37 @@ def load_json(document, module, json_text):
     @param json_text: JSON-formatted text
     @returns: dict
     """
-    json_data = json.loads(json_text)
-    # software and commit metadata
+    json_data = json_loads(json_text)
+    # One pass through the document: software and commit metadata, and
+    # {fieldname: value} for the first key of each item (last one wins).
+    values = {}
+    object_metadata = None
     for field in json_data:
-        if is_object_metadata(field):
-            setattr(document, 'object_metadata', field)
+        if not (hasattr(field, 'keys') and field):
+            continue
+        if (object_metadata is None) and is_object_metadata(field):
+            object_metadata = field
+        for key,value in field.items():
+            values[key] = value
             break
+    if object_metadata is not None:
+        setattr(document, 'object_metadata', object_metadata)
     # field values from JSON
-    for mf in module.FIELDS:
-        for f in json_data:
-            if hasattr(f, 'keys') and (list(f.keys())[0] == mf['name']):
-                fieldname = list(f.keys())[0]
-                # run jsonload_* functions on field data if present
-                field_data = modules.Module(module).function(
-                    'jsonload_%s' % fieldname,
-                    list(f.values())[0]
-                )
-                if isinstance(field_data, str):
-                    field_data = field_data.strip()
-                setattr(document, fieldname, field_data)
     # Fill in missing fields with default values from module.FIELDS.
     # Note: should not replace fields that are just empty.
+    jsonload = modules.codecs(module).jsonload
     for mf in module.FIELDS:
-        if not hasattr(document, mf['name']):
-            setattr(document, mf['name'], mf.get('default',None))
+        fieldname = mf['name']
+        if fieldname in values:
+            field_data = values[fieldname]
+            # run jsonload_* functions on field data if present
+            if fieldname in jsonload:
+                field_data = jsonload[fieldname](field_data)
+            if isinstance(field_data, str):
+                field_data = field_data.strip()
+            setattr(document, fieldname, field_data)
+        elif not hasattr(document, fieldname):
+            setattr(document, fieldname, mf.get('default',None))
     # Add timeszone to fields if not present
     apply_timezone(document, module)
     return json_data
@@ -774,6 +762,7 @@ def dump_json(obj, module, template=False,
     @returns: dict
     """
     data = []
+    jsondump = modules.codecs(module).jsondump
     for mf in module.FIELDS:
         item = {}
         fieldname = mf['name']
@@ -783,10 +772,9 @@ def dump_json(obj, module, template=False,
             field_data = mf['form']['initial']
         elif hasattr(obj, mf['name']):
             # run jsondump_* functions on field data if present
-            field_data = modules.Module(module).function(
-                'jsondump_%s' % fieldname,
-                getattr(obj, fieldname)
-            )
+            field_data = getattr(obj, fieldname)
+            if fieldname in jsondump:
+                field_data = jsondump[fieldname](field_data)
         item[fieldname] = field_data
         if fieldname not in exceptions:
             data.append(item)
@@ -840,18 +828,19 @@ def prep_csv(obj, module, fields=[]):
         field_names = module.field_names()
         # TODO field_directives go here!
     # seealso DDR.modules.Module.function
+    csvdump = modules.codecs(module.module).csvdump
+    is_file = module.module.MODEL == 'file'
     values = []
     for fieldname in field_names:
         value = ''
         # insert file_id as first column
-        if (module.module.MODEL == 'file') and (fieldname == 'file_id'):
+        if is_file and (fieldname == 'file_id'):
             field_data = obj.id
         elif hasattr(obj, fieldname):
             # run csvdump_* functions on field data if present
-            field_data = module.function(
-                'csvdump_%s' % fieldname,
-                getattr(obj, fieldname)
-            )
+            field_data = getattr(obj, fieldname)
+            if fieldname in csvdump:
+                field_data = csvdump[fieldname](field_data)
             if field_data == None:
                 field_data = ''
         value = util.normalize_text(field_data)
@@ -863,26 +852,17 @@ def csvload_rowd(module, rowd):
     """
     # In repo_models.object.FIELDS, individual fields can be marked
     # so they are ignored (e.g. not included) when importing.
-    # TODO make field_directives ONCE at start of rowds loop
     # Other CSV fields like `access_path` (for importing custom access files)
     # are not in repo_models.object.FIELDS at all but we still need them.
-    field_directives = {
-        f['name']: f['csv']['import']
-        for f in module.module.FIELDS
-    }
+    codecs = modules.codecs(module.module)
+    csvload = codecs.csvload
     data = {}
     for fieldname,value in rowd.items():
-        try:
-            ignored = 'ignore' in field_directives[fieldname]
-        except KeyError:
-            # Ignore rowd fields not in module.FIELDS
-            ignored = None
-        if ignored != True:
+        if fieldname not in codecs.csv_import_ignored:
             # run csvload_* functions on field data if present
-            field_data = module.function(
-                'csvload_%s' % fieldname,
-                rowd[fieldname]
-            )
+            field_data = value
+            if fieldname in csvload:
+                field_data = csvload[fieldname](field_data)
             # TODO optimize, normalize only once
             data[fieldname] = util.normalize_text(field_data)
     return data
@@ -899,20 +879,12 @@ def load_csv(obj, module, rowd):
     # so they are ignored (e.g. not included) when importing.
     # Other CSV fields like `access_path` (for importing custom access files)
     # are not in repo_models.object.FIELDS at all but we still need them.
-    field_directives = {
-        f['name']: f['csv']['import']
-        for f in module.module.FIELDS
-    }
+    ignored = modules.codecs(module.module).csv_import_ignored
     # apply module's csvload_* methods to rowd data
     rowd = csvload_rowd(module, rowd)
     obj.modified_fields = []
     for field,value in rowd.items():
-        try:
-            ignored = 'ignore' in field_directives[field]
-        except KeyError:
-            # Ignore rowd fields not in module.FIELDS
-            ignored = None
-        if ignored != True:
+        if field not in ignored:
             oldvalue = getattr(obj, field, '')
             value = rowd[field]
             if value != oldvalue:
@@ -10,7 +10,6 @@ import os
 from typing import Any, Dict, List, Match, Optional, Set, Tuple, Union
 
 from jinja2 import Template
-from natsort import natsorted
 
 from DDR import commands
 from DDR import config
@@ -18,11 +17,12 @@ from DDR.control import EntityControlFile
 from DDR import docstore
 from DDR import fileio
 from DDR import format_json
-from DDR.identifier import Identifier, MODULES
+from DDR.identifier import Identifier, MODULES, path_sort_key
 from DDR.identifier import CHILDREN, ID_COMPONENTS, NODES, VALID_COMPONENTS
 from DDR import ingest
 from DDR import inheritance
 from DDR import locking
+from DDR import manifest
 from DDR.models import common
 from DDR.models.files import File
 from DDR import modules
@@ -118,10 +118,10 @@ class Entity(common.DDRObject):
     
     def _key(self):
         """Key for Pythonic object sorting.
-        Returns tuple of self.sort,self.identifier.id_sort
+        Returns tuple of self.sort,self.identifier.sort_key
         (self.sort takes precedence over ID sort)
         """
-        return self.sort,self.identifier.id_sort
+        return self.sort,self.identifier.sort_key
 
     @staticmethod
     def exists(oidentifier, basepath=None, gitolite=None, idservice=None):
@@ -371,7 +371,8 @@ class Entity(common.DDRObject):
         if force_read or not self._children_objects:
             # read objects from filesystem
             self._children_objects = _sort_children([
-                Identifier(path).object() for path in self._children_paths()
+                Identifier(path).object()
+                for path in self._children_paths(force_read=force_read)
             ])
         if models:
             return [
@@ -565,12 +566,10 @@ class Entity(common.DDRObject):
             pathname = os.path.splitext(f)[0]
             # from metadata file
             json_path = os.path.join(self.files_path, f)
-            for field in json.loads(fileio.read_text(json_path)):
-                for k,v in field.items():
-                    if k == algo:
-                        cs = v
-                    if k == 'basename_orig':
-                        ext = os.path.splitext(v)[-1]
+            data = fileio.read_fields(json_path, [algo, 'basename_orig'])
+            cs = data.get(algo)
+            if 'basename_orig' in data:
+                ext = os.path.splitext(data['basename_orig'])[-1]
             fpath = pathname + ext
             if force_read:
                 # from filesystem
@@ -581,18 +580,30 @@ class Entity(common.DDRObject):
                 checksums.append( (cs, os.path.basename(fpath)) )
         return checksums
     
-    def _children_paths(self):
-        """Searches fs for (entity) childrens' .jsons, returns natsorted paths
+    def _children_paths(self, force_read=False):
+        """Searches fs for (entity) childrens' .jsons, returns sorted paths
         
+        @param force_read: bool Search filesystem instead of using manifest
         @returns: list
         """
         if os.path.exists(self.files_path):
-            return natsorted([
+            m = None
+            if not force_read:
+                m = manifest.get(self.files_path)
+            if m:
+                # manifest indexes children by parent ID
+                return sorted([
+                    f for f in m.children(self.id)
+                    if f.startswith(self.files_path)
+                ], key=path_sort_key)
+            return sorted([
                 f
-                for f in util.find_meta_files(self.files_path, recursive=True)
+                for f in util.find_meta_files(
+                    self.files_path, recursive=True, force_read=force_read
+                )
                 # only direct children, no descendants
                 if Identifier(f).parent_id() == self.id
-            ])
+            ], key=path_sort_key)
         return []
     
     def _file_paths(self, rel=False):
@@ -604,13 +615,13 @@ class Entity(common.DDRObject):
             prefix_path = 'THISWILLNEVERMATCHANYTHING'
             if rel:
                 prefix_path = '{}/'.format(os.path.normpath(self.files_path))
-            return sorted(
-                [
-                    f.replace(prefix_path, '')
-                    for f in util.find_meta_files(self.files_path, recursive=False)
-                ],
-                key=lambda f: util.natural_order_string(f)
-            )
+            return [
+                f.replace(prefix_path, '')
+                for f in sorted(
+                    util.find_meta_files(self.files_path, recursive=False),
+                    key=path_sort_key
+                )
+            ]
         return []
     
     def detect_children_duplicates(self):
@@ -769,7 +780,7 @@ def _sort_children(objects):
     combined = []
     for model in ['entity', 'segment', 'file']:  # TODO replace hard-coded
         if model in objects_by_model.keys():
-            combined += natsorted(objects_by_model[model])
+            combined += sorted(objects_by_model[model])
     return combined
 
 
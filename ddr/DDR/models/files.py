@@ -150,10 +150,10 @@ class File(common.DDRObject):
     
     def _key(self):
         """Key for Pythonic object sorting.
-        Returns tuple of self.sort,self.identifier.id_sort
+        Returns tuple of self.sort,self.identifier.sort_key
         (self.sort takes precedence over ID sort)
         """
-        return int(self.sort),self.identifier.id_sort
+        return int(self.sort),self.identifier.sort_key
 
     #@staticmethod
     #def exists(oidentifier, basepath=None, gitolite=None, idservice=None):
@@ -1,9 +1,130 @@
+from functools import lru_cache
 import json
-from typing import Any, Dict, List, Match, Optional, Set, Tuple, Union
+from typing import Any, Callable, Dict, List, Match, Optional, Set, Tuple, Union
 
 from DDR import dvcs
 
 
+# Prefixes of per-field functions in repo_models modules
+CODEC_PREFIXES = [
+    'jsonload', 'jsondump', 'csvload', 'csvdump', 'csvvalidate',
+    'formprep', 'formpost', 'display', 'index',
+]
+
+@lru_cache(maxsize=None)
+def field_functions(module, prefix: str) -> Dict[str, Callable]:
+    """Returns module's {prefix}_{field} functions, keyed by field name
+    
+    Same functions as Module.function(), but the module is inspected only
+    once per prefix instead of once per field per object.
+    Includes functions for fields that are not in module.FIELDS (e.g. CSV
+    columns like access_path).
+    
+    >>> field_functions(entity_module, 'jsonload')
+    {'record_created': <function jsonload_record_created at ...>, ...}
+    
+    @param module: collection, entity, files model definitions module
+    @param prefix: str e.g. 'jsonload', 'csvdump'
+    @returns: dict {fieldname: function}
+    """
+    start = '%s_' % prefix
+    functions = {}
+    for name in dir(module):
+        if name.startswith(start):
+            function = getattr(module, name)
+            if callable(function):
+                functions[name[len(start):]] = function
+    return functions
+
+def _identity(value):
+    return value
+
+
+class FieldCodecs(object):
+    """Table of a definitions module's per-field functions
+    
+    Serializing an object calls one function per field, and collections
+    have thousands of objects.  Looking functions up by name (see
+    Module.function) was the largest CPU cost of batch exports, so this
+    class looks them up once per module.  Get instances with codecs().
+    
+    >>> c = codecs(entity_module)
+    >>> c.jsondump['record_created']
+    <function jsondump_record_created at ...>
+    >>> c.function('csvdump', 'title')
+    <function _identity at ...>
+    >>> c.apply('csvdump', 'record_created', datetime.now())
+    '2020-01-01T12:00:00'
+    """
+    module = None
+    jsonload: Dict[str, Callable] = {}
+    jsondump: Dict[str, Callable] = {}
+    csvload: Dict[str, Callable] = {}
+    csvdump: Dict[str, Callable] = {}
+    csvvalidate: Dict[str, Callable] = {}
+    formprep: Dict[str, Callable] = {}
+    formpost: Dict[str, Callable] = {}
+    display: Dict[str, Callable] = {}
+    index: Dict[str, Callable] = {}
+    csv_import_ignored: Set[str] = set()
+    csv_export_ignored: Set[str] = set()
+    
+    def __init__(self, module):
+        """
+        @param module: collection, entity, files model definitions module
+        """
+        self.module = module
+        for prefix in CODEC_PREFIXES:
+            setattr(self, prefix, field_functions(module, prefix))
+        # In repo_models.object.FIELDS, individual fields can be marked
+        # so they are ignored when importing/exporting.
+        self.csv_import_ignored = set()
+        self.csv_export_ignored = set()
+        for f in getattr(module, 'FIELDS', []):
+            csv = f.get('csv', {})
+            if 'ignore' in csv.get('import', []):
+                self.csv_import_ignored.add(f['name'])
+            if 'ignore' in csv.get('export', []):
+                self.csv_export_ignored.add(f['name'])
+    
+    def __repr__(self) -> str:
+        return "<%s.%s %s>" % (
+            self.__module__, self.__class__.__name__,
+            getattr(self.module, '__name__', self.module)
+        )
+    
+    def function(self, prefix: str, fieldname: str) -> Callable:
+        """Returns {prefix}_{fieldname} function or identity function
+        
+        @param prefix: str One of CODEC_PREFIXES
+        @param fieldname: str
+        @returns: function
+        """
+        return getattr(self, prefix).get(fieldname, _identity)
+    
+    def apply(self, prefix: str, fieldname: str, value: Optional[Any]) -> Optional[Any]:
+        """Runs {prefix}_{fieldname} function on value if present
+        
+        @param prefix: str One of CODEC_PREFIXES
+        @param fieldname: str
+        @param value: A single value to be passed to the function, or None.
+        @returns: Whatever the function returns, or value
+        """
+        function = getattr(self, prefix).get(fieldname)
+        if function:
+            return function(value)
+        return value
+
+@lru_cache(maxsize=None)
+def codecs(module) -> FieldCodecs:
+    """Returns the (cached) FieldCodecs for a definitions module
+    
+    @param module: collection, entity, files model definitions module
+    @returns: FieldCodecs
+    """
+    return FieldCodecs(module)
+
+
 class Module(object):
     path = None
 
@@ -108,8 +229,8 @@ class Module(object):
         @param value: A single value to be passed to the function, or None.
         @returns: Whatever the specified function returns.
         """
-        if (function_name in dir(self.module)):
-            function = getattr(self.module, function_name)
+        function = getattr(self.module, function_name, None)
+        if function is not None:
             value = function(value)
         return value
     
@@ -130,9 +251,8 @@ class Module(object):
                 key = f['name']
                 label = f['form']['label']
                 # run display_* functions on field data if present
-                value = self.function(
-                    'display_%s' % key,
-                    getattr(document, f['name'])
+                value = codecs(self.module).apply(
+                    'display', key, getattr(document, f['name'])
                 )
                 lv.append( {'label':label, 'value':value,} )
         return lv
@@ -0,0 +1,186 @@
+"""Opt-in process-wide cache for Identifier.object()
+
+Long import and publish runs instantiate the same parent objects (the
+collection, entities) over and over, re-reading and re-parsing the same
+collection.json and entity.json each time.  When enabled, the cache keeps
+loaded objects keyed on JSON path and object class.  Entries are checked
+against the file's mtime and size on every lookup, evicted LRU-first when
+the cache is over its object-count or memory cap, and dropped explicitly
+when an object's write_json() is called.
+
+Objects are mutable, so callers get a copy of the cached object: a shallow
+copy with fresh copies of list/dict field values.  The Identifier is shared.
+
+The cache is disabled unless enabled in the config file
+([cmdln] object_cache_max_objects) or with enable():
+    
+    >>> from DDR import objectcache
+    >>> objectcache.enable(max_objects=5000, max_mb=128)
+    >>> identifier.Identifier('ddr-test-123', '/var/www/media/ddr').object()
+    <DDR.models.Collection ddr-test-123>
+    >>> objectcache.info()
+    {'objects': 1, 'bytes': 1834, 'hits': 0, 'misses': 1, ...}
+    >>> objectcache.disable()
+"""
+
+from collections import OrderedDict
+from copy import copy, deepcopy
+import logging
+logger = logging.getLogger(__name__)
+import os
+import threading
+from typing import Any, Callable, Dict, List, Match, Optional, Set, Tuple, Union
+
+from DDR import config
+
+# Approximate size of a loaded object relative to its JSON file.
+# Measured with tracemalloc on a typical entity.json (3.4KB, indent=4):
+# json.loads plus setting the fields as attributes takes ~2.1x the file
+# size.  Real objects also hold an Identifier, children lists, etc., so
+# the cache counts 4x.  The memory cap is an estimate, not a hard limit.
+JSON_SIZE_MULTIPLIER = 4
+
+
+class ObjectCache():
+    """LRU cache of loaded objects, validated by file mtime and size
+    """
+    max_objects = 0
+    max_bytes = 0
+    bytes = 0
+    hits = 0
+    misses = 0
+    
+    def __init__(self, max_objects: int, max_mb: int):
+        """
+        @param max_objects: int Maximum number of cached objects
+        @param max_mb: int Approximate maximum memory used, in megabytes
+        """
+        self.max_objects = max_objects
+        self.max_bytes = max_mb * 1024 * 1024
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # (json_path, class) -> (mtime_ns, size, nbytes, object)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __repr__(self):
+        return "<%s.%s %s objects, %s bytes>" % (
+            self.__module__, self.__class__.__name__, len(self._entries), self.bytes
+        )
+    
+    def get(self, json_path: str, object_class: Any, load: Callable) -> Any:
+        """Returns copy of cached object, loading it if absent or stale
+        
+        @param json_path: str Absolute path to object's JSON file
+        @param object_class: class Used as part of the key
+        @param load: function that returns the object
+        @returns: object
+        """
+        key = (json_path, object_class)
+        try:
+            st = os.stat(json_path)
+        except FileNotFoundError:
+            self.invalidate(json_path)
+            return load()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (entry[0] == st.st_mtime_ns) and (entry[1] == st.st_size):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy_object(entry[3])
+            self.misses += 1
+        o = load()
+        nbytes = st.st_size * JSON_SIZE_MULTIPLIER
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self.bytes -= old[2]
+            self._entries[key] = (st.st_mtime_ns, st.st_size, nbytes, o)
+            self.bytes += nbytes
+            self._evict()
+        return _copy_object(o)
+    
+    def _evict(self):
+        while self._entries and (
+            (len(self._entries) > self.max_objects) or (self.bytes > self.max_bytes)
+        ):
+            key,entry = self._entries.popitem(last=False)
+            self.bytes -= entry[2]
+    
+    def invalidate(self, json_path: Optional[str]=None):
+        """Drops cached object(s) for json_path, or everything
+        
+        @param json_path: str Absolute path to object's JSON file, or None
+        """
+        with self._lock:
+            if not json_path:
+                self._entries.clear()
+                self.bytes = 0
+                return
+            for key in [key for key in self._entries.keys() if key[0] == json_path]:
+                self.bytes -= self._entries.pop(key)[2]
+    
+    def info(self) -> Dict[str, int]:
+        return {
+            'objects': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'max_objects': self.max_objects,
+            'max_bytes': self.max_bytes,
+        }
+
+
+def _copy_object(o: Any) -> Any:
+    """Copy of object that can be modified without affecting the original
+    
+    Field values are mostly str/int/datetime; only lists and dicts
+    (e.g. topics, creators, file lists) need to be copied.
+    """
+    c = copy(o)
+    for key,val in vars(o).items():
+        if isinstance(val, (list, dict)):
+            setattr(c, key, deepcopy(val))
+    return c
+
+
+# The process-wide cache; None when disabled
+CACHE: Optional[ObjectCache] = None
+
+def enable(max_objects: int=config.OBJECT_CACHE_MAX_OBJECTS or 10000,
+           max_mb: int=config.OBJECT_CACHE_MAX_MB) -> ObjectCache:
+    """Turns on the process-wide object cache (replacing any existing one)
+    
+    @param max_objects: int Maximum number of cached objects
+    @param max_mb: int Approximate maximum memory used, in megabytes
+    @returns: ObjectCache
+    """
+    global CACHE
+    CACHE = ObjectCache(max_objects, max_mb)
+    return CACHE
+
+def disable():
+    """Turns off and empties the process-wide object cache
+    """
+    global CACHE
+    CACHE = None
+
+def invalidate(json_path: Optional[str]=None):
+    """Drops json_path (or everything) from the process-wide cache, if enabled
+    
+    @param json_path: str Absolute path to object's JSON file, or None
+    """
+    if CACHE:
+        CACHE.invalidate(json_path)
+
+def info() -> Dict[str, int]:
+    """Cache statistics, or {} if disabled
+    """
+    if CACHE:
+        return CACHE.info()
+    return {}
+
+
+if config.OBJECT_CACHE_MAX_OBJECTS:
+    enable()
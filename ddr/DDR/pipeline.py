@@ -0,0 +1,216 @@
+"""Streaming pipelines over collection metadata files
+
+util.find_meta_files returns a complete list of paths, and the usual next
+steps (make Identifiers, filter them, instantiate objects) each build
+another complete list before any real work gets done.  The functions in
+this module are generators that can be chained so that work starts as soon
+as the first metadata file is found and only one item is in flight at
+a time:
+    
+    walk -> identify -> filter_* -> load_parents -> load
+    
+    >>> from DDR import pipeline
+    >>> paths = pipeline.walk('/var/www/media/ddr/ddr-test-123')
+    >>> identifiers = pipeline.identify(paths)
+    >>> identifiers = pipeline.filter_models(identifiers, ['entity', 'segment'])
+    >>> identifiers = pipeline.filter_ids(identifiers, 'ddr-test-123-1*')
+    >>> for o in pipeline.load(identifiers):
+    ...     print(o)
+
+meta_files() assembles the usual walk/identify/filter chain in one call.
+"""
+
+import fnmatch
+import logging
+logger = logging.getLogger(__name__)
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from DDR import identifier
+from DDR import manifest
+from DDR import util
+
+
+def walk(basedir: str,
+         recursive: bool=True,
+         model: Optional[str]=None,
+         force_read: bool=False,
+         workers: int=1) -> Iterator[str]:
+    """Yields absolute paths to .json files in basedir
+    
+    Like util.find_meta_files but paths are yielded as they are found.
+    Answers from the repository manifest if possible (see DDR.manifest),
+    otherwise searches the filesystem with util.scandir_meta_files.
+    Paths are not sorted.
+    
+    @param basedir: str Absolute path
+    @param recursive: bool Whether or not to recurse into subdirectories.
+    @param model: str Restrict to the named model ('collection','entity','file').
+    @param force_read: bool If True, always search the filesystem.
+    @param workers: int Number of threads listing directories (recursive only)
+    @returns: generator of absolute paths
+    """
+    if not force_read:
+        m = manifest.get(basedir)
+        if m:
+            yield from m.paths(basedir, recursive, model)
+            return
+    if recursive:
+        yield from util.scandir_meta_files(basedir, model, workers)
+    else:
+        for path in util._search_directory(basedir, ['.git', '*~']):
+            if util.path_matches_model(path, model or ''):
+                yield path
+
+def files_first(paths: Iterable[str]) -> Iterator[str]:
+    """Yields file paths as they arrive, then entities, then collections
+    
+    Only entity and collection paths, which are much less numerous than
+    files, are held back.  See util.find_meta_files(files_first=True).
+    
+    @param paths: iterable of absolute paths
+    @returns: generator of absolute paths
+    """
+    entities = []
+    collections = []
+    for path in paths:
+        if util.path_matches_model(path, 'file'):
+            yield path
+        elif util.path_matches_model(path, 'entity'):
+            entities.append(path)
+        elif util.path_matches_model(path, 'collection'):
+            collections.append(path)
+    yield from entities
+    yield from collections
+
+def filter_paths(paths: Iterable[str], pattern: str, exclude: bool=False) -> Iterator[str]:
+    """Yields paths that match (or with exclude, don't match) a regex
+    
+    @param paths: iterable of absolute paths
+    @param pattern: str A regular expression
+    @param exclude: bool If True, skip paths matching pattern.
+    @returns: generator of absolute paths
+    """
+    prog = re.compile(pattern)
+    for path in paths:
+        if bool(prog.search(path)) != exclude:
+            yield path
+
+def identify(paths: Iterable[str],
+             base_path: Optional[str]=None) -> Iterator[identifier.Identifier]:
+    """Yields an Identifier for each path
+    
+    @param paths: iterable of absolute paths
+    @param base_path: str Absolute path (optional)
+    @returns: generator of Identifiers
+    """
+    for path in paths:
+        yield identifier.Identifier(path, base_path)
+
+def filter_models(identifiers: Iterable[identifier.Identifier],
+                  models: List[str]) -> Iterator[identifier.Identifier]:
+    """Yields identifiers of the specified models
+    
+    @param identifiers: iterable of Identifiers
+    @param models: list of model names; if empty nothing is filtered
+    @returns: generator of Identifiers
+    """
+    for oi in identifiers:
+        if (not models) or (oi.model in models):
+            yield oi
+
+def filter_roles(identifiers: Iterable[identifier.Identifier],
+                 roles: List[str]) -> Iterator[identifier.Identifier]:
+    """Yields identifiers of files with the specified roles, and non-files
+    
+    @param identifiers: iterable of Identifiers
+    @param roles: list of file roles e.g. ['master','mezzanine']; if empty nothing is filtered
+    @returns: generator of Identifiers
+    """
+    for oi in identifiers:
+        role = oi.idparts.get('role')
+        if (not roles) or (not role) or (role in roles):
+            yield oi
+
+def filter_ids(identifiers: Iterable[identifier.Identifier],
+               pattern: str) -> Iterator[identifier.Identifier]:
+    """Yields identifiers whose ID matches a shell-style wildcard pattern
+    
+    @param identifiers: iterable of Identifiers
+    @param pattern: str e.g. 'ddr-test-123-4*'; if empty nothing is filtered
+    @returns: generator of Identifiers
+    """
+    for oi in identifiers:
+        if (not pattern) or fnmatch.fnmatch(oi.id, pattern):
+            yield oi
+
+def load_parents(identifiers: Iterable[identifier.Identifier],
+                 parents: Dict[str, Any],
+                 excluded_models: List[str]=['file']) -> Iterator[identifier.Identifier]:
+    """Yields identifiers, first loading any of their parents not in parents
+    
+    Builds a dict of parent objects as the identifiers go by, rather than
+    all at once up front.  (docstore.publishable does not need this; it
+    reads only the fields it needs, see docstore.Publishability.)
+    NOTE: parents includes the object itself unless its model is excluded.
+    
+    @param identifiers: iterable of Identifiers
+    @param parents: dict Parent objects by object ID (modified in place)
+    @param excluded_models: list of model names
+    @returns: generator of Identifiers
+    """
+    for oi in identifiers:
+        for pi in oi.lineage():
+            if (pi.model not in excluded_models) and (pi.id not in parents):
+                parents[pi.id] = pi.object()
+        yield oi
+
+def load(identifiers: Iterable[identifier.Identifier],
+         errors: Optional[List[Tuple[identifier.Identifier, Exception]]]=None) -> Iterator[Any]:
+    """Yields the object for each identifier
+    
+    If errors is a list, objects that cannot be instantiated are skipped
+    and (identifier, exception) is appended to errors.  Otherwise the
+    exception is raised.
+    
+    @param identifiers: iterable of Identifiers
+    @param errors: list (optional)
+    @returns: generator of Collection/Entity/File objects
+    """
+    for oi in identifiers:
+        try:
+            o = oi.object()
+        except Exception as err:
+            if errors is None:
+                raise
+            logger.error('Could not instantiate %s: %s' % (oi.id, err))
+            errors.append((oi, err))
+            continue
+        yield o
+
+def meta_files(basedir: str,
+               models: List[str]=[],
+               roles: List[str]=[],
+               pattern: str='',
+               force_read: bool=False,
+               workers: int=1) -> Iterator[identifier.Identifier]:
+    """Yields Identifiers for metadata files in basedir, with filters
+    
+    Equivalent to walk -> identify -> filter_models -> filter_roles -> filter_ids.
+    Pass the result to load() to get objects.
+    
+    @param basedir: str Absolute path
+    @param models: list of model names
+    @param roles: list of file roles
+    @param pattern: str ID wildcard pattern
+    @param force_read: bool If True, always search the filesystem.
+    @param workers: int Number of threads listing directories
+    @returns: generator of Identifiers
+    """
+    model = None
+    if len(models) == 1:
+        model = models[0]
+    identifiers = identify(walk(basedir, True, model, force_read, workers))
+    identifiers = filter_models(identifiers, models)
+    identifiers = filter_roles(identifiers, roles)
+    return filter_ids(identifiers, pattern)
@@ -14,6 +14,7 @@ from elasticsearch_dsl.connections import connections
 from DDR import config
 from DDR import docstore
 from DDR import identifier
+from DDR import searchcache
 from DDR import vocab
 
 #SEARCH_LIST_FIELDS = models.all_list_fields()
@@ -660,6 +661,8 @@ class Searcher(object):
     def execute(self, limit, offset):
         """Execute a query and return SearchResults
         
+        Results are cached if DDR.searchcache is enabled.
+        
         @param limit: int
         @param offset: int
         @returns: SearchResults
@@ -667,16 +670,68 @@ class Searcher(object):
         if not self.s:
             raise Exception('Searcher has no ES Search object.')
         start,stop = start_stop(limit, offset)
-        response = self.s[start:stop].execute()
+        query = self.s.to_dict()
+        if not searchcache.CACHE:
+            return self._results(self.s, query, start, stop, limit, offset)
+        
+        # Pages are cached by query and slice.  Aggregations are the same
+        # for every page of a query so they are cached separately and later
+        # pages are requested without them.
+        indices = [
+            name
+            for index in (self.s._index or [])
+            for name in index.split(',')
+        ]
+        body = {key: val for key,val in query.items() if key != 'aggs'}
+        # body has no aggs but results depend on them
+        aggs = json.dumps(query.get('aggs'), sort_keys=True, default=str)
+        key = searchcache.query_key(indices, body)
+        page_key = ('page', start, stop, aggs) + key
+        aggs_key = ('aggs', aggs) + key
+        results = searchcache.CACHE.get(page_key)
+        if results:
+            return results
+        aggregations = None
+        s = self.s
+        if 'aggs' in query:
+            aggregations = searchcache.CACHE.get(aggs_key)
+            if aggregations is not None:
+                s = Search(using=self.conn, index=indices).update_from_dict(body)
+        results = self._results(s, query, start, stop, limit, offset)
+        if aggregations is not None:
+            results.aggregations = aggregations
+        elif 'aggs' in query:
+            searchcache.CACHE.set(aggs_key, indices, results.aggregations)
+        searchcache.CACHE.set(page_key, indices, results)
+        return results
+    
+    def _results(self, s, query, start, stop, limit, offset):
+        response = s[start:stop].execute()
         for n,hit in enumerate(response.hits):
             hit.index = '%s %s/%s' % (n, int(offset)+n, response.hits.total)
         return SearchResults(
             params=self.params,
-            query=self.s.to_dict(),
+            query=query,
             results=response,
             limit=limit,
             offset=offset,
         )
+    
+    def scan(self, size=config.DOCSTORE_SCAN_SIZE):
+        """Yields every hit for the prepared query, a batch at a time
+        
+        Unlike execute(), not limited to ELASTICSEARCH_MAX_SIZE results and
+        memory use does not grow with the number of results.
+        Aggregations are not computed.  See docstore.scan_hits.
+        
+        @param size: int Number of hits per request
+        @returns: generator of elasticsearch_dsl Hit/Document objects
+        """
+        if not self.s:
+            raise Exception('Searcher has no ES Search object.')
+        index = ','.join(self.s._index or [])
+        for hit in docstore.scan_hits(self.conn, index, self.s.to_dict(), size):
+            yield self.s._get_result(hit)
 
 
 def search(hosts, models=[], parent=None, filters=[], fulltext='', limit=10000, offset=0, page=None, aggregations=False):
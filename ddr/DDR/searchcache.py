@@ -0,0 +1,172 @@
+"""Opt-in process-wide cache for search.Searcher results
+
+Browsing the same faceted listings over and over sends the same queries
+(with the same large topics/facility aggregations) to Elasticsearch each
+time.  When enabled, the cache keeps result pages keyed on the indices,
+the normalized query dict, and the slice (limit/offset), and keeps each
+query's aggregations separately so that later pages of the same query
+are requested without aggregations.  Entries expire after a TTL, are
+evicted LRU-first when the cache is full, and are dropped when
+DDR.docstore posts to or deletes from one of their indices.
+
+Cached results are shared, so callers must not modify them.
+
+The cache is disabled unless enabled in the config file
+([cmdln] search_cache_max_entries) or with enable():
+    
+    >>> from DDR import searchcache
+    >>> searchcache.enable(max_entries=1000, ttl=300)
+    >>> searcher.execute(limit=25, offset=0)
+    >>> searchcache.info()
+    {'entries': 2, 'hits': 0, 'misses': 2, ...}
+    >>> searchcache.disable()
+"""
+
+from collections import OrderedDict
+import json
+import logging
+logger = logging.getLogger(__name__)
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from DDR import config
+
+
+class SearchCache():
+    """LRU cache of search results with expiration, invalidated by index
+    """
+    max_entries = 0
+    ttl = 0
+    hits = 0
+    misses = 0
+    
+    def __init__(self, max_entries: int, ttl: int):
+        """
+        @param max_entries: int Maximum number of cached results
+        @param ttl: int Seconds before an entry expires
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (expires, indices, value)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __repr__(self):
+        return "<%s.%s %s entries>" % (
+            self.__module__, self.__class__.__name__, len(self._entries)
+        )
+    
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Returns cached value or None if absent or expired
+        
+        @param key: tuple (see query_key)
+        @returns: value or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (entry[0] > time.time()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry:
+                self._entries.pop(key)
+            self.misses += 1
+            return None
+    
+    def set(self, key: Tuple, indices: Iterable[str], value: Any):
+        """Caches value
+        
+        @param key: tuple (see query_key)
+        @param indices: list Names of indices the value came from; empty means all
+        @param value: Any
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.ttl, frozenset(indices), value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, indices: Optional[Iterable[str]]=None):
+        """Drops entries from the specified indices, or everything
+        
+        Entries that were searched across all indices are always dropped.
+        
+        @param indices: list Names of indices, or None
+        """
+        with self._lock:
+            if indices is None:
+                self._entries.clear()
+                return
+            indices = set(indices)
+            if not indices:
+                return
+            for key in [
+                    key for key,entry in self._entries.items()
+                    if (not entry[1]) or (entry[1] & indices)]:
+                self._entries.pop(key)
+    
+    def info(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+        }
+
+
+def query_key(indices: Iterable[str], query: Dict[str, Any]) -> Tuple[Tuple[str, ...], str]:
+    """Cache key for a query that doesn't depend on dict order
+    
+    @param indices: list of index names
+    @param query: dict Elasticsearch query DSL
+    @returns: tuple
+    """
+    return (
+        tuple(sorted(indices)),
+        json.dumps(query, sort_keys=True, default=str),
+    )
+
+
+# The process-wide cache; None when disabled
+CACHE: Optional[SearchCache] = None
+
+def enable(max_entries: int=config.SEARCH_CACHE_MAX_ENTRIES or 1000,
+           ttl: int=config.SEARCH_CACHE_TTL) -> SearchCache:
+    """Turns on the process-wide search cache (replacing any existing one)
+    
+    @param max_entries: int Maximum number of cached results
+    @param ttl: int Seconds before an entry expires
+    @returns: SearchCache
+    """
+    global CACHE
+    CACHE = SearchCache(max_entries, ttl)
+    return CACHE
+
+def disable():
+    """Turns off and empties the process-wide search cache
+    """
+    global CACHE
+    CACHE = None
+
+def invalidate(indices: Optional[Iterable[str]]=None):
+    """Drops entries for indices (or everything) from the cache, if enabled
+    
+    @param indices: list Names of indices, or None
+    """
+    if CACHE:
+        CACHE.invalidate(indices)
+
+def info() -> Dict[str, int]:
+    """Cache statistics, or {} if disabled
+    """
+    if CACHE:
+        return CACHE.info()
+    return {}
+
+
+if config.SEARCH_CACHE_MAX_ENTRIES:
+    enable()
@@ -35,13 +35,6 @@ JSON_FIELDS = {
     'sort': 1,
 }
 
-# Valid component values from ddr-defs/repo_models/identifier.py
-# file-role['component']['valid']
-ROLE_NUMBERS = {
-    role: n
-    for n,role in enumerate(identifier.VALID_COMPONENTS['role'])
-}
-
 class SigIdentifier(identifier.Identifier):
     """Subclass of Identifier used for finding/assigning object signature files
     
@@ -53,7 +46,6 @@ class SigIdentifier(identifier.Identifier):
     sort = 999999
     signature = None    # immediate signature, next in chain
     signature_id = None # ID of ultimate signature (should be a file)
-    sort_key = None
     
     def __repr__(self):
         return '<%s.%s %s:%s sort=%s,sid=%s>' % (
@@ -62,10 +54,6 @@ class SigIdentifier(identifier.Identifier):
             self.sort, self.signature_id
         )
     
-    def __lt__(self, other):
-        """Enables Pythonic sorting"""
-        return self.sort_key < other.sort_key
-    
     def __init__(self, *args, **kwargs):
         """Load Identifier, read .json and add extra fields
         
@@ -80,34 +68,22 @@ class SigIdentifier(identifier.Identifier):
                 setattr(self, key, val)
         
         # prep sorting key
-        # TODO refactor - knows too much about model definitions!
-        sort_key = self.parts
-        if self.model == 'file':
-            # insert file sort before sha1
-            sort_key['role'] = ROLE_NUMBERS[self.parts['role']]
-            sha1 = sort_key.pop('sha1')
-            sort_key['sort'] = self.sort
-            sort_key['sha1'] = sha1
-        elif self.model == 'entity':
-            # insert entity sort before eid
-            eid = sort_key.pop('eid')
-            sort_key['sort'] = self.sort
-            sort_key['eid'] = eid
-            
-        self.sort_key = list(sort_key.values())
+        # Insert object's sort field before the last ID component
+        # (file: before sha1, entity: before eid) of the canonical key.
+        # Pairs are (component position, value) so give it the same position.
+        if self.model in ['file', 'entity']:
+            self.sort_key = self.sort_key[:-2] \
+                + (self.sort_key[-2], self.sort) \
+                + self.sort_key[-2:]
     
     def _read_fields(self, path):
         """Extracts specified fields from JSON
         """
-        data = {}
-        for d in json.loads(fileio.read_text(path)):
-            key = list(d.keys())[0]
-            if key in list(JSON_FIELDS.keys()):
-                # coerces to int
-                if d.get(key) and isinstance(JSON_FIELDS[key], int):
-                    data[key] = int(d[key])
-                else:
-                    data[key] = d[key]
+        data = fileio.read_fields(path, list(JSON_FIELDS.keys()))
+        for key,val in data.items():
+            # coerces to int
+            if val and isinstance(JSON_FIELDS[key], int):
+                data[key] = int(val)
         return data
 
     def publishable(self):
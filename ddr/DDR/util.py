@@ -1,19 +1,41 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
 import hashlib
+import logging
+logger = logging.getLogger(__name__)
 import os
 import re
-from typing import Any, Dict, List, Match, Optional, Set, Tuple, Union
+import time
+from typing import Any, Dict, Iterator, List, Match, Optional, Set, Tuple, Union
 
 from DDR import config
 from DDR import identifier
+from DDR import manifest
 
 
+# Default number of threads for scandir_meta_files
+SCANDIR_WORKERS = 8
+# Max directories listed per scandir_meta_files thread task
+SCANDIR_BATCH = 64
+# Digests recorded for each binary file
+HASH_ALGORITHMS = ['md5', 'sha1', 'sha256']
+# Bytes read per pass in file_digests; hashlib releases the GIL while
+# hashing blocks this big so threads can hash several files at once.
+HASH_BLOCK_SIZE = 1024 * 1024
+# Default number of threads for hash_files
+HASH_WORKERS = 4
+
 # TODO type hints
-def find_meta_files(basedir, recursive=False, model=None, files_first=False, force_read=False):
-    """Lists absolute paths to .json files in basedir; saves copy if requested.
+def find_meta_files(basedir, recursive=False, model=None, files_first=False, force_read=False, workers=0):
+    """Lists absolute paths to .json files in basedir
     
     Skips/excludes .git directories.
     TODO depth (go down N levels from basedir)
     
+    If basedir is in a git repository, answers from the repository's
+    metadata manifest (see DDR.manifest) instead of searching the
+    filesystem.  Use force_read to always search the filesystem.
+    
     NOTE: Looked at replacing this with pathlib rglob[1] but this
     function is consistently faster.
     [1] list(pathlib.Path(path).rglob('*.json'))
@@ -22,21 +44,21 @@ def find_meta_files(basedir, recursive=False, model=None, files_first=False, for
     @param recursive: Whether or not to recurse into subdirectories.
     @param model: list Restrict to the named model ('collection','entity','file').
     @param files_first: If True, list files,entities,collections; otherwise sort.
-    @param force_read: If True, always searches for files instead of using cache.
+    @param force_read: If True, always searches for files instead of using manifest.
+    @param workers: int If >0 search with scandir_meta_files using this many threads.
     @returns: list of paths
     """
-    CACHE_FILENAME = '.metadata_files'
-    CACHE_PATH = os.path.join(basedir, CACHE_FILENAME)
     EXCLUDES = ['.git', '*~']
-    paths = []
-    if os.path.exists(CACHE_PATH) and not force_read:
-        paths = [
-            line.strip()
-            for line in fileio.read_text(CACHE_PATH).splitlines()
-            if '#' not in line
-        ]
-    else:
-        if recursive:
+    paths = None
+    if not force_read:
+        m = manifest.get(basedir)
+        if m:
+            # _search_directory does not filter by model
+            paths = m.paths(basedir, recursive, model if recursive else None)
+    if paths is None:
+        if recursive and workers:
+            paths = list(scandir_meta_files(basedir, model, workers))
+        elif recursive:
             paths = _search_recursive(basedir, model, EXCLUDES)
         else:
             paths = _search_directory(basedir, EXCLUDES)
@@ -62,6 +84,102 @@ def _search_recursive(basedir: str, model: str, excludes: List[str]) -> List[str
                     paths.append(path)
     return paths
 
+def scandir_meta_files(basedir: str,
+                       model: Optional[str]=None,
+                       workers: int=SCANDIR_WORKERS) -> Iterator[str]:
+    """Recursively search directory, listing subdirectories in parallel
+    
+    Faster than _search_recursive on network filesystems, where listing
+    directories is mostly waiting on the server.  Uses os.scandir, which
+    gets file/directory type from the directory listing without a stat(),
+    and hands each subdirectory to a pool of threads.  Paths are yielded
+    as directories are listed, in no particular order.
+    
+    Skips .git directories and files ending in '~'.
+    
+    @param basedir: Absolute path
+    @param model: str Restrict to the named model ('collection','entity','file').
+    @param workers: int Number of threads (1 lists directories serially)
+    @returns: generator of absolute paths
+    """
+    matches = _filename_matcher(model)
+    if workers < 2:
+        dirs = [basedir]
+        while dirs:
+            files,subdirs = _scan_directory(dirs.pop())
+            dirs.extend(subdirs)
+            for name,path in files:
+                if matches(name):
+                    yield path
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        dirs = [basedir]
+        pending: Set[Any] = set()
+        while dirs or pending:
+            # Keep all threads busy, but hand out directories in batches
+            # so that thread handoff doesn't cost more than the listing.
+            while dirs and (len(pending) < workers * 2):
+                n = max(1, min(SCANDIR_BATCH, len(dirs) // workers))
+                batch = dirs[-n:]
+                del dirs[-n:]
+                pending.add(pool.submit(_scan_directories, batch))
+            done,pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files,subdirs = future.result()
+                dirs.extend(subdirs)
+                for name,path in files:
+                    if matches(name):
+                        yield path
+
+def _scan_directories(paths: List[str]) -> Tuple[List[Tuple[str,str]], List[str]]:
+    """Runs _scan_directory on each path and combines the results
+    """
+    files = []
+    dirs = []
+    for path in paths:
+        f,d = _scan_directory(path)
+        files.extend(f)
+        dirs.extend(d)
+    return files,dirs
+
+def _scan_directory(path: str) -> Tuple[List[Tuple[str,str]], List[str]]:
+    """Lists .json files and subdirectories (except .git) of one directory
+    
+    Unreadable directories are skipped, like os.walk.
+    
+    @param path: str Absolute path
+    @returns: ([(filename, path), ...], [subdir path, ...])
+    """
+    files = []
+    dirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != '.git':
+                        dirs.append(entry.path)
+                elif entry.name.endswith('.json'):
+                    files.append((entry.name, entry.path))
+    except OSError:
+        pass
+    return files,dirs
+
+def _filename_matcher(model: Optional[str]):
+    """Returns function that tests whether a filename belongs to model
+    
+    Models whose filename_regex is a plain filename (e.g. 'entity.json')
+    are matched by string comparison; others by regex on the filename.
+    
+    @param model: str or None (match any .json)
+    @returns: function(filename) -> bool
+    """
+    if not model:
+        return lambda name: True
+    regex = identifier.META_FILENAME_REGEX[model]
+    if not set(regex.pattern) & set('\\[](){}*+?|^$'):
+        return lambda name: name.endswith(regex.pattern)
+    return lambda name: bool(regex.search(name))
+
 def _search_directory(basedir: str, excludes: List[str]) -> List[str]:
     """Search only the specified directory.
     """
@@ -94,12 +212,23 @@ def path_matches_model(path: str, model: str) -> bool:
 def natural_sort(l: List[str]) -> List[str]:
     """Sort the given list in the way that humans expect.
     src: http://www.codinghorror.com/blog/2007/12/sorting-for-humans-natural-sort-order.html
+    
+    For lists of DDR object paths use identifier.path_sort_key instead.
     """
-    convert = lambda text: int(text) if text.isdigit() else text
-    alphanum_key = lambda key: [ convert(c) for c in re.split('([0-9]+)', key) ]
-    l.sort( key=alphanum_key )
+    l.sort(key=natural_sort_key)
     return l
 
+NATURAL_SORT_SPLIT = re.compile('([0-9]+)').split
+
+@lru_cache(maxsize=10000)
+def natural_sort_key(text: str) -> tuple:
+    """Sort key that puts numbers embedded in text in numeric order
+    """
+    return tuple(
+        int(c) if c.isdigit() else c
+        for c in NATURAL_SORT_SPLIT(text)
+    )
+
 def natural_order_string(id: str) -> str:
     """Convert a collection/entity ID into form that can be sorted naturally.
     
@@ -111,21 +240,87 @@ def natural_order_string(id: str) -> str:
     return alnum.pop()
 
 def file_hash(path, algo='sha1'):
-    if algo == 'sha256':
-        h = hashlib.sha256()
-    elif algo == 'md5':
-        h = hashlib.md5()
-    else:
-        h = hashlib.sha1()
-    block_size=1024
-    f = open(path, 'rb')
-    while True:
-        data = f.read(block_size)
-        if not data:
-            break
-        h.update(data)
-    f.close()
-    return h.hexdigest()
+    if algo not in HASH_ALGORITHMS:
+        algo = 'sha1'
+    return file_hashes(path, [algo])[algo]
+
+def file_hashes(path: str,
+                algos: List[str]=HASH_ALGORITHMS,
+                block_size: int=HASH_BLOCK_SIZE) -> Dict[str, str]:
+    """Calculates several digests of a file, reading it only once
+    
+    @param path: str Absolute path to file
+    @param algos: list of hashlib algorithm names
+    @param block_size: int Bytes read per pass
+    @returns: dict of hex digests by algorithm
+    """
+    return file_digests(path, algos, block_size)[0]
+
+def file_digests(path: str,
+                 algos: List[str]=HASH_ALGORITHMS,
+                 block_size: int=HASH_BLOCK_SIZE) -> Tuple[Dict[str, str], int, float]:
+    """Calculates several digests of a file in one pass, with timing
+    
+    Each block is read into the same buffer and passed to every hash
+    object through a memoryview, so nothing is copied.
+    
+    @param path: str Absolute path to file
+    @param algos: list of hashlib algorithm names
+    @param block_size: int Bytes read per pass
+    @returns: (dict of hex digests by algorithm, bytes read, seconds)
+    """
+    hashes = [(algo, hashlib.new(algo)) for algo in algos]
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    size = 0
+    start = time.perf_counter()
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            block = view[:n]
+            for algo,h in hashes:
+                h.update(block)
+            size += n
+    elapsed = time.perf_counter() - start
+    logger.debug('hashed %s (%s)' % (path, throughput(size, elapsed)))
+    return {algo: h.hexdigest() for algo,h in hashes}, size, elapsed
+
+def hash_files(paths: List[str],
+               algos: List[str]=HASH_ALGORITHMS,
+               workers: int=HASH_WORKERS) -> Iterator[Tuple[str, Dict[str, str], int, float]]:
+    """Calculates digests of several files in parallel threads
+    
+    Results are yielded in the order of paths.
+    
+    @param paths: list of absolute paths
+    @param algos: list of hashlib algorithm names
+    @param workers: int Number of threads (1 hashes files serially)
+    @returns: generator of (path, digests, bytes read, seconds)
+    """
+    if workers < 2:
+        for path in paths:
+            yield (path,) + file_digests(path, algos)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(path, pool.submit(file_digests, path, algos)) for path in paths]
+        for path,future in futures:
+            yield (path,) + future.result()
+
+def throughput(size: int, seconds: float) -> str:
+    """Formats bytes read and elapsed time as a rate
+    
+    >>> throughput(1024 * 1024 * 300, 2.0)
+    '300.0 MB in 2.00s (150.0 MB/s)'
+    
+    @param size: int Bytes
+    @param seconds: float
+    @returns: str
+    """
+    mb = size / (1024 * 1024)
+    rate = mb / seconds if seconds else 0.0
+    return '%.1f MB in %.2fs (%.1f MB/s)' % (mb, seconds, rate)
 
 def normalize_text(text: str) -> str:
     """Strip text, convert line endings, etc.
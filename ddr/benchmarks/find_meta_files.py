@@ -0,0 +1,105 @@
+"""Benchmarks for the ways util.find_meta_files can search a collection
+
+Compares os.walk (util._search_recursive), pathlib rglob, and
+util.scandir_meta_files with one or more threads.
+
+\b
+Example:
+    python ddr/benchmarks/find_meta_files.py /var/www/media/ddr/ddr-densho-10
+    python ddr/benchmarks/find_meta_files.py --entities 2000 --files 5
+
+If no path is given a synthetic collection is generated in a temp dir.
+Run against a real collection on the target (e.g. NFS) filesystem for
+meaningful numbers; local disk with a warm page cache hides most of the
+latency that the threaded scanner is meant to overlap.
+"""
+
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+
+import click
+
+from DDR import util
+
+
+def make_collection(basedir, entities, files):
+    """Writes a fake collection with a binary next to each file .json
+    """
+    cid = 'ddr-test-123'
+    path = os.path.join(basedir, cid)
+    os.makedirs(os.path.join(path, '.git'))
+    open(os.path.join(path, 'collection.json'), 'w').close()
+    for e in range(1, entities + 1):
+        eid = '%s-%s' % (cid, e)
+        epath = os.path.join(path, 'files', eid)
+        os.makedirs(os.path.join(epath, 'files'))
+        for fn in ['entity.json', 'changelog', 'control']:
+            open(os.path.join(epath, fn), 'w').close()
+        for f in range(files):
+            fid = '%s-master-%010x' % (eid, f)
+            for ext in ['.json', '.jpg', '-a.jpg']:
+                open(os.path.join(epath, 'files', fid + ext), 'w').close()
+    return path
+
+def search_walk(path, model):
+    return util._search_recursive(path, model, ['.git', '*~'])
+
+def search_pathlib(path, model):
+    return [
+        str(p) for p in pathlib.Path(path).rglob('*.json')
+        if ('.git' not in p.parts) and util.path_matches_model(str(p), model)
+    ]
+
+def search_scandir(workers):
+    def search(path, model):
+        return list(util.scandir_meta_files(path, model, workers))
+    return search
+
+def timeit(fn, path, model, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        paths = fn(path, model)
+        times.append(time.perf_counter() - start)
+    return min(times), len(paths)
+
+
+@click.command()
+@click.argument('path', required=False)
+@click.option('--model', '-m', default=None, help='Restrict to model.')
+@click.option('--repeat', '-r', default=5, help='Runs per method (best is reported).')
+@click.option('--workers', '-w', default='2,4,8,16', help='Thread counts for scandir.')
+@click.option('--entities', default=1000, help='Synthetic collection: entities.')
+@click.option('--files', default=4, help='Synthetic collection: files per entity.')
+def main(path, model, repeat, workers, entities, files):
+    tmpdir = None
+    if not path:
+        tmpdir = tempfile.mkdtemp(prefix='ddr-bench-')
+        path = make_collection(tmpdir, entities, files)
+    methods = [
+        ('os.walk', search_walk),
+        ('pathlib.rglob', search_pathlib),
+        ('scandir x1', search_scandir(1)),
+    ] + [
+        ('scandir x%s' % n, search_scandir(int(n)))
+        for n in workers.split(',')
+    ]
+    try:
+        baseline = None
+        for name,fn in methods:
+            seconds,num = timeit(fn, path, model, repeat)
+            if baseline is None:
+                baseline = seconds
+            click.echo('%-15s %8.4fs %7d paths %6.2fx' % (
+                name, seconds, num, baseline / seconds
+            ))
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
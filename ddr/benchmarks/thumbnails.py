@@ -0,0 +1,128 @@
+"""Benchmarks for the ways imaging.thumbnail can make access files
+
+Compares the ImageMagick path (identify + convert through envoy) with the
+in-process pyvips/Pillow fast path, and imaging.thumbnails with one or
+more threads.
+
+\b
+Example:
+    python ddr/benchmarks/thumbnails.py /var/www/media/ddr/ddr-densho-10/files/*/files/*.tif
+    python ddr/benchmarks/thumbnails.py --images 20 --size 6000x4000
+
+If no paths are given synthetic JPEG, TIFF, and PNG images are generated
+in a temp dir (requires Pillow).  Run against real masters for meaningful
+numbers; the fast path gains most on large JPEGs (decoded at reduced
+size) and loses its advantage on formats it hands back to ImageMagick.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+import click
+
+from DDR import config
+from DDR import imaging
+
+
+def make_images(basedir, images, size):
+    """Writes noisy test images so compression does not flatter anyone
+    """
+    from PIL import Image
+    width,height = [int(n) for n in size.split('x')]
+    paths = []
+    for n in range(images):
+        ext = ['.jpg', '.tif', '.png'][n % 3]
+        path = os.path.join(basedir, 'image-%03d%s' % (n, ext))
+        img = Image.effect_noise((width, height), 64).convert('RGB')
+        img.save(path)
+        paths.append(path)
+    return paths
+
+def make_jobs(paths, destdir, geometry):
+    return [
+        (
+            path,
+            os.path.join(destdir, '%s-a.jpg' % os.path.splitext(os.path.basename(path))[0]),
+            geometry,
+            '',
+        )
+        for path in paths
+    ]
+
+def run_serial(fast):
+    def run(jobs):
+        for src,dest,geometry,options in jobs:
+            imaging.thumbnail(src, dest, geometry, options, fast=fast)
+    return run
+
+def run_pool(workers, fast):
+    def run(jobs):
+        for src,dest,data in imaging.thumbnails(jobs, workers, fast):
+            if isinstance(data, Exception):
+                raise data
+    return run
+
+def timeit(fn, jobs, repeat):
+    times = []
+    for _ in range(repeat):
+        for job in jobs:
+            if os.path.exists(job[1]):
+                os.remove(job[1])
+        start = time.perf_counter()
+        fn(jobs)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@click.command()
+@click.argument('paths', nargs=-1)
+@click.option('--geometry', '-g', default=config.ACCESS_FILE_GEOMETRY, help='Access file geometry.')
+@click.option('--repeat', '-r', default=3, help='Runs per method (best is reported).')
+@click.option('--workers', '-w', default='2,4,8', help='Thread counts for imaging.thumbnails.')
+@click.option('--images', default=12, help='Synthetic images: number.')
+@click.option('--size', default='4000x3000', help='Synthetic images: WIDTHxHEIGHT.')
+def main(paths, geometry, repeat, workers, images, size):
+    tmpdir = tempfile.mkdtemp(prefix='ddr-bench-')
+    try:
+        if not paths:
+            paths = make_images(tmpdir, images, size)
+        destdir = os.path.join(tmpdir, 'access')
+        os.makedirs(destdir)
+        jobs = make_jobs(paths, destdir, geometry)
+        fast = ''
+        if imaging.pyvips:
+            fast = ' (pyvips)'
+        elif imaging.Image:
+            fast = ' (Pillow)'
+        methods = [
+            ('imagemagick', run_serial(False)),
+        ]
+        if fast:
+            methods.append(('fast' + fast, run_serial(True)))
+        methods += [
+            ('imagemagick x%s' % n, run_pool(int(n), False))
+            for n in workers.split(',')
+        ]
+        if fast:
+            methods += [
+                ('fast x%s' % n, run_pool(int(n), True))
+                for n in workers.split(',')
+            ]
+        else:
+            click.echo('pyvips and Pillow not installed; fast path skipped')
+        baseline = None
+        for name,fn in methods:
+            seconds = timeit(fn, jobs, repeat)
+            if baseline is None:
+                baseline = seconds
+            click.echo('%-22s %8.3fs %5d images %6.2fx' % (
+                name, seconds, len(jobs), baseline / seconds
+            ))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,7 +21,7 @@ def no_iarchive():
         print(r.status_code)
         if r.status_code == 200:
             return False
-    except ConnectionError:
+    except requests.exceptions.ConnectionError:
         print('ConnectionError')
         return True
     return True
@@ -100,6 +100,112 @@ def test_iaobject_dict():
     expected = SEGMENT_DATA
     assert out == expected
     
+class FakeIA():
+    """Stands in for Internet Archive; counts requests"""
+    def __init__(self, found={}):
+        self.found = found
+        self.requests = []
+    
+    def __call__(self, oid):
+        self.requests.append(oid)
+        if oid in self.found:
+            return 200,self.found[oid]
+        return 404,''
+
+class IAThing():
+    def __init__(self, oid, format_):
+        self.identifier = identifier.Identifier(oid)
+        self.format = format_
+
+def test_iametacache(tmpdir):
+    dummy = archivedotorg.DUMMY_OBJECTS['vh']
+    fake = FakeIA({
+        'ddr-densho-1000-1': SEGMENT_XML,
+        dummy: SEGMENT_XML,
+    })
+    cache = archivedotorg.IAMetaCache(str(tmpdir), fetch=fake)
+    # found
+    out0 = cache.meta(IAThing('ddr-densho-1000-1', 'vh'))
+    assert out0['id'] == 'ddr-densho-1000-1'
+    assert out0['original'] == SEGMENT_DATA['original']
+    assert cache.meta(IAThing('ddr-densho-1000-1', 'vh')) == out0
+    assert fake.requests == ['ddr-densho-1000-1']
+    # not found: dummy is used and only requested once
+    assert cache.meta(IAThing('ddr-densho-1000-2', 'vh'))['id'] == dummy
+    assert cache.meta(IAThing('ddr-densho-1000-3', 'vh'))['id'] == dummy
+    assert fake.requests.count(dummy) == 1
+    # not an IA object
+    assert cache.meta(IAThing('ddr-densho-1000-4', 'img')) == {}
+    assert 'ddr-densho-1000-4' not in fake.requests
+    # records persist between caches
+    fake.requests = []
+    cache2 = archivedotorg.IAMetaCache(str(tmpdir), fetch=fake)
+    assert cache2.meta(IAThing('ddr-densho-1000-1', 'vh')) == out0
+    assert cache2.get('ddr-densho-1000-2')['http_status'] == 404
+    assert fake.requests == []
+    # expired negative records are fetched again
+    cache3 = archivedotorg.IAMetaCache(str(tmpdir), negative_ttl=-1, fetch=fake)
+    assert cache3.get('ddr-densho-1000-1')['http_status'] == 200
+    assert cache3.get('ddr-densho-1000-2')['http_status'] == 404
+    assert fake.requests == ['ddr-densho-1000-2']
+    # expired records in memory are fetched again
+    cache3.negative_ttl = 86400
+    assert cache3.get('ddr-densho-1000-2')['http_status'] == 404
+    cache3.negative_ttl = -1
+    assert cache3.get('ddr-densho-1000-2')['http_status'] == 404
+    assert fake.requests == ['ddr-densho-1000-2', 'ddr-densho-1000-2']
+
+def test_iametacache_max_records():
+    fake = FakeIA({})
+    cache = archivedotorg.IAMetaCache('', fetch=fake, max_records=2)
+    for oid in ['ddr-densho-1000-1', 'ddr-densho-1000-2', 'ddr-densho-1000-1',
+                'ddr-densho-1000-3']:
+        cache.get(oid)
+    # least recently used record is dropped
+    assert list(cache._records.keys()) == ['ddr-densho-1000-1', 'ddr-densho-1000-3']
+    assert fake.requests == [
+        'ddr-densho-1000-1', 'ddr-densho-1000-2', 'ddr-densho-1000-3'
+    ]
+
+def test_iametacache_prefetch():
+    fake = FakeIA({'ddr-densho-1000-1': SEGMENT_XML})
+    cache = archivedotorg.IAMetaCache('', fetch=fake)
+    oids = ['ddr-densho-1000-%s' % n for n in range(1,11)]
+    cache.prefetch(oids, workers=4)
+    assert sorted(fake.requests) == sorted(
+        oids + list(archivedotorg.DUMMY_OBJECTS.values())
+    )
+    cache.meta(IAThing('ddr-densho-1000-5', 'av'))
+    assert len(fake.requests) == len(oids) + len(archivedotorg.DUMMY_OBJECTS)
+
+def test_fetch_xml():
+    """fetch_xml against a local HTTP stand-in for archive.org"""
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    import threading
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/ddr-densho-1000-1-1/ddr-densho-1000-1-1_files.xml':
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(SEGMENT_XML.encode('utf-8'))
+            else:
+                self.send_response(404)
+                self.end_headers()
+        def log_message(self, *args):
+            pass
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        base = 'http://127.0.0.1:%s' % server.server_port
+        status,xml = archivedotorg.fetch_xml('ddr-densho-1000-1-1', base=base)
+        assert status == 200
+        assert xml == SEGMENT_XML
+        assert archivedotorg.fetch_xml('ddr-densho-1000-1-2', base=base) == (404, '')
+    finally:
+        server.shutdown()
+        server.server_close()
+
 #def test_iafile_dict():
     
 #def test_file_meta():
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import os
+import time
+
 import envoy
 import git
 from nose.tools import assert_raises
@@ -223,9 +226,71 @@ class TestImporter():
     # TODO def test_import_files(self):
     # TODO def test_update_existing_files(self):
     # TODO def test_add_new_files(self):
+    
+    def test_prepare_new_files(self, monkeypatch):
+        def prepare(rowd, parent, log_path):
+            # later rows finish first
+            time.sleep(0.01 * (5 - rowd['n']))
+            rowd.pop('basename_orig')
+            return 'log', 'file-%s' % rowd['n'], [], 0
+        monkeypatch.setattr(batch.Importer, '_prepare_new_file', prepare)
+        for workers in [1, 3]:
+            todo = [
+                (n, {'id': 'ddr-test-123-%s' % n, 'basename_orig': '%s.jpg' % n, 'n': n}, None)
+                for n in range(5)
+            ]
+            out = list(batch.Importer._prepare_new_files(todo, None, workers))
+            assert [r[0] for r in out] == list(range(5))
+            assert [r[2] for r in out] == [
+                'ddr-test-123-%s %s.jpg' % (n,n) for n in range(5)
+            ]
+            assert [r[5] for r in out] == ['file-%s' % n for n in range(5)]
+        
+        def fail(rowd, parent, log_path):
+            raise Exception('bad row')
+        monkeypatch.setattr(batch.Importer, '_prepare_new_file', fail)
+        todo = [(0, {'id': 'ddr-test-123-1', 'basename_orig': '1.jpg'}, None)]
+        assert_raises(
+            Exception, list, batch.Importer._prepare_new_files(todo, None, 2)
+        )
+    
     # TODO def test_register_entity_ids(self):
 
 
+class TestImportJournal():
+    
+    def test_make_path(self):
+        ci = identifier.Identifier('ddr-test-123', '/var/www/media/ddr')
+        out = batch.ImportJournal.make_path('/tmp/files.csv', ci, '/var/log/ddr')
+        assert out == '/var/log/ddr/import/ddr-test-123/files.csv.journal'
+    
+    def test_journal(self, tmpdir):
+        path = str(tmpdir / 'import' / 'files.csv.journal')
+        rowd0 = {'id': 'ddr-test-123-1', 'basename_orig': '/tmp/a.jpg'}
+        rowd1 = {'id': 'ddr-test-123-1', 'basename_orig': '/tmp/b.jpg'}
+        journal = batch.ImportJournal(path)
+        assert journal.entries == {}
+        assert not journal.completed(rowd0)
+        journal.record(
+            batch.ImportJournal.row_key(rowd0), 'ddr-test-123-1-master-abc',
+            ['files/ddr-test-123-1/entity.json'],
+            ['files/ddr-test-123-1/files/ddr-test-123-1-master-abc.jpg'],
+        )
+        # simulate crash while writing the next entry
+        with open(path, 'a') as f:
+            f.write('\n{"key": "ddr-test-123-1 /tmp/b.j')
+        journal = batch.ImportJournal(path)
+        assert journal.completed(rowd0)
+        assert not journal.completed(rowd1)
+        assert journal.git_files() == ['files/ddr-test-123-1/entity.json']
+        assert journal.annex_files() == [
+            'files/ddr-test-123-1/files/ddr-test-123-1-master-abc.jpg'
+        ]
+        journal.clear()
+        assert not os.path.exists(path)
+        assert not batch.ImportJournal(path).completed(rowd0)
+
+
 class TestUpdaterMetrics():
     pass
     # TODO def test_headers(self):
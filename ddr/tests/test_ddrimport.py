@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from collections import OrderedDict
+import json
 import os
 import shutil
 
@@ -371,6 +372,8 @@ def test_files_import_internal(tmpdir, collection, test_csv_dir, test_files_dir)
     commit = repo.index.commit('test_files_import_internal')
     # test hashes present
     check_file_hashes(collection.path_abs)
+    # entities list every file imported into them in this run
+    check_entity_file_groups(collection.path_abs)
     # ensure no binaries in .git/objects
     print('log_path %s' % log_path)
     assert not find_binaries_in_git_objects(repo)
@@ -501,6 +504,27 @@ def check_file_hashes(collection_path):
             print('f.size   %s' % f.size)
             raise Exception('Hash data missing')
 
+def check_entity_file_groups(collection_path):
+    """Check that entity JSONs list all of their files
+    """
+    paths = util.find_meta_files(
+        collection_path, recursive=True, model='file', force_read=True
+    )
+    expected = {}
+    for path in paths:
+        fi = identifier.Identifier(path)
+        expected.setdefault(fi.parent_id(), []).append(fi.id)
+    for parent_id,file_ids in expected.items():
+        pi = identifier.Identifier(parent_id, os.path.dirname(collection_path))
+        data = json.loads(fileio.read_text(pi.path_abs('json')))
+        listed = [
+            f['id']
+            for line in data if 'file_groups' in line
+            for group in line['file_groups']
+            for f in group['files']
+        ]
+        assert sorted(listed) == sorted(file_ids)
+
 def collect_hashes(collection_path):
     """Make dict of existing file hash data
     
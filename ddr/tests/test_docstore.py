@@ -1,9 +1,12 @@
+from collections import deque
 from datetime import datetime
 import json
 import os
 import sys
 
 from elasticsearch.connection.base import TransportError
+from elasticsearch.serializer import JSONSerializer
+import git
 from nose.tools import assert_raises
 from nose.plugins.attrib import attr
 import pytest
@@ -129,6 +132,59 @@ def test_public_fields():
     }
     assert docstore._public_fields(MODULES) == EXPECTED
 
+def test_field_plan(monkeypatch):
+    import elasticsearch_dsl as dsl
+    class FakeEntityDoc(dsl.Document):
+        id = dsl.Keyword()
+        title = dsl.Text()
+        notes = dsl.Text()
+        @staticmethod
+        def list_fields():
+            return ['id', 'title']
+    class FieldPlanModule(object):
+        FIELDS = [
+            {"elasticsearch": {"public": True}, "name": "id"},
+            {"elasticsearch": {"public": True}, "name": "title"},
+            {"elasticsearch": {"public": False}, "name": "notes"},
+        ]
+        @staticmethod
+        def index_title(data):
+            return data.upper()
+    monkeypatch.setitem(
+        docstore.ELASTICSEARCH_CLASSES_BY_MODEL, 'entity', FakeEntityDoc
+    )
+    plan = docstore.field_plan('entity', FieldPlanModule)
+    assert plan.es_class == FakeEntityDoc
+    assert plan.public_fields == ['id', 'title']
+    assert plan.list_fields == ['id', 'title']
+    fields = {fieldname: (public, fn) for fieldname,public,fn in plan.fields}
+    assert sorted(fields.keys()) == ['id', 'notes', 'title']
+    assert fields['id'] == (True, None)
+    assert fields['notes'] == (False, None)
+    assert fields['title'][0] == True
+    assert fields['title'][1]('abc') == 'ABC'
+    # cached
+    assert docstore.field_plan('entity', FieldPlanModule) is plan
+    docstore.field_plan.cache_clear()
+
+def test_lineage_breadcrumbs():
+    fi = identifier.Identifier('ddr-testing-123-1-master-abc123', '/tmp')
+    expected = [
+        {
+            'id': i.id,
+            'model': i.model,
+            'idpart': str(identifier.MODELS_IDPARTS[i.model][-1][-1]),
+            'label': str(i.idparts[identifier.MODELS_IDPARTS[i.model][-1][-1]]),
+        }
+        for i in fi.lineage(stubs=0)
+    ]
+    assert docstore.lineage_breadcrumbs(fi) == expected
+    # siblings share ancestors
+    fi2 = identifier.Identifier('ddr-testing-123-1-master-def456', '/tmp')
+    hits = docstore._ancestor_breadcrumbs.cache_info().hits
+    assert docstore.lineage_breadcrumbs(fi2)[1:] == expected[1:]
+    assert docstore._ancestor_breadcrumbs.cache_info().hits == hits + 1
+
 # _store_signature_file
 # _choose_signatures
 # load_document_json
@@ -233,6 +289,50 @@ def test_publishable(publishable_objects):
         )
         assert out == expected
 
+class FakePublishObject():
+    def __init__(self, oid, public, status):
+        self.identifier = identifier.Identifier(oid, '/tmp')
+        self.public = public
+        self.status = status
+
+def test_is_publishable():
+    assert docstore.is_publishable('collection', 1, 'completed')
+    assert not docstore.is_publishable('collection', 0, 'completed')
+    assert not docstore.is_publishable('entity', 1, 'inprocess')
+    assert not docstore.is_publishable('entity', None, None)
+    # files only have public
+    assert docstore.is_publishable('file', 1, None)
+    assert not docstore.is_publishable('file', 0, None)
+
+def test_publishability():
+    objects = {
+        o.identifier.id: o
+        for o in [
+            FakePublishObject('ddr-testing-123', 1, 'completed'),
+            FakePublishObject('ddr-testing-123-1', 0, 'completed'),
+            FakePublishObject('ddr-testing-123-2', 1, 'completed'),
+            FakePublishObject('ddr-testing-123-1-master-abc123', 1, None),
+            FakePublishObject('ddr-testing-123-2-master-abc123', 1, None),
+        ]
+    }
+    resolver = docstore.Publishability(objects)
+    ci,ei1,ei2,fi1,fi2 = [o.identifier for o in objects.values()]
+    assert resolver.effective(ci)
+    assert not resolver.effective(ei1)
+    assert resolver.effective(ei2)
+    assert resolver.own(fi1)
+    assert not resolver.parents(fi1)
+    assert not resolver.effective(fi1)
+    assert resolver.effective(fi2)
+    # results are memoized by ID
+    assert resolver.effective_cache[ei1.id] == False
+    assert resolver.effective_cache[ci.id] == True
+    results = docstore.publishable([ci,ei1,fi1,fi2], objects)
+    assert [r['action'] for r in results] == ['POST', 'SKIP', 'SKIP', 'POST']
+    assert [r['note'] for r in results] == [
+        '', 'unpublishable', 'parent unpublishable', ''
+    ]
+
 POST_OBJECT_IDS = [
     'ddr-testing-123',
     'ddr-testing-123-1',
@@ -273,6 +373,373 @@ def test_post_multi(publishable_objects):
     result = ds.post_multi(collection_path, recursive=True)
     print(result)
     
+class FakeBulkES():
+    """Stands in for Elasticsearch client in elasticsearch.helpers bulk functions
+    
+    Keeps documents in a dict, responds like the real bulk API.
+    """
+    def __init__(self):
+        self.transport = type('Transport', (), {'serializer': JSONSerializer()})()
+        self.docs = {}
+        self.requests = 0
+    
+    def bulk(self, body, *args, **kwargs):
+        self.requests += 1
+        lines = [json.loads(line) for line in body.strip().splitlines()]
+        items = []
+        while lines:
+            op_type,meta = list(lines.pop(0).items())[0]
+            key = (meta['_index'], meta['_id'])
+            if op_type == 'delete':
+                if self.docs.pop(key, None):
+                    items.append({op_type: {'_id': meta['_id'], 'result': 'deleted', 'status': 200}})
+                else:
+                    items.append({op_type: {'_id': meta['_id'], 'result': 'not_found', 'status': 404}})
+                continue
+            result = 'updated' if key in self.docs else 'created'
+            self.docs[key] = lines.pop(0)
+            items.append({op_type: {
+                '_id': meta['_id'], 'result': result,
+                'status': 201 if result == 'created' else 200
+            }})
+        return {'took': 1, 'errors': False, 'items': items}
+
+def test_bulk_item_status():
+    assert docstore._bulk_item_status(
+        True, {'index': {'_id': 'ddr-testing-123', 'result': 'created', 'status': 201}}
+    ) == 'created'
+    assert docstore._bulk_item_status(
+        False, {'delete': {'_id': 'ddr-testing-123', 'result': 'not_found', 'status': 404}}
+    ) == 'not_found'
+    assert docstore._bulk_item_status(
+        False, {'index': {'_id': 'ddr-testing-123', 'status': 400, 'error': 'mapper_parsing_exception'}}
+    ) == 'ERROR 400: mapper_parsing_exception'
+
+def test_bulk_actions(tmpdir):
+    ds = docstore.Docstore(config.DOCSTORE_HOST, connection=FakeBulkES())
+    def path_dicts():
+        for n in range(1,21):
+            oi = identifier.Identifier('ddr-testing-123-%s' % n, str(tmpdir))
+            yield {
+                'path': oi.path_abs(), 'identifier': oi, 'note': '',
+                'action': 'POST' if n % 3 == 0 else 'SKIP',
+            }
+    results = []
+    for processes in [1, 2]:
+        sent = deque(); bad_paths = []
+        actions = list(ds._bulk_actions(path_dicts(), sent, bad_paths, processes))
+        # delete actions in order; objects that don't exist can't be posted
+        assert [a['_id'] for a in actions] == [p['identifier'].id for p in sent]
+        assert len(actions) == 14
+        assert len(bad_paths) == 6
+        assert bad_paths[0]['note'].startswith('Could not instantiate')
+        results.append((actions, [p['identifier'].id for p in bad_paths]))
+    assert results[0] == results[1]
+
+class FakeScanES():
+    """Stands in for Elasticsearch point in time + search_after"""
+    def __init__(self, num):
+        self.hits = [
+            {'_id': 'ddr-testing-123-%s' % n, '_source': {}, 'sort': [n]}
+            for n in range(num)
+        ]
+        self.pits = set()
+        self.requests = 0
+    
+    def open_point_in_time(self, index, keep_alive=None):
+        pit_id = 'pit%s' % len(self.pits)
+        self.pits.add(pit_id)
+        return {'id': pit_id}
+    
+    def close_point_in_time(self, body):
+        self.pits.remove(body['id'])
+    
+    def search(self, body):
+        assert body['pit']['id'] in self.pits
+        assert 'aggs' not in body
+        self.requests += 1
+        start = 0
+        if body.get('search_after'):
+            start = body['search_after'][0] + 1
+        hits = self.hits[start:start+body['size']]
+        return {'pit_id': body['pit']['id'], 'hits': {'hits': hits}}
+
+def test_scan_hits():
+    es = FakeScanES(25)
+    body = {'query': {'match_all': {}}, 'aggs': {'x': {}}, 'size': 10000}
+    hits = docstore.scan_hits(es, 'ddrentity', body, size=10)
+    assert next(hits)['_id'] == 'ddr-testing-123-0'
+    # hits are fetched as needed
+    assert es.requests == 1
+    assert len(list(hits)) == 24
+    assert es.requests == 3
+    # point in time is closed
+    assert es.pits == set()
+    # caller's body is not modified
+    assert body == {'query': {'match_all': {}}, 'aggs': {'x': {}}, 'size': 10000}
+    ds = docstore.Docstore(config.DOCSTORE_HOST, connection=es)
+    assert len(list(ds.scan(['entity'], body, size=5))) == 25
+    assert_raises(Exception, ds.scan, ['entity'], {})
+
+class FakeShardDocES(FakeScanES):
+    """Cluster with points in time but no _shard_doc (7.10, 7.11)"""
+    def search(self, body):
+        if body['sort'] == ['_shard_doc']:
+            raise TransportError(400, 'search_phase_execution_exception', {})
+        return super().search(body)
+
+class FakeOldClientES():
+    """elasticsearch-py < 7.10 has no open_point_in_time"""
+
+def test_scan_hits_fallback(monkeypatch):
+    def scan(es, index, query, size, scroll):
+        assert 'aggs' not in query
+        yield from [{'_id': 'scrolled'}]
+    monkeypatch.setattr(docstore.helpers, 'scan', scan)
+    body = {'query': {'match_all': {}}, 'aggs': {'x': {}}}
+    # no point in time in client
+    hits = docstore.scan_hits(FakeOldClientES(), 'ddrentity', body, size=10)
+    assert list(hits) == [{'_id': 'scrolled'}]
+    # no _shard_doc on server; point in time is closed
+    es = FakeShardDocES(25)
+    hits = docstore.scan_hits(es, 'ddrentity', body, size=10)
+    assert list(hits) == [{'_id': 'scrolled'}]
+    assert es.pits == set()
+    # caller's sort is used as-is
+    sorted_body = {'query': {'match_all': {}}, 'sort': ['id']}
+    assert len(list(docstore.scan_hits(es, 'ddrentity', sorted_body, size=10))) == 25
+
+def test_alias_actions():
+    assert docstore.alias_actions('ddrentity', 'ddrentity-2', ['ddrentity-1']) == [
+        {'remove': {'index': 'ddrentity-1', 'alias': 'ddrentity'}},
+        {'add': {'index': 'ddrentity-2', 'alias': 'ddrentity'}},
+    ]
+    assert docstore.alias_actions(
+        'ddrentity', 'ddrentity-2', ['ddrentity-1'], delete_old=True
+    ) == [
+        {'remove_index': {'index': 'ddrentity-1'}},
+        {'add': {'index': 'ddrentity-2', 'alias': 'ddrentity'}},
+    ]
+    assert docstore.alias_actions(
+        'ddrentity', 'ddrentity-1', [], concrete=True, delete_old=True
+    ) == [
+        {'remove_index': {'index': 'ddrentity'}},
+        {'add': {'index': 'ddrentity-1', 'alias': 'ddrentity'}},
+    ]
+
+class FakeReindexES():
+    """Stands in for the Elasticsearch index, alias, reindex, and task APIs"""
+    class Indices():
+        def __init__(self, es):
+            self.es = es
+        def exists(self, index):
+            return index in self.es.docs
+        def exists_alias(self, name):
+            return name in self.es.aliases
+        def get_alias(self, name):
+            return {index: {'aliases': {name: {}}} for index in self.es.aliases[name]}
+        def refresh(self, index):
+            pass
+        def update_aliases(self, body):
+            for action in body['actions']:
+                op,args = list(action.items())[0]
+                if op == 'add':
+                    self.es.aliases.setdefault(args['alias'], []).append(args['index'])
+                elif op == 'remove':
+                    self.es.aliases[args['alias']].remove(args['index'])
+                elif op == 'remove_index':
+                    self.es.docs.pop(args['index'])
+    
+    class Tasks():
+        def __init__(self, es):
+            self.es = es
+        def list(self, **kwargs):
+            return {'nodes': {}}
+        def get(self, task_id):
+            return {
+                'completed': True,
+                'task': {'status': {'total': 3, 'created': 3}},
+                'response': {'failures': []},
+            }
+    
+    def __init__(self):
+        self.docs = {'ddrentity': ['a', 'b', 'c']}
+        self.aliases = {}
+        self.indices = self.Indices(self)
+        self.tasks = self.Tasks(self)
+    
+    def resolve(self, name):
+        if name in self.aliases:
+            return self.aliases[name][0]
+        return name
+    
+    def reindex(self, body, **kwargs):
+        source = self.resolve(body['source']['index'])
+        self.docs[body['dest']['index']] = list(self.docs[source])
+        return {'task': 'node:1'}
+    
+    def count(self, index):
+        return {'count': len(self.docs[self.resolve(index)])}
+
+def test_reindex_model(monkeypatch):
+    class FakeDoc():
+        @classmethod
+        def init(cls, index, using):
+            using.docs[index] = []
+    monkeypatch.setitem(docstore.ELASTICSEARCH_CLASSES_BY_MODEL, 'entity', FakeDoc)
+    es = FakeReindexES()
+    ds = docstore.Docstore(config.DOCSTORE_HOST, connection=es)
+    # model name is an index, not an alias
+    status = ds.reindex_model('entity', '1', poll_interval=0)
+    assert status['swapped'] == False
+    assert 'delete_old' in status['message']
+    status = ds.reindex_model('entity', '1', poll_interval=0, delete_old=True)
+    assert status['swapped'] == True
+    assert (status['source_count'],status['dest_count']) == (3,3)
+    assert es.aliases == {'ddrentity': ['ddrentity-1']}
+    assert 'ddrentity' not in es.docs
+    # alias is swapped, old index is kept
+    status = ds.reindex_model('entity', '2', poll_interval=0)
+    assert status['swapped'] == True
+    assert es.aliases == {'ddrentity': ['ddrentity-2']}
+    assert sorted(es.docs.keys()) == ['ddrentity-1', 'ddrentity-2']
+    # nothing to do
+    status = ds.reindex_model('entity', '2', poll_interval=0)
+    assert status['swapped'] == False
+
+def test_delete_query():
+    assert docstore._delete_query('ddr-testing-123') == {
+        'query': {'bool': {
+            'should': [{'term': {'id': 'ddr-testing-123'}}],
+            'minimum_should_match': 1,
+        }}
+    }
+    assert docstore._delete_query('ddr-testing-123', recursive=True) == {
+        'query': {'bool': {
+            'should': [
+                {'term': {'id': 'ddr-testing-123'}},
+                {'prefix': {'id': 'ddr-testing-123-'}},
+            ],
+            'minimum_should_match': 1,
+        }}
+    }
+
+class FakeDeleteES(FakeBulkES):
+    """FakeBulkES that also understands docstore._delete_query"""
+    def delete_by_query(self, index, body, *args, **kwargs):
+        should = body['query']['bool']['should']
+        def matches(oid):
+            for q in should:
+                if ('term' in q) and (oid == q['term']['id']):
+                    return True
+                if ('prefix' in q) and oid.startswith(q['prefix']['id']):
+                    return True
+            return False
+        keys = [key for key in self.docs if key[0] == index and matches(key[1])]
+        for key in keys:
+            self.docs.pop(key)
+        return {'deleted': len(keys)}
+
+def test_delete_bulk(monkeypatch):
+    monkeypatch.setitem(docstore.ELASTICSEARCH_CLASSES, 'all', [
+        {'doctype': model, 'class': None}
+        for model in ['collection', 'entity', 'file']
+    ])
+    es = FakeDeleteES()
+    ds = docstore.Docstore(config.DOCSTORE_HOST, connection=es)
+    for oid in [
+            'ddr-testing-123', 'ddr-testing-123-1', 'ddr-testing-123-10',
+            'ddr-testing-123-1-master-abc123']:
+        oi = identifier.Identifier(oid, '/tmp')
+        es.docs[(ds.index_name(oi.model), oid)] = {'id': oid}
+    counts = ds.delete_bulk('ddr-testing-123-1', recursive=False)
+    assert sum(counts.values()) == 1
+    assert counts[ds.index_name('entity')] == 1
+    counts = ds.delete('ddr-testing-123', recursive=True, bulk=True)
+    assert sum(counts.values()) == 3
+    assert es.docs == {}
+
+def test_post_bulk(publishable_objects):
+    es = FakeBulkES()
+    ds = docstore.Docstore(config.DOCSTORE_HOST, connection=es)
+    post_these = [o for o in publishable_objects if o.id in POST_OBJECT_IDS]
+    collection_path = post_these[0].identifier.collection_path()
+    for o in post_these:
+        o.status = 'completed'
+        o.public = 1
+        o.write_json()
+    result = ds.post_bulk(collection_path, recursive=True, chunk_size=2)
+    assert result['created'] == len(publishable_objects) - result['skipped']
+    assert result['bad'] == []
+    assert es.requests > 1
+    # second time around everything is updated
+    result = ds.post_bulk(collection_path, recursive=True, chunk_size=100, threads=2)
+    assert result['updated'] == len(es.docs)
+    assert result['created'] == 0
+    # unpublishable objects are deleted
+    post_these[0].public = 0
+    post_these[0].write_json()
+    result = ds.post_bulk(collection_path, recursive=True)
+    assert result['successful'] == 0
+    assert result['deleted'] > 0
+    assert es.docs == {}
+
+def test_indexed_commit(tmpdir):
+    repo_path = str(tmpdir / 'ddr-testing-123')
+    os.makedirs(os.path.join(repo_path, '.git'))
+    assert docstore.indexed_commit(repo_path, 'localhost:9200') == None
+    docstore.set_indexed_commit(repo_path, 'localhost:9200', 'abc123')
+    docstore.set_indexed_commit(repo_path, 'otherhost:9200', 'def456')
+    assert docstore.indexed_commit(repo_path, 'localhost:9200') == 'abc123'
+    assert docstore.indexed_commit(repo_path, 'otherhost:9200') == 'def456'
+
+def write_object_json(path, oid, public, status, title=''):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(json.dumps([
+            {'app_commit': 'abc'}, {'id': oid}, {'public': public}, {'status': status},
+            {'title': title},
+        ]))
+
+def test_changed_paths(tmpdir):
+    repo_path = str(tmpdir / 'ddr-testing-123')
+    repo = git.Repo.init(repo_path)
+    repo.git.config('user.name', GIT_USER)
+    repo.git.config('user.email', GIT_MAIL)
+    paths = {
+        oid: identifier.Identifier(oid, str(tmpdir)).path_abs('json')
+        for oid in [
+            'ddr-testing-123',
+            'ddr-testing-123-1',
+            'ddr-testing-123-1-master-abc123',
+            'ddr-testing-123-2',
+            'ddr-testing-123-2-master-def456',
+        ]
+    }
+    def commit(msg):
+        repo.git.add('--all')
+        repo.git.commit('-m', msg)
+        return repo.head.commit.hexsha
+    for oid,path in paths.items():
+        write_object_json(path, oid, 1, 'completed')
+    commit0 = commit('initial')
+    # edit entity (publishability unchanged), delete a file
+    write_object_json(paths['ddr-testing-123-1'], 'ddr-testing-123-1', 1, 'completed', 'new')
+    os.remove(paths['ddr-testing-123-2-master-def456'])
+    commit1 = commit('edit')
+    changed,deleted = docstore.changed_paths(repo, commit0, commit1)
+    assert changed == [paths['ddr-testing-123-1']]
+    assert deleted == [paths['ddr-testing-123-2-master-def456']]
+    # unpublish entity: its children must be republished
+    write_object_json(paths['ddr-testing-123-1'], 'ddr-testing-123-1', 0, 'completed')
+    commit2 = commit('unpublish')
+    changed,deleted = docstore.changed_paths(repo, commit1, commit2)
+    assert changed == [
+        paths['ddr-testing-123-1'], paths['ddr-testing-123-1-master-abc123'],
+    ]
+    assert deleted == []
+
 # this should come last...
 @pytest.mark.skipif(no_elasticsearch(), reason=NO_ELASTICSEARCH_ERR)
 def test_delete(publishable_objects):
@@ -1,10 +1,13 @@
 from datetime import datetime
+import json
 import os
 import re
 import shutil
+import sys
 
 from nose.tools import assert_raises
 import git
+import pytest
 
 from DDR import config
 from DDR import dvcs
@@ -323,6 +326,35 @@ def test_parse_list_staged():
 
 # TODO list_staged
 
+GIT_DIFF_CHANGED = """M\tcollection.json
+A\tfiles/ddr-densho-10-2/entity.json
+D\tfiles/ddr-densho-10-1/files/ddr-densho-10-1-master-c85f8d0f91.json
+"""
+GIT_DIFF_CHANGED_EXPECTED = (
+    ['collection.json', 'files/ddr-densho-10-2/entity.json'],
+    ['files/ddr-densho-10-1/files/ddr-densho-10-1-master-c85f8d0f91.json'],
+)
+
+def test_parse_list_changed():
+    assert dvcs._parse_list_changed(GIT_DIFF_CHANGED) == GIT_DIFF_CHANGED_EXPECTED
+    assert dvcs._parse_list_changed('') == ([], [])
+
+def test_list_changed(tmpdir):
+    path = str(tmpdir / 'ddr-test-123')
+    repo = make_repo(path, ['collection.json', 'old.json'])
+    since = repo.head.commit.hexsha
+    with open(os.path.join(path, 'collection.json'), 'w') as f:
+        f.write('modified')
+    with open(os.path.join(path, 'new.json'), 'w') as f:
+        f.write('new')
+    repo.index.add(['collection.json', 'new.json'])
+    repo.index.remove(['old.json'], working_tree=True)
+    repo.index.commit('change')
+    assert dvcs.list_changed(repo, since) == (
+        ['collection.json', 'new.json'], ['old.json']
+    )
+    assert dvcs.list_changed(repo, since, since) == ([], [])
+
 SAMPLE_COMMIT_LOG = """
 commit 4df7877f43a10873ced2c484cc9f65605ee4ca68
 Author: DDRAdmin <kinkura@hq.densho.org>
@@ -340,6 +372,69 @@ SAMPLE_COMMIT_LOG_PARSED = [
     'files/ddr-densho-10-1/files/ddr-densho-10-1-master-c85f8d0f91.json',
 ]
 
+GIT_STATUS_V2 = '\0'.join([
+    '# branch.oid 4df7877f43a10873ced2c484cc9f65605ee4ca68',
+    '1 M. N... 100644 100644 100644 3f1a 3f1b collection.json',
+    '1 .M N... 100644 100644 100644 3f1a 3f1a files/ddr-densho-10-1/entity.json',
+    '1 A. N... 000000 100644 100644 0000 3f1c files/ddr-densho-10-1/files/with space.json',
+    '2 R. N... 100644 100644 100644 3f1a 3f1a R100 files/ddr-densho-10-2/entity.json',
+    'files/ddr-densho-10-3/entity.json',
+    'u UU N... 100644 100644 100644 100644 3f1a 3f1b 3f1c files/ddr-densho-10-4/entity.json',
+    '? files/ddr-densho-10-5/files/ddr-densho-10-5-master-a1b2c3d4e5.jpg',
+    '',
+])
+GIT_STATUS_V2_EXPECTED = {
+    'staged': [
+        'collection.json',
+        'files/ddr-densho-10-1/files/with space.json',
+        'files/ddr-densho-10-2/entity.json',
+    ],
+    'modified': [
+        'files/ddr-densho-10-1/entity.json',
+    ],
+    'untracked': [
+        'files/ddr-densho-10-5/files/ddr-densho-10-5-master-a1b2c3d4e5.jpg',
+    ],
+    'conflicted': [
+        'files/ddr-densho-10-4/entity.json',
+    ],
+}
+
+def test_parse_status_v2():
+    assert dvcs._parse_status_v2(GIT_STATUS_V2) == GIT_STATUS_V2_EXPECTED
+    assert dvcs._parse_status_v2('') == {
+        'staged': [], 'modified': [], 'untracked': [], 'conflicted': [],
+    }
+
+def test_unstaged():
+    paths = [
+        'collection.json',
+        'files/ddr-densho-10-1/entity.json',
+        'files/ddr-densho-10-5/files/ddr-densho-10-5-master-a1b2c3d4e5.jpg',
+    ]
+    assert dvcs.unstaged(GIT_STATUS_V2_EXPECTED, paths) == paths[1:]
+
+def test_stage_batch(tmpdir):
+    path = str(tmpdir / 'ddr-test-123')
+    repo = make_repo(path, ['collection.json'])
+    os.makedirs(os.path.join(path, 'files', 'ddr-test-123-1'))
+    new = [
+        'files/ddr-test-123-1/entity.json',
+        'files/ddr-test-123-1/changelog',
+    ]
+    for fn in ['collection.json', 'untouched.json'] + new:
+        with open(os.path.join(path, fn), 'w') as f:
+            f.write('modified')
+    status = dvcs.stage_batch(repo, ['collection.json'] + new)
+    assert sorted(status['staged']) == sorted(['collection.json'] + new)
+    assert status['untracked'] == ['untouched.json']
+    assert dvcs.unstaged(status, ['collection.json'] + new) == []
+    assert dvcs.status_snapshot(repo) == status
+    assert_raises(
+        git.exc.GitCommandError,
+        dvcs._git_stdin, repo, ['add', '--pathspec-from-file=-'], ['missing.json']
+    )
+
 # TODO stage
 
 def test_parse_list_committed():
@@ -630,3 +725,92 @@ def test_remotes(tmpdir):
 #    # under .git/annex/objects/ dir.
 #    assert expected_abs[0][1] in targets_abs[0][1]
 #    assert expected_rel[0][1] in targets_rel[0][1]
+
+
+# Stands in for "git annex COMMAND --batch [--json]": answers each line,
+# skips "skip", and exits on "exit".
+FAKE_ANNEX = """
+import json, sys
+command = sys.argv[1]
+as_json = '--json' in sys.argv
+for line in sys.stdin:
+    item = line.strip()
+    if item == 'exit':
+        sys.exit(1)
+    if item == 'skip':
+        out = ''
+    elif as_json:
+        out = json.dumps({
+            'command': command, 'file': item, 'success': item != 'bad',
+            'args': sys.argv[2:],
+        })
+    else:
+        out = '.git/annex/objects/%s' % item
+    sys.stdout.write(out + '\\n')
+    sys.stdout.flush()
+"""
+
+def fake_annex_program(tmpdir, monkeypatch):
+    script = str(tmpdir / 'fake_annex.py')
+    with open(script, 'w') as f:
+        f.write(FAKE_ANNEX)
+    monkeypatch.setattr(dvcs.AnnexBatch, 'program', [sys.executable, script])
+
+def test_annex_batch(tmpdir, monkeypatch):
+    fake_annex_program(tmpdir, monkeypatch)
+    batch = dvcs.AnnexBatch(str(tmpdir), 'whereis')
+    assert batch.cmd()[-3:] == ['whereis', '--batch', '--json']
+    out0 = batch.query('files/a.jpg')
+    assert out0['command'] == 'whereis'
+    assert out0['file'] == 'files/a.jpg'
+    pid = batch._proc.pid
+    assert batch.query('files/b.jpg')['file'] == 'files/b.jpg'
+    # same process
+    assert batch._proc.pid == pid
+    assert batch.query('skip') == None
+    # process dies: error, then restarted
+    assert_raises(git.exc.GitCommandError, batch.query, 'exit')
+    assert batch._proc == None
+    assert batch.query('files/c.jpg')['file'] == 'files/c.jpg'
+    assert batch._proc.pid != pid
+    batch.close()
+    assert batch._proc == None
+
+def test_annex_client(tmpdir, monkeypatch):
+    fake_annex_program(tmpdir, monkeypatch)
+    path = str(tmpdir / 'ddr-test-123')
+    repo = make_repo(path, ['collection.json'])
+    client = dvcs.annex_client(repo)
+    assert dvcs.annex_client(repo) is client
+    assert client.add('files/a.jpg')['command'] == 'add'
+    assert client.find('files/a.jpg', ['--in=here'])['args'][-1] == '--in=here'
+    assert client.info('files/a.jpg')['command'] == 'info'
+    assert client.drop('files/a.jpg', force=True)['args'][-1] == '--force'
+    assert client.contentlocation('SHA256E-s1--abc.jpg') == \
+        '.git/annex/objects/SHA256E-s1--abc.jpg'
+    assert len(client._batches) == 5
+    # annex_stage ends the add process so git-annex releases the index
+    dvcs.annex_stage(repo, ['files/b.jpg', 'skip'])
+    assert client.batch('add')._proc == None
+    assert_raises(Exception, dvcs.annex_stage, repo, ['files/c.jpg', 'bad'])
+    dvcs.close_annex_clients()
+    assert dvcs.ANNEX_CLIENTS == {}
+    assert client._batches == {}
+
+@pytest.mark.skipif(not shutil.which('git-annex'), reason='git-annex is not installed')
+def test_stage_batch_annex(tmpdir):
+    path = str(tmpdir / 'ddr-test-123')
+    repo = make_repo(path, ['collection.json'])
+    annex_init(repo)
+    os.makedirs(os.path.join(path, 'files'))
+    with open(os.path.join(path, 'files', 'a.jpg'), 'wb') as f:
+        f.write(b'binary')
+    with open(os.path.join(path, 'files', 'a.json'), 'w') as f:
+        f.write('{}')
+    status = dvcs.stage_batch(repo, ['files/a.json'], ['files/a.jpg'])
+    assert sorted(status['staged']) == ['files/a.jpg', 'files/a.json']
+    assert dvcs.unstaged(status, ['files/a.jpg', 'files/a.json']) == []
+    assert os.path.islink(os.path.join(path, 'files', 'a.jpg'))
+    assert repo.git.annex('find', 'files/a.jpg') == 'files/a.jpg'
+    assert dvcs.annex_client(repo).batch('add')._proc == None
+    dvcs.close_annex_clients()
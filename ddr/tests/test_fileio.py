@@ -27,6 +27,40 @@ def test_write_text(tmpdir):
     # clean up
     os.remove(path)
 
+FIELDS_TEXT = """[
+    {
+        "app_commit": "52155f819ccfccf72f80a11e1cc53d006888e283",
+        "app_release": "0.10"
+    },
+    {"id": "ddr-test-123"},
+    {"public": 1},
+    {"status": "completed"},
+    {"title": "TITLE"},
+    {"public": 0},
+    {"xmp": "THIS IS NOT VALID JSON
+"""
+
+def test_read_fields(tmpdir):
+    path = str(tmpdir / 'read_fields.json')
+    fileio.write_text(FIELDS_TEXT, path)
+    # stops reading before the bad field; last value wins
+    assert fileio.read_fields(path, ['public', 'status']) == {
+        'public': 0, 'status': 'completed'
+    }
+    assert fileio.read_fields(path, ['title']) == {'title': 'TITLE'}
+    # values are copies
+    fileio.write_text('[{"tags": ["a"]}]', path)
+    data = fileio.read_fields(path, ['tags'])
+    data['tags'].append('b')
+    assert fileio.read_fields(path, ['tags']) == {'tags': ['a']}
+    fileio.write_text(FIELDS_TEXT, path)
+    assert fileio.read_fields(path, []) == {}
+    # rewriting the file invalidates the cache
+    fileio.write_text('[{"id": "ddr-test-123"}, {"title": "NEW"}]', path)
+    assert fileio.read_fields(path, ['title', 'missing']) == {'title': 'NEW'}
+    fileio.forget_fields()
+    assert fileio.read_fields(path, ['id']) == {'id': 'ddr-test-123'}
+
 APPEND_TEXT = [
     '000',
     '001',
@@ -320,7 +320,56 @@ def test_definitions_additional_paths():
 
 # ----------------------------------------------------------------------
 
-# TODO test_compile_patterns
+def test_compile_patterns():
+    patterns = (
+        (r'^(?P<repo>[\w]+)-(?P<org>[\w]+)-(?P<cid>[\d]+)-(?P<eid>[\d]+)$', 'entity-rel', 'entity'),
+        (r'^(?P<repo>[\w]+)-(?P<org>[\w]+)-(?P<cid>[\d]+)$', 'collection-rel', 'collection'),
+        (r'^(?P<repo>[\w]+)-(?P<org>[\w]+)$', 'organization-rel', 'organization'),
+    )
+    compiled = identifier.Definitions.compile_patterns(patterns)
+    assert compiled.regex
+    texts = ['ddr-test', 'ddr-test-123', 'ddr-test-123-456', 'ddr.test.123.456', '']
+    for text in texts:
+        assert compiled.identify(text) == identifier.identify_object(text, patterns)
+        assert identifier.identify_object(text, compiled) == identifier.identify_object(text, patterns)
+        assert identifier.matches_pattern(text, compiled) == identifier.matches_pattern(text, patterns)
+    # patterns that can't be joined fall back to matching one at a time
+    patterns = (
+        (r'^(?P<repo>[\w]+)-(\d+)-\1$', '', 'weird'),
+        (r'^(?P<repo>[\w]+)-(?P<org>[\w]+)$', '', 'organization'),
+    )
+    compiled = identifier.Definitions.compile_patterns(patterns)
+    assert compiled.identify('ddr-test') == ('organization', '', {'repo':'ddr', 'org':'test'})
+    # numbered backrefs compile inside the alternation but point at the
+    # wrong group, so they must fall back too
+    patterns = (
+        (r'^(?P<repo>[a-z]+)-(?P<org>[a-z]+)$', '', 'organization'),
+        (r'^(?P<repo>[a-z]+)-(\d+)-\2$', '', 'weird'),
+    )
+    compiled = identifier.Definitions.compile_patterns(patterns)
+    assert compiled.regex is None
+    assert compiled.identify('ddr-12-12') == ('weird', '', {'repo':'ddr'})
+    assert compiled.identify('ddr-12-13') == (None, None, None)
+    # named backrefs are rewritten and can still be combined
+    patterns = (
+        (r'^(?P<repo>[a-z]+)-(?P=repo)$', '', 'twice'),
+    )
+    compiled = identifier.Definitions.compile_patterns(patterns)
+    assert compiled.regex
+    assert compiled.identify('ddr-ddr') == ('twice', '', {'repo':'ddr'})
+
+def test_parse_cache():
+    identifier.parse_cache_clear()
+    i0 = identifier.Identifier('ddr-test-123-456', '/tmp')
+    i1 = identifier.Identifier('ddr-test-123-456', '/tmp')
+    assert identifier.parse_cache_info().hits == 1
+    assert i0.id == i1.id
+    assert i0.basepath == i1.basepath
+    # cached parts must not be shared between instances
+    assert i0.parts is not i1.parts
+    i1.parts['eid'] = 789
+    assert i0.parts['eid'] == 456
+    assert identifier.Identifier('ddr-test-123-456', '/tmp').parts['eid'] == 456
 
 # TODO test_render_models_digraph
 
@@ -1325,3 +1374,74 @@ def test_urlpath():
     assert i4.urlpath('public') == FILE_PUBLIC_URL
 
 
+
+def test_compact_identifier():
+    ci = identifier.CompactIdentifier('ddr-test-123-456-master-a1b2c3d4e5', '/tmp')
+    i = identifier.Identifier('ddr-test-123-456-master-a1b2c3d4e5', '/tmp')
+    assert ci.id == i.id
+    assert ci.model == i.model
+    assert ci.parts == i.parts
+    assert ci.id_sort == i.id_sort
+    assert ci.path_abs('json') == i.path_abs('json')
+    assert ci.path_rel() == i.path_rel()
+    assert ci.path_rel('json') == i.path_rel('json')
+    assert ci.parent().path_rel('json') == i.parent().path_rel('json')
+    assert ci.collection_id() == i.collection_id()
+    assert [x.id for x in ci.lineage()] == [x.id for x in i.lineage()]
+    assert ci == i
+    assert ci.thaw().id == i.id
+    assert i.freeze() == ci
+    # immutable
+    def setid():
+        ci.id = 'ddr-test-123'
+    assert_raises(AttributeError, setid)
+    # parents are shared
+    ci2 = identifier.CompactIdentifier('ddr-test-123-456-master-f6e7d8c9b0', '/tmp')
+    assert ci.parent() is ci2.parent()
+    assert ci.collection() is ci2.collection()
+    # shared parents are released with the parse cache
+    identifier.parse_cache_clear()
+    assert identifier.CompactIdentifier.from_parts.cache_info().currsize == 0
+    # sorting
+    cis = [
+        identifier.CompactIdentifier(oid, '/tmp')
+        for oid in ['ddr-test-123-10', 'ddr-test-123-9', 'ddr-test-123-100']
+    ]
+    assert [x.id for x in sorted(cis)] == [
+        'ddr-test-123-9', 'ddr-test-123-10', 'ddr-test-123-100'
+    ]
+    assert ci.sort_key == i.sort_key
+
+
+def test_sort_key():
+    oids = [
+        'ddr-test-123-10',
+        'ddr-test-123-9-master-a1b2c3d4e5',
+        'ddr-test-123-9',
+        'ddr-test-123',
+        'ddr-test-123-100',
+    ]
+    expected = [
+        'ddr-test-123',
+        'ddr-test-123-9',
+        'ddr-test-123-9-master-a1b2c3d4e5',
+        'ddr-test-123-10',
+        'ddr-test-123-100',
+    ]
+    identifiers = [identifier.Identifier(oid, '/tmp') for oid in oids]
+    assert [i.id for i in sorted(identifiers)] == expected
+    assert [
+        i.id for i in sorted(identifiers, key=lambda i: i.sort_key)
+    ] == expected
+    # paths
+    paths = [i.path_abs() for i in identifiers]
+    assert sorted(paths, key=identifier.path_sort_key) == [
+        identifier.Identifier(oid, '/tmp').path_abs() for oid in expected
+    ]
+    # same key whichever way the Identifier was made
+    i0 = identifier.Identifier('ddr-test-123-9', '/tmp')
+    i1 = identifier.Identifier(i0.path_abs('json'))
+    parts = dict(i0.parts)
+    parts['model'] = i0.model
+    i2 = identifier.Identifier(parts=parts, base_path='/tmp')
+    assert i0.sort_key == i1.sort_key == i2.sort_key
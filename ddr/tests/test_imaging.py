@@ -1,4 +1,5 @@
 import os
+import time
 
 from nose.tools import assert_raises
 import pytest
@@ -43,13 +44,12 @@ def no_files():
         print(r.status_code)
         if r.status_code == 200:
             return False
-    except ConnectionError:
+    except requests.exceptions.ConnectionError:
         print('ConnectionError')
         return True
     return True
 
 
-@pytest.mark.skipif(no_files(), reason=NO_FILES_ERR)
 @pytest.fixture(scope="session")
 def test_files(tmpdir_factory):
     """
@@ -134,6 +134,87 @@ def test_geometry_is_ok():
     for s in GEOMETRY['bad']:
         assert imaging.geometry_is_ok(s) == False
 
+def test_parse_geometry():
+    assert imaging.parse_geometry('1024x1024>') == (1024, 1024, True)
+    assert imaging.parse_geometry('123x123') == (123, 123, False)
+    assert imaging.parse_geometry('123x') == (123, None, False)
+    assert imaging.parse_geometry('x123') == (None, 123, False)
+    for geometry in ['123>x123', 'x', '123', '12ax34']:
+        assert_raises(ValueError, imaging.parse_geometry, geometry)
+
+def test_can_thumbnail_fast(monkeypatch):
+    monkeypatch.setattr(imaging, 'pyvips', None)
+    monkeypatch.setattr(imaging, 'Image', None)
+    assert imaging.can_thumbnail_fast('/tmp/a.jpg', '100x100') == False
+    monkeypatch.setattr(imaging, 'Image', object())
+    assert imaging.can_thumbnail_fast('/tmp/a.jpg', '100x100') == True
+    assert imaging.can_thumbnail_fast('/tmp/a.TIF', '100x100>') == True
+    assert imaging.can_thumbnail_fast('/tmp/a.pdf', '100x100') == False
+    assert imaging.can_thumbnail_fast('/tmp/a.jpg', '100>x100') == False
+    assert imaging.can_thumbnail_fast('/tmp/a.jpg', '100x100', '-strip') == False
+
+def test_thumbnail_fallback(tmpdir, monkeypatch):
+    src = str(tmpdir / 'src.jpg')
+    dest = str(tmpdir / 'src-a.jpg')
+    with open(src, 'w') as f:
+        f.write('not really a jpeg')
+    def fast(src, dest, geometry):
+        with open(dest, 'w') as f:
+            f.write('partial')
+        raise Exception('cannot identify image file')
+    def magick(src, dest, geometry, options, data):
+        with open(dest, 'w') as f:
+            f.write('thumbnail')
+        data['method'] = 'imagemagick'
+        data['status_code'] = 0
+        return data
+    monkeypatch.setattr(imaging, 'can_thumbnail_fast', lambda *args: True)
+    monkeypatch.setattr(imaging, 'thumbnail_fast', fast)
+    monkeypatch.setattr(imaging, 'thumbnail_magick', magick)
+    data = imaging.thumbnail(src, dest, '100x100>', fast=True)
+    assert data['method'] == 'imagemagick'
+    assert data['fast_path_error'] == 'Exception: cannot identify image file'
+    assert data['exists'] == True
+    assert data['size'] == len('thumbnail')
+
+def test_thumbnails(monkeypatch):
+    def thumbnail(src, dest, geometry, options, fast):
+        # later jobs finish first
+        time.sleep(0.01 * (5 - int(src)))
+        if src == '3':
+            raise Exception('bad image')
+        return {'src': src}
+    monkeypatch.setattr(imaging, 'thumbnail', thumbnail)
+    jobs = [(str(n), '%s-a.jpg' % n, '100x100', '') for n in range(5)]
+    for workers in [1, 3]:
+        out = list(imaging.thumbnails(jobs, workers))
+        assert [(src,dest) for src,dest,data in out] == [job[:2] for job in jobs]
+        assert isinstance(out[3][2], Exception)
+        assert out[4][2] == {'src': '4'}
+
+@pytest.mark.skipif(not imaging.Image, reason='Pillow is not installed')
+def test_thumbnail_fast(tmpdir, monkeypatch):
+    from PIL import Image
+    monkeypatch.setattr(imaging, 'pyvips', None)
+    src = str(tmpdir / 'big.png')
+    dest = str(tmpdir / 'big-a.jpg')
+    Image.new('RGBA', (400, 200), (255, 0, 0, 128)).save(src)
+    info = imaging.thumbnail_fast(src, dest, '100x100>')
+    assert info['method'] == 'pillow'
+    assert info['size_orig'] == (400, 200)
+    with Image.open(dest) as img:
+        assert img.format == 'JPEG'
+        assert img.size == (100, 50)
+    # '>' never enlarges
+    imaging.thumbnail_fast(src, dest, '1000x1000>')
+    with Image.open(dest) as img:
+        assert img.size == (400, 200)
+    # CMYK is left to ImageMagick
+    src = str(tmpdir / 'cmyk.jpg')
+    Image.new('CMYK', (400, 200), (0, 255, 255, 0)).save(src)
+    with pytest.raises(Exception):
+        imaging.thumbnail_fast(src, dest, '100x100>')
+
 @pytest.mark.skipif(no_files(), reason=NO_FILES_ERR)
 def test_thumbnail(test_files):
     src = str(test_files['jpg']['path'])
@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 
 from datetime import datetime
+import json
 import os
 
 import pytest
 
-from DDR import format_json
+from DDR import format_json, json_loads
 
 
 def test_format_json():
@@ -23,3 +24,13 @@ def test_format_json():
     assert out1 == expected1
     with pytest.raises(TypeError):
         out2 = format_json(data2)
+
+def test_json_loads():
+    assert json_loads('[{"a": 1}, {"b": "\u00e9"}]') == [{'a': 1}, {'b': 'é'}]
+    assert json_loads(b'{"a": 1}') == {'a': 1}
+    # not accepted by orjson
+    assert json_loads('{"a": NaN, "b": 123456789012345678901234567890}')['b'] \
+        == 123456789012345678901234567890
+    with pytest.raises(json.JSONDecodeError):
+        json_loads('{"a": ')
+
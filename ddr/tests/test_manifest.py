@@ -0,0 +1,149 @@
+import os
+
+import git
+
+from DDR import manifest
+from DDR import util
+
+SAMPLE_FILES = [
+    'collection.json',
+    'changelog',
+    'files/ddr-test-123-1/entity.json',
+    'files/ddr-test-123-1/changelog',
+    'files/ddr-test-123-2/entity.json',
+    'files/ddr-test-123-2/files/ddr-test-123-2-master-abc123.jpg',
+    'files/ddr-test-123-2/files/ddr-test-123-2-master-abc123.json',
+]
+
+def make_repo(path, files):
+    repo = git.Repo.init(path)
+    repo.git.config('user.name', 'gjost')
+    repo.git.config('user.email', 'gjost@densho.org')
+    for fn in files:
+        write(path, fn)
+    repo.index.add(files)
+    repo.index.commit('initial commit')
+    return repo
+
+def write(basedir, fn, text='testing'):
+    path = os.path.join(basedir, fn)
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+def clean(basedir, paths):
+    return [path.replace('%s/' % basedir, '') for path in paths]
+
+def test_parse_status_z():
+    text = ' M collection.json\0?? new.json\0R  b.json\0a.json\0'
+    assert manifest._parse_status_z(text) == [
+        'collection.json', 'new.json', 'b.json', 'a.json'
+    ]
+
+def test_manifest(tmpdir):
+    path = str(tmpdir / 'ddr-test-123')
+    repo = make_repo(path, SAMPLE_FILES)
+    m = manifest.get(os.path.join(path, 'files'))
+    assert m.path == path
+    assert os.path.exists(m.manifest_path)
+    assert clean(path, m.paths(path, recursive=True)) == [
+        'collection.json',
+        'files/ddr-test-123-1/entity.json',
+        'files/ddr-test-123-2/entity.json',
+        'files/ddr-test-123-2/files/ddr-test-123-2-master-abc123.json',
+    ]
+    assert clean(path, m.paths(path)) == ['collection.json']
+    assert clean(path, m.paths(path, recursive=True, model='entity')) == [
+        'files/ddr-test-123-1/entity.json',
+        'files/ddr-test-123-2/entity.json',
+    ]
+    assert clean(path, m.children('ddr-test-123-2')) == [
+        'files/ddr-test-123-2/files/ddr-test-123-2-master-abc123.json',
+    ]
+    record = m.record(os.path.join(path, 'files/ddr-test-123-1/entity.json'))
+    assert record['model'] == 'entity'
+    assert record['id'] == 'ddr-test-123-1'
+    assert record['parent_id'] == 'ddr-test-123'
+    assert record['size'] == len('testing')
+    assert record['blob'] == repo.git.hash_object(
+        os.path.join(path, 'files/ddr-test-123-1/entity.json')
+    )
+    
+    # staged but uncommitted
+    write(path, 'files/ddr-test-123-3/entity.json')
+    repo.index.add(['files/ddr-test-123-3/entity.json'])
+    m = manifest.get(path)
+    assert m.record(os.path.join(path, 'files/ddr-test-123-3/entity.json'))
+    # committed and deleted
+    repo.index.commit('add entity')
+    repo.index.remove(['files/ddr-test-123-1/entity.json'], working_tree=True)
+    repo.index.commit('rm entity')
+    m = manifest.get(path)
+    assert clean(path, m.paths(path, recursive=True, model='entity')) == [
+        'files/ddr-test-123-2/entity.json',
+        'files/ddr-test-123-3/entity.json',
+    ]
+    # reloaded from disk
+    manifest.save_all()
+    manifest._MANIFESTS.clear()
+    assert manifest.Manifest.load(path).entries == m.entries
+    
+    # util.find_meta_files uses the manifest unless force_read
+    assert sorted(util.find_meta_files(path, recursive=True)) \
+        == sorted(util.find_meta_files(path, recursive=True, force_read=True))
+    
+    manifest.invalidate(path)
+    assert not os.path.exists(m.manifest_path)
+
+def test_manifest_unstaged(tmpdir):
+    path = str(tmpdir / 'ddr-test-123')
+    repo = make_repo(path, SAMPLE_FILES)
+    m = manifest.get(path)
+    # written but not staged: index and HEAD unchanged, directory mtime is not
+    write(path, 'files/ddr-test-123-2/files/ddr-test-123-2-master-def456.json')
+    write(path, 'files/ddr-test-123-4/entity.json')
+    # deleted but not staged
+    os.remove(os.path.join(path, 'files/ddr-test-123-1/entity.json'))
+    m = manifest.get(path)
+    assert clean(path, m.children('ddr-test-123-2')) == [
+        'files/ddr-test-123-2/files/ddr-test-123-2-master-abc123.json',
+        'files/ddr-test-123-2/files/ddr-test-123-2-master-def456.json',
+    ]
+    assert clean(path, m.paths(path, recursive=True, model='entity')) == [
+        'files/ddr-test-123-2/entity.json',
+        'files/ddr-test-123-4/entity.json',
+    ]
+    assert sorted(util.find_meta_files(path, recursive=True)) \
+        == sorted(util.find_meta_files(path, recursive=True, force_read=True))
+
+def test_manifest_incremental(tmpdir, monkeypatch):
+    path = str(tmpdir / 'ddr-test-123')
+    repo = make_repo(path, SAMPLE_FILES)
+    m = manifest.get(path)
+    saved = os.path.getmtime(m.manifest_path)
+    def reindex():
+        raise AssertionError('full reindex')
+    monkeypatch.setattr(m, '_reindex', reindex)
+    write(path, 'files/ddr-test-123-2/files/ddr-test-123-2-master-def456.json')
+    os.remove(os.path.join(path, 'files/ddr-test-123-1/entity.json'))
+    m = manifest.get(path)
+    assert clean(path, m.children('ddr-test-123-2')) == [
+        'files/ddr-test-123-2/files/ddr-test-123-2-master-abc123.json',
+        'files/ddr-test-123-2/files/ddr-test-123-2-master-def456.json',
+    ]
+    assert clean(path, m.paths(path, recursive=True, model='entity')) == [
+        'files/ddr-test-123-2/entity.json',
+    ]
+    # save is deferred
+    assert m._unsaved
+    assert os.path.getmtime(m.manifest_path) == saved
+    manifest.save_all()
+    assert not m._unsaved
+    entries = m.entries
+    manifest._MANIFESTS.clear()
+    assert manifest.Manifest.load(path).entries == entries
+
+def test_manifest_no_repo(tmpdir):
+    assert manifest.get(str(tmpdir)) is None
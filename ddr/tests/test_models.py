@@ -134,7 +134,22 @@ def test_Collection__init__(tmpdir):
 # TODO Collection.from_identifier
 # TODO Collection.from_json
 # TODO Collection.parent
-# TODO Collection.children
+
+def test_Collection_children_quick(tmpdir):
+    path_abs = str(tmpdir / 'ddr-testing-123')
+    c = models.Collection(path_abs)
+    for eid,title in [('ddr-testing-123-10', 'ten'), ('ddr-testing-123-2', 'two')]:
+        os.makedirs(os.path.join(c.files_path, eid))
+        with open(os.path.join(c.files_path, eid, 'entity.json'), 'w') as f:
+            f.write(json.dumps([{}, {'id': eid}, {'title': title}]))
+    # strays that are not entities are skipped
+    with open(os.path.join(c.files_path, '.DS_Store'), 'w') as f:
+        f.write('')
+    os.makedirs(os.path.join(c.files_path, 'tmp1234'))
+    out = c.children(quick=True)
+    assert [e.id for e in out] == ['ddr-testing-123-2', 'ddr-testing-123-10']
+    assert [e.title for e in out] == ['two', 'ten']
+
 # TODO Collection.labels_values
 # TODO Collection.inheritable_fields
 # TODO Collection.selected_inheritables
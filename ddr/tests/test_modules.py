@@ -81,6 +81,37 @@ def test_Module_function():
     module.__file__ = 'ddr/repo_models'
     assert modules.Module(module).function('hello', 'world') == 'hello world'
 
+def test_field_functions():
+    class TestModule(object):
+        FIELDS = [{'name':'id'}, {'name':'title'}, {'name':'status'}]
+        def jsonload_title(text):
+            return text.upper()
+        jsonload_status = 'not callable'
+        def jsonload_access_path(text):
+            return text
+    
+    functions = modules.field_functions(TestModule, 'jsonload')
+    assert sorted(functions.keys()) == ['access_path', 'title']
+    assert functions['title']('hello') == 'HELLO'
+    assert modules.field_functions(TestModule, 'jsondump') == {}
+
+def test_codecs():
+    class TestModule(object):
+        FIELDS = [
+            {'name':'id', 'csv':{'import':['ignore'], 'export':[]}},
+            {'name':'title', 'csv':{'import':[], 'export':['ignore']}},
+        ]
+        def csvdump_title(text):
+            return text.upper()
+    
+    codecs = modules.codecs(TestModule)
+    assert codecs is modules.codecs(TestModule)
+    assert codecs.apply('csvdump', 'title', 'hello') == 'HELLO'
+    assert codecs.apply('csvdump', 'id', 'hello') == 'hello'
+    assert codecs.function('csvdump', 'id')('hello') == 'hello'
+    assert codecs.csv_import_ignored == {'id'}
+    assert codecs.csv_export_ignored == {'title'}
+
 # TODO Module_xml_function
 
 class TestModule(object):
@@ -0,0 +1,67 @@
+import os
+
+from DDR import objectcache
+
+
+class Thing():
+    def __init__(self, path):
+        with open(path, 'r') as f:
+            self.title = f.read()
+        self.topics = ['a', 'b']
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def test_objectcache(tmpdir):
+    path = str(tmpdir / 'thing.json')
+    write(path, 'title')
+    loads = []
+    def load():
+        loads.append(path)
+        return Thing(path)
+    cache = objectcache.ObjectCache(max_objects=10, max_mb=1)
+    o1 = cache.get(path, Thing, load)
+    o2 = cache.get(path, Thing, load)
+    assert o1.title == o2.title == 'title'
+    assert len(loads) == 1
+    assert (cache.hits,cache.misses) == (1,1)
+    # callers get copies
+    o1.topics.append('c')
+    assert cache.get(path, Thing, load).topics == ['a', 'b']
+    # file changed
+    write(path, 'new title')
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert cache.get(path, Thing, load).title == 'new title'
+    assert len(loads) == 2
+    # explicit invalidation
+    cache.invalidate(path)
+    cache.get(path, Thing, load)
+    assert len(loads) == 3
+    cache.invalidate()
+    assert cache.info()['objects'] == 0
+    assert cache.bytes == 0
+
+def test_objectcache_evict(tmpdir):
+    paths = []
+    for n in range(5):
+        path = str(tmpdir / ('thing%s.json' % n))
+        write(path, 'x' * 100)
+        paths.append(path)
+    cache = objectcache.ObjectCache(max_objects=3, max_mb=1)
+    for path in paths:
+        cache.get(path, Thing, lambda: Thing(path))
+    assert [key[0] for key in cache._entries.keys()] == paths[2:]
+    # memory cap
+    cache = objectcache.ObjectCache(max_objects=10, max_mb=0)
+    cache.get(paths[0], Thing, lambda: Thing(paths[0]))
+    assert cache.info()['objects'] == 0
+
+def test_enable_disable():
+    assert objectcache.info() == {}
+    objectcache.enable(max_objects=5, max_mb=1)
+    assert objectcache.info()['max_objects'] == 5
+    objectcache.invalidate()
+    objectcache.disable()
+    assert objectcache.CACHE is None
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from DDR import pipeline
+
+SAMPLE_FILES = [
+    'collection.json',
+    '.git/test.json',
+    'files/ddr-test-123-1/entity.json',
+    'files/ddr-test-123-1/changelog',
+    'files/ddr-test-123-2/entity.json',
+    'files/ddr-test-123-2/files/ddr-test-123-2-master-abc123.jpg',
+    'files/ddr-test-123-2/files/ddr-test-123-2-master-abc123.json',
+    'files/ddr-test-123-2/files/ddr-test-123-2-mezzanine-def456.json',
+]
+META_ALL = [
+    'collection.json',
+    'files/ddr-test-123-1/entity.json',
+    'files/ddr-test-123-2/entity.json',
+    'files/ddr-test-123-2/files/ddr-test-123-2-master-abc123.json',
+    'files/ddr-test-123-2/files/ddr-test-123-2-mezzanine-def456.json',
+]
+
+def make_collection(tmpdir):
+    basedir = str(tmpdir / 'pipeline')
+    cpath = os.path.join(basedir, 'ddr-test-123')
+    for fn in SAMPLE_FILES:
+        path = os.path.join(cpath, fn)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write('testing')
+    return cpath
+
+def test_walk(tmpdir):
+    cpath = make_collection(tmpdir)
+    def clean(paths):
+        return sorted([path.replace('%s/' % cpath, '') for path in paths])
+    paths = pipeline.walk(cpath, force_read=True)
+    assert not isinstance(paths, list)
+    assert clean(paths) == META_ALL
+    assert clean(pipeline.walk(cpath, recursive=False, force_read=True)) == [
+        'collection.json'
+    ]
+    assert clean(pipeline.walk(cpath, model='entity', force_read=True)) == [
+        'files/ddr-test-123-1/entity.json',
+        'files/ddr-test-123-2/entity.json',
+    ]
+
+def test_files_first():
+    paths = [
+        'ddr-test-123/collection.json',
+        'ddr-test-123/files/ddr-test-123-1/entity.json',
+        'ddr-test-123/files/ddr-test-123-1/files/ddr-test-123-1-master-abc123.json',
+    ]
+    assert list(pipeline.files_first(paths)) == [
+        'ddr-test-123/files/ddr-test-123-1/files/ddr-test-123-1-master-abc123.json',
+        'ddr-test-123/files/ddr-test-123-1/entity.json',
+        'ddr-test-123/collection.json',
+    ]
+
+def test_filter_paths():
+    paths = ['a/collection.json', 'a/files/a-1/entity.json']
+    assert list(pipeline.filter_paths(paths, 'entity')) == [paths[1]]
+    assert list(pipeline.filter_paths(paths, 'entity', exclude=True)) == [paths[0]]
+
+def test_meta_files(tmpdir):
+    cpath = make_collection(tmpdir)
+    def ids(identifiers):
+        return sorted([oi.id for oi in identifiers])
+    assert ids(pipeline.meta_files(cpath, force_read=True)) == [
+        'ddr-test-123',
+        'ddr-test-123-1',
+        'ddr-test-123-2',
+        'ddr-test-123-2-master-abc123',
+        'ddr-test-123-2-mezzanine-def456',
+    ]
+    assert ids(pipeline.meta_files(cpath, models=['file'], force_read=True)) == [
+        'ddr-test-123-2-master-abc123',
+        'ddr-test-123-2-mezzanine-def456',
+    ]
+    assert ids(pipeline.meta_files(cpath, roles=['mezzanine'], force_read=True)) == [
+        'ddr-test-123',
+        'ddr-test-123-1',
+        'ddr-test-123-2',
+        'ddr-test-123-2-mezzanine-def456',
+    ]
+    assert ids(pipeline.meta_files(cpath, pattern='ddr-test-123-2*', force_read=True)) == [
+        'ddr-test-123-2',
+        'ddr-test-123-2-master-abc123',
+        'ddr-test-123-2-mezzanine-def456',
+    ]
+
+def test_load(tmpdir):
+    cpath = make_collection(tmpdir)
+    identifiers = list(pipeline.meta_files(cpath, models=['entity'], force_read=True))
+    # files contain invalid JSON
+    errors = []
+    assert list(pipeline.load(identifiers, errors)) == []
+    assert sorted([oi.id for oi,err in errors]) == ['ddr-test-123-1', 'ddr-test-123-2']
+    with pytest.raises(Exception):
+        list(pipeline.load(identifiers))
@@ -0,0 +1,87 @@
+from DDR import searchcache
+
+
+def test_query_key():
+    k1 = searchcache.query_key(['ddrfile', 'ddrentity'], {'query': {'a': 1, 'b': 2}})
+    k2 = searchcache.query_key(['ddrentity', 'ddrfile'], {'query': {'b': 2, 'a': 1}})
+    assert k1 == k2
+    k3 = searchcache.query_key(['ddrentity'], {'query': {'b': 2, 'a': 1}})
+    assert k1 != k3
+
+def test_searchcache():
+    cache = searchcache.SearchCache(max_entries=2, ttl=60)
+    assert cache.get(('a',)) == None
+    cache.set(('a',), ['ddrentity'], 'A')
+    cache.set(('b',), ['ddrfile'], 'B')
+    assert cache.get(('a',)) == 'A'
+    assert (cache.hits,cache.misses) == (1,1)
+    # LRU eviction ('a' was used more recently than 'b')
+    cache.set(('c',), ['ddrcollection'], 'C')
+    assert cache.get(('b',)) == None
+    assert cache.get(('a',)) == 'A'
+    # expiration
+    cache.ttl = -1
+    cache.set(('d',), ['ddrentity'], 'D')
+    assert cache.get(('d',)) == None
+
+def test_searchcache_invalidate():
+    cache = searchcache.SearchCache(max_entries=10, ttl=60)
+    cache.set(('e',), ['ddrentity'], 'E')
+    cache.set(('f',), ['ddrfile'], 'F')
+    cache.set(('all',), [], 'ALL')
+    cache.invalidate([])
+    assert cache.info()['entries'] == 3
+    # searches across all indices are always dropped
+    cache.invalidate(['ddrfile'])
+    assert cache.get(('e',)) == 'E'
+    assert cache.get(('f',)) == None
+    assert cache.get(('all',)) == None
+    cache.invalidate()
+    assert cache.info()['entries'] == 0
+
+def test_enable_disable():
+    searchcache.disable()
+    assert searchcache.CACHE == None
+    searchcache.invalidate(['ddrentity'])
+    assert searchcache.info() == {}
+    cache = searchcache.enable(max_entries=5, ttl=10)
+    assert searchcache.CACHE is cache
+    assert searchcache.info()['max_entries'] == 5
+    searchcache.disable()
+
+def test_searcher_execute_aggs(monkeypatch):
+    from elasticsearch_dsl import Search
+    from DDR import search
+    calls = []
+    class Results():
+        pass
+    def results(self, s, query, start, stop, limit, offset):
+        calls.append(s.to_dict())
+        r = Results()
+        r.aggregations = sorted(s.to_dict().get('aggs', {}).keys())
+        return r
+    monkeypatch.setattr(search.Searcher, '_results', results)
+    searchcache.enable(max_entries=10, ttl=60)
+    try:
+        base = Search(index='ddrentity').query('match', title='camp')
+        s1 = base.extra()
+        s1.aggs.bucket('genre', 'terms', field='genre')
+        s2 = base.extra()
+        s2.aggs.bucket('format', 'terms', field='format')
+        # queries that differ only in aggregations don't share results
+        r1 = search.Searcher(conn=None, search=s1).execute(10, 0)
+        r2 = search.Searcher(conn=None, search=s2).execute(10, 0)
+        r0 = search.Searcher(conn=None, search=base).execute(10, 0)
+        assert r1.aggregations == ['genre']
+        assert r2.aggregations == ['format']
+        assert r0.aggregations == []
+        assert len(calls) == 3
+        # same query is cached
+        assert search.Searcher(conn=None, search=s1).execute(10, 0) is r1
+        assert len(calls) == 3
+        # later pages reuse the query's cached aggregations
+        r3 = search.Searcher(conn=None, search=s2).execute(10, 10)
+        assert 'aggs' not in calls[-1]
+        assert r3.aggregations == ['format']
+    finally:
+        searchcache.disable()
@@ -1,4 +1,5 @@
 from datetime import datetime
+import hashlib
 import os
 import shutil
 
@@ -85,6 +86,26 @@ def test_find_meta_files(tmpdir):
     
     paths5 = clean(util.find_meta_files(sampledir, recursive=True, force_read=False))
     assert paths5 == META_ALL
+    
+    paths6 = clean(util.find_meta_files(sampledir, recursive=True, force_read=True, workers=4))
+    assert paths6 == META_ALL
+
+def test_scandir_meta_files(tmpdir):
+    sampledir = str(tmpdir / 'ddr-test-123')
+    for d in SAMPLE_DIRS:
+        os.makedirs(os.path.join(sampledir, d))
+    for fn in SAMPLE_FILES + ['files/ddr-test-123-1/entity.json~', '.git/test.json']:
+        with open(os.path.join(sampledir, fn), 'w') as f:
+            f.write('testing')
+    
+    def clean(paths):
+        return sorted([path.replace('%s/' % sampledir, '') for path in paths])
+    
+    for workers in [1, 4]:
+        assert clean(util.scandir_meta_files(sampledir, workers=workers)) == META_ALL
+        for model in ['collection', 'entity', 'file']:
+            paths = clean(util.scandir_meta_files(sampledir, model, workers))
+            assert paths == META_MODEL[model]
 
 
 def test_natural_sort():
@@ -92,6 +113,10 @@ def test_natural_sort():
     util.natural_sort(l)
     assert l == ['1', '2', '3', '11', '12', '13']
 
+def test_natural_sort_key():
+    assert util.natural_sort_key('ddr-test-123-9') < util.natural_sort_key('ddr-test-123-10')
+    assert util.natural_sort_key('abc') == ('abc',)
+
 def test_natural_order_string():
     assert util.natural_order_string('ddr-testing-123') == '123'
     assert util.natural_order_string('ddr-testing-123-1') == '1'
@@ -110,6 +135,37 @@ def test_file_hash(tmpdir):
     assert util.file_hash(path, 'md5') == md5
     os.remove(path)
 
+def test_file_hashes(tmpdir):
+    path = str(tmpdir / 'test-hashes')
+    data = os.urandom(1024 * 100 + 7)
+    with open(path, 'wb') as f:
+        f.write(data)
+    expected = {
+        algo: hashlib.new(algo, data).hexdigest()
+        for algo in ['md5', 'sha1', 'sha256']
+    }
+    # block size smaller than, and not a multiple of, the file size
+    assert util.file_hashes(path, block_size=4096) == expected
+    assert util.file_hashes(path, ['sha1']) == {'sha1': expected['sha1']}
+    digests,size,elapsed = util.file_digests(path)
+    assert digests == expected
+    assert size == len(data)
+    assert elapsed >= 0
+
+def test_hash_files(tmpdir):
+    paths = []
+    for n in range(5):
+        path = str(tmpdir / ('test-hash-%s' % n))
+        with open(path, 'w') as f:
+            f.write('hash %s' % n)
+        paths.append(path)
+    for workers in [1, 3]:
+        results = list(util.hash_files(paths, ['sha1'], workers))
+        assert [r[0] for r in results] == paths
+        for path,digests,size,elapsed in results:
+            assert digests['sha1'] == util.file_hash(path, 'sha1')
+            assert size == 6
+
 def test_normalize_text():
     assert util.normalize_text('  this is a test') == 'this is a test'
     assert util.normalize_text('this is a test  ') == 'this is a test'